@@ -0,0 +1,116 @@
+"""
+Compare the row per point and per segment tables (sailing_track_point and
+sailing_track_line) with the compact sailing_track_compact table: size of a
+track and time to load it back. On PostgreSQL (DB_URL) the track is saved, its
+rows are measured with pg_column_size and loaded with `load_track` and
+`load_compact`, then deleted; on other engines the COPY payloads are compared.
+
+    python benchmarks/bench_compact_storage.py --points 100000
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from compact_tools import from_compact, to_compact  # noqa: E402
+from db_tools import (  # noqa: E402
+    _copy_columns,
+    _copy_frame,
+    bulk_save_track,
+    load_compact,
+    load_track,
+    supports_copy,
+)
+from metrics_tools import to_line_gdf  # noqa: E402
+from models import (  # noqa: E402
+    engine,
+    SailingTrackCompact,
+    SailingTrackLine,
+    SailingTrackPoints,
+)
+
+TRACK_ID = "benchmark-compact-storage"
+
+
+def payload(frame, model):
+    buffer = io.StringIO()
+    _copy_frame(frame, _copy_columns(frame, model)).to_csv(
+        buffer, header=False, index=False
+    )
+    return len(buffer.getvalue())
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def table_bytes(connection, model):
+    return connection.execute(
+        text(
+            f"SELECT coalesce(sum(pg_column_size(t.*)), 0) "
+            f"FROM {model.__tablename__} t WHERE track_id = :track_id"
+        ),
+        {"track_id": TRACK_ID},
+    ).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=100_000)
+    args = parser.parse_args()
+
+    track_df = synthetic_track(args.points).assign(track_id=TRACK_ID)
+    trajectory = to_line_gdf(track_df)
+    compact = to_compact(track_df, trajectory)
+    rows = {SailingTrackPoints: track_df, SailingTrackLine: trajectory}
+
+    if not supports_copy():
+        row_bytes = sum(payload(frame, model) for model, frame in rows.items())
+        compact_bytes = payload(compact, SailingTrackCompact)
+        decode, _ = timed(from_compact, compact)
+        print(
+            f"{args.points} points, COPY payload: rows {row_bytes / 1e6:.1f} MB, "
+            f"compact {compact_bytes / 1e6:.1f} MB "
+            f"({row_bytes / compact_bytes:.1f}x), compact rows decoded in "
+            f"{decode:.2f}s (no PostgreSQL to measure the tables)"
+        )
+        return
+
+    models = [*rows, SailingTrackCompact]
+    try:
+        for model, frame in [*rows.items(), (SailingTrackCompact, compact)]:
+            bulk_save_track(frame, model)
+        with engine.connect() as connection:
+            sizes = {model: table_bytes(connection, model) for model in models}
+        rows_load, _ = timed(
+            lambda: [load_track(TRACK_ID, model=model) for model in rows]
+        )
+        compact_load, _ = timed(load_compact, TRACK_ID)
+    finally:
+        with engine.begin() as connection:
+            for model in models:
+                connection.execute(
+                    text(f"DELETE FROM {model.__tablename__} WHERE track_id = :id"),
+                    {"id": TRACK_ID},
+                )
+    row_bytes = sizes[SailingTrackPoints] + sizes[SailingTrackLine]
+    compact_bytes = sizes[SailingTrackCompact]
+    print(
+        f"{args.points} points: rows {row_bytes / 1e6:.1f} MB, compact "
+        f"{compact_bytes / 1e6:.1f} MB ({row_bytes / compact_bytes:.1f}x); "
+        f"full track load: rows {rows_load:.2f}s, compact {compact_load:.2f}s "
+        f"({rows_load / compact_load:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
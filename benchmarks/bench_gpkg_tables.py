@@ -0,0 +1,100 @@
+"""
+Save many tracks with `save_track` on SailingAnalysis.gpkg as a layer per track
+and on single tables shared by every track (`gpkg_tables=True`), then query
+across tracks: a bounding box (through the R-tree of each layer against the
+shared one) and a time window (through the SQLite time index), and load one
+track by id.
+
+    python benchmarks/bench_gpkg_tables.py --tracks 100 --points 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fiona
+import geopandas as gpd
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from db_tools import load_track  # noqa: E402
+from gpkg_tools import read_gpkg  # noqa: E402
+from models import SailingTrackPoints  # noqa: E402
+from spatial_tools import save_track  # noqa: E402
+
+
+def tracks(count, points):
+    track_df = synthetic_track(points)
+    for i in range(count):
+        yield track_df.assign(
+            track_id=f"benchmark-{i:04d}", time=track_df.time + pd.Timedelta(days=i)
+        )
+
+
+def save_all(count, points, gpkg_tables):
+    start = time.perf_counter()
+    for track_df in tracks(count, points):
+        save_track(
+            track_df,
+            name=f"{track_df.time[0].date().isoformat()}_{track_df.track_id[0]}"
+            "_track_points",
+            gpkg_tables=gpkg_tables,
+        )
+    return time.perf_counter() - start
+
+
+def read_layers(bbox=None, where=None):
+    return pd.concat(
+        gpd.read_file("SailingAnalysis.gpkg", layer=layer, bbox=bbox, where=where)
+        for layer in fiona.listlayers("SailingAnalysis.gpkg")
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tracks", type=int, default=100)
+    parser.add_argument("--points", type=int, default=5000)
+    args = parser.parse_args()
+
+    sample = synthetic_track(args.points)
+    bbox = tuple(sample.iloc[1000:1100].total_bounds)
+    start = pd.Timestamp("2023-04-23 10:30") + pd.Timedelta(days=args.tracks // 2)
+    stop = start + pd.Timedelta(minutes=30)
+    where = f"time >= '{start.isoformat()}' AND time < '{stop.isoformat()}'"
+    track_id = f"benchmark-{args.tracks // 2:04d}"
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        for gpkg_tables in (False, True):
+            Path("SailingAnalysis.gpkg").unlink(missing_ok=True)
+            save = save_all(args.tracks, args.points, gpkg_tables)
+            if gpkg_tables:
+                space = timed(read_gpkg, SailingTrackPoints, bbox=bbox)
+                window = timed(read_gpkg, SailingTrackPoints, start=start, stop=stop)
+            else:
+                space = timed(read_layers, bbox=bbox)
+                window = timed(read_layers, where=where)
+            load = timed(load_track, track_id, SailingTrackPoints, post_gis=False)
+            results["tables" if gpkg_tables else "layers"] = (save, space, window, load)
+    print(f"{args.tracks} tracks of {args.points} points")
+    for layout, (save, space, window, load) in results.items():
+        print(
+            f"{layout}: save {save:.2f}s, bbox {space[0]:.3f}s ({space[1]} rows), "
+            f"30 minutes {window[0]:.3f}s ({window[1]} rows), "
+            f"one track {load[0]:.3f}s ({load[1]} rows)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Draw a zoomed out map of a long trajectory with every segment against the level
+of detail picked for the map width, and time building the stored levels.
+
+    python benchmarks/bench_lod.py --points 200000 --width 1500
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from lod_tools import build_levels, level_of_detail  # noqa: E402
+from maneuver_tools import detect_maneuvers  # noqa: E402
+from metrics_tools import to_line_gdf  # noqa: E402
+
+
+def draw(traj, width):
+    figure, ax = plt.subplots(figsize=(width / 100, width / 100), dpi=100)
+    traj.plot("speed", linewidth=3, ax=ax, cmap="Reds")
+    figure.canvas.draw()
+    plt.close(figure)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--width", type=int, default=1500)
+    args = parser.parse_args()
+
+    trajectory = to_line_gdf(synthetic_track(args.points), "ellipsoidal")
+    maneuvers = detect_maneuvers(trajectory)
+    start = time.perf_counter()
+    levels = build_levels(trajectory, maneuvers)
+    build = time.perf_counter() - start
+    sizes = ", ".join(
+        f"level {level}: {size}"
+        for level, size in levels.groupby("level").size().items()
+    )
+    print(f"{len(trajectory)} segments, levels built in {build:.2f}s ({sizes})")
+
+    start = time.perf_counter()
+    draw(trajectory, args.width)
+    full = time.perf_counter() - start
+    start = time.perf_counter()
+    simplified = level_of_detail(trajectory, args.width)
+    draw(simplified, args.width)
+    lod = time.perf_counter() - start
+    print(
+        f"map {args.width}px: every segment {full:.2f}s, level "
+        f"{simplified.level.iloc[0]} ({len(simplified)} segments) {lod:.2f}s "
+        f"({full / lod:.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare the vectorized wind barb components and tack marker coordinates of the
+map functions against the previous row-wise `apply` implementation.
+
+    python benchmarks/bench_map_geometry.py --sizes 100000 1000000
+"""
+import argparse
+import sys
+import time
+from math import cos, radians, sin
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from metrics_tools import to_line_gdf  # noqa: E402
+from spatial_tools import segment_starts, wind_components  # noqa: E402
+
+
+def apply_barbs(weather):
+    return (
+        weather["wind_speed"]
+        * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(cos),
+        weather["wind_speed"]
+        * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(sin),
+    )
+
+
+def apply_tacks(traj):
+    return (
+        traj.apply(lambda x: [y for y in x.geometry.coords][0][0], axis=1),
+        traj.apply(lambda x: [y for y in x.geometry.coords][0][1], axis=1),
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        traj = to_line_gdf(synthetic_track(size + 1), "ellipsoidal")
+        rng = np.random.default_rng(0)
+        weather = pd.DataFrame(
+            {
+                "wind_speed": rng.uniform(0, 15, size),
+                "wind_deg": rng.integers(0, 360, size),
+            }
+        )
+        barbs_apply, (u, v) = timed(apply_barbs, weather)
+        barbs_numpy, (new_u, new_v) = timed(
+            wind_components, weather["wind_speed"], weather["wind_deg"]
+        )
+        assert np.allclose(u, new_u) and np.allclose(v, new_v)
+        tacks_apply, (x, y) = timed(apply_tacks, traj)
+        tacks_numpy, (new_x, new_y) = timed(segment_starts, traj.geometry)
+        assert np.array_equal(x, new_x) and np.array_equal(y, new_y)
+        print(
+            f"{size} segments: barbs {barbs_apply:.2f}s -> {barbs_numpy:.3f}s "
+            f"({barbs_apply / barbs_numpy:.0f}x), tack markers {tacks_apply:.2f}s "
+            f"-> {tacks_numpy:.3f}s ({tacks_apply / tacks_numpy:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Render the legs of a regatta with one `create_traj_map` call per leg against a
+single `render_traj_maps` call. Tiles are read offline (blank when not cached)
+so only rendering is measured.
+
+    python benchmarks/bench_map_windows.py --points 20000 --windows 4
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ["TILES_OFFLINE"] = "true"
+
+import matplotlib  # noqa: E402
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from metrics_tools import to_line_gdf  # noqa: E402
+from spatial_tools import create_traj_map, render_traj_maps  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--windows", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    trajectory = to_line_gdf(synthetic_track(args.points), "ellipsoidal")
+    times = trajectory.t.quantile(
+        [i / args.windows for i in range(args.windows + 1)]
+    ).tolist()
+    windows = [
+        (f"leg {i}", start, stop, "speed")
+        for i, (start, stop) in enumerate(zip(times[:-1], times[1:]))
+    ]
+
+    start = time.perf_counter()
+    for title, window_start, window_stop, attribute in windows:
+        create_traj_map(
+            trajectory,
+            map_title=title,
+            start=window_start,
+            stop=window_stop,
+            attribute=attribute,
+            save=True,
+        )
+        plt.close("all")
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_traj_maps(trajectory, windows, workers=args.workers)
+    batch = time.perf_counter() - start
+    print(
+        f"{len(windows)} windows: create_traj_map {single:.2f}s, "
+        f"render_traj_maps {batch:.2f}s ({single / batch:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare the streaming columnar OWM JSONL parser against the previous
+`pd.read_json` + `apply(pd.Series)` implementation of `process_OWM_data`.
+
+    python benchmarks/bench_owm_jsonl.py --lines 10000 100000
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from owm_tools import read_owm_jsonl  # noqa: E402
+
+BAIRES_TZ = timezone(timedelta(hours=-3))
+
+
+def synthetic_jsonl(path, lines, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as jsonl:
+        for i in range(lines):
+            current = {
+                "dt": 1682254800 + 5 * i,
+                "sunrise": 1682245000,
+                "sunset": 1682285000,
+                "temp": float(rng.normal(20, 3)),
+                "feels_like": 20.0,
+                "pressure": 1012,
+                "humidity": int(rng.integers(40, 90)),
+                "dew_point": 10.0,
+                "uvi": 0.0,
+                "clouds": 0,
+                "visibility": 10000,
+                "wind_speed": float(rng.uniform(0, 10)),
+                "wind_deg": int(rng.integers(0, 360)),
+                "weather": [{"id": 800, "main": "Clear", "icon": "01d"}],
+            }
+            answer = {
+                "lat": -27.34,
+                "lon": -55.95,
+                "timezone": "America/Argentina/Cordoba",
+                "timezone_offset": -10800,
+                "current": current,
+                "hourly": [dict(current, dt=current["dt"] + h * 3600) for h in range(24)],
+                "query": {"lat": -27.34, "lon": -55.95, "dt": current["dt"]},
+            }
+            jsonl.write(json.dumps(answer) + "\n")
+
+
+def legacy_parser(jsonl_path):
+    weather_data = pd.read_json(jsonl_path, lines=True)
+    weather_data = pd.concat(
+        [
+            weather_data.drop(["current"], axis=1),
+            weather_data["current"].apply(pd.Series),
+        ],
+        axis=1,
+    )
+    weather_data["time"] = weather_data.dt.apply(datetime.fromtimestamp, tz=BAIRES_TZ)
+    return weather_data.drop(
+        [
+            "timezone",
+            "timezone_offset",
+            "hourly",
+            "dt",
+            "sunrise",
+            "sunset",
+            "feels_like",
+            "dew_point",
+            "uvi",
+            "clouds",
+            "visibility",
+            "weather",
+            "query",
+        ],
+        axis=1,
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for lines in args.lines:
+            jsonl_path = Path(tmp) / f"owm_{lines}.jsonl"
+            synthetic_jsonl(jsonl_path, lines)
+            columnar = timed(read_owm_jsonl, jsonl_path, tz=BAIRES_TZ)
+            legacy = timed(legacy_parser, jsonl_path)
+            print(
+                f"{lines:>8} lines | columnar {columnar:7.2f}s | "
+                f"read_json + apply {legacy:7.2f}s | speedup x{legacy / columnar:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Save many tracks with `save_track` as GeoPackage layers (one per track, listing
+the layers before every write) and on the GeoParquet archive (one partition
+per track), then read the points of one day across every track: a query per
+GeoPackage layer against a single `read_archive` pruned by the time statistics.
+
+    python benchmarks/bench_parquet_archive.py --tracks 100 --points 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fiona
+import geopandas as gpd
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from models import SailingTrackPoints  # noqa: E402
+from parquet_tools import read_archive  # noqa: E402
+from spatial_tools import save_track  # noqa: E402
+
+
+def tracks(count, points):
+    track_df = synthetic_track(points)
+    for i in range(count):
+        yield track_df.assign(
+            track_id=f"benchmark-{i:04d}", time=track_df.time + pd.Timedelta(days=i)
+        )
+
+
+def save_all(count, points, archive_dir=None):
+    times = []
+    for track_df in tracks(count, points):
+        start = time.perf_counter()
+        save_track(
+            track_df,
+            name=f"{track_df.track_id[0]}_track_points",
+            archive_dir=archive_dir,
+        )
+        times.append(time.perf_counter() - start)
+    return sum(times), sum(times[-10:]) / len(times[-10:])
+
+
+def read_gpkg_day(start, stop):
+    where = f"time >= '{start.isoformat()}' AND time < '{stop.isoformat()}'"
+    return pd.concat(
+        gpd.read_file("SailingAnalysis.gpkg", layer=layer, where=where)
+        for layer in fiona.listlayers("SailingAnalysis.gpkg")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tracks", type=int, default=100)
+    parser.add_argument("--points", type=int, default=5000)
+    args = parser.parse_args()
+
+    start = pd.Timestamp("2023-04-23 10:30") + pd.Timedelta(days=args.tracks // 2)
+    stop = start + pd.Timedelta(minutes=30)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        gpkg_save, gpkg_last = save_all(args.tracks, args.points)
+        archive_save, archive_last = save_all(args.tracks, args.points, "archive")
+        gpkg_read = time.perf_counter()
+        gpkg_rows = len(read_gpkg_day(start, stop))
+        gpkg_read = time.perf_counter() - gpkg_read
+        archive_read = time.perf_counter()
+        archive_rows = len(
+            read_archive(
+                SailingTrackPoints, start=start, stop=stop, archive_dir="archive"
+            )
+        )
+        archive_read = time.perf_counter() - archive_read
+    print(
+        f"{args.tracks} tracks of {args.points} points, save: GeoPackage "
+        f"{gpkg_save:.2f}s ({gpkg_last * 1000:.0f} ms per track at the end), "
+        f"archive {archive_save:.2f}s ({archive_last * 1000:.0f} ms)"
+    )
+    print(
+        f"30 minutes across every track: GeoPackage {gpkg_read:.2f}s "
+        f"({gpkg_rows} rows), archive {archive_read:.3f}s ({archive_rows} rows)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Classify a season of synthetic trajectory segments (many tracks in one frame,
+as read from sailing_track_line) into run-length encoded points of sail, against
+labelling every row with `apply` and grouping the runs with pandas.
+
+    python benchmarks/bench_point_of_sail.py --tracks 100 --segments 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from metrics_tools import to_line_gdf  # noqa: E402
+from point_of_sail_tools import POINTS_OF_SAIL, point_of_sail_segments  # noqa: E402
+
+
+def season(tracks, segments):
+    track = to_line_gdf(synthetic_track(segments + 1), "ellipsoidal")
+    rng = np.random.default_rng(0)
+    lines = pd.concat([track] * tracks, ignore_index=True)
+    lines["track_id"] = np.repeat([f"track-{i}" for i in range(tracks)], segments)
+    lines["wind_deg"] = np.repeat(rng.uniform(0, 360, tracks), segments)
+    return lines
+
+
+def apply_label(row):
+    twa = (row.wind_deg - row.direction + 180) % 360 - 180
+    for label, upper in POINTS_OF_SAIL.items():
+        if abs(twa) < upper or upper == 180:
+            return label, "starboard" if twa >= 0 else "port"
+
+
+def apply_segments(lines):
+    labels = lines.apply(apply_label, axis=1, result_type="expand")
+    key = labels[0] + labels[1]
+    run = ((key != key.shift()) | (lines.track_id != lines.track_id.shift())).cumsum()
+    return lines.groupby(run).agg(
+        track_id=("track_id", "first"),
+        start_time=("prev_t", "first"),
+        end_time=("t", "last"),
+        duration=("timedelta", "sum"),
+        distance=("distance", "sum"),
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tracks", type=int, default=100)
+    parser.add_argument("--segments", type=int, default=20_000)
+    parser.add_argument("--apply-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    lines = season(args.tracks, args.segments)
+    sample = lines.iloc[: args.apply_rows]
+    apply_time, runs = timed(apply_segments, sample)
+    numpy_sample, segments = timed(
+        point_of_sail_segments, sample, min_duration=0, with_geometry=False
+    )
+    assert len(runs) == len(segments)
+    assert np.allclose(runs.distance.to_numpy(), segments.distance.to_numpy())
+    print(
+        f"{len(sample)} segments: apply {apply_time:.2f}s -> {numpy_sample:.3f}s "
+        f"({apply_time / numpy_sample:.0f}x)"
+    )
+
+    plain, segments = timed(point_of_sail_segments, lines, with_geometry=False)
+    geometry, _ = timed(point_of_sail_segments, lines)
+    print(
+        f"season of {len(lines)} segments in {args.tracks} tracks: "
+        f"{len(segments)} runs in {plain:.2f}s ({geometry:.2f}s with geometry)"
+    )
+
+
+if __name__ == "__main__":
+    main()
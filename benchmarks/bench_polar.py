@@ -0,0 +1,71 @@
+"""
+Regenerate the boat polar of a season after a new track: rebuilding it from every
+track against adding only the new track to the saved polar.
+
+    python benchmarks/bench_polar.py --tracks 100 --segments 20000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_trajectory_metrics import synthetic_track  # noqa: E402
+from metrics_tools import to_line_gdf  # noqa: E402
+from polar_tools import PolarAccumulator  # noqa: E402
+
+
+def season(tracks, segments):
+    track = to_line_gdf(synthetic_track(segments + 1), "ellipsoidal")
+    rng = np.random.default_rng(0)
+    for i in range(tracks):
+        yield track.assign(
+            track_id=f"track-{i}",
+            wind_deg=rng.uniform(0, 360),
+            wind_speed=rng.uniform(0, 12, segments),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tracks", type=int, default=100)
+    parser.add_argument("--segments", type=int, default=20_000)
+    args = parser.parse_args()
+
+    tracks = list(season(args.tracks, args.segments))
+    *old, new = tracks
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "polar.npz"
+        polar = PolarAccumulator()
+        for track in old:
+            polar.add_track(track)
+        polar.save(path)
+
+        start = time.perf_counter()
+        rebuilt = PolarAccumulator()
+        for track in tracks:
+            rebuilt.add_track(track)
+        rebuilt.quantiles()
+        rebuild = time.perf_counter() - start
+
+        start = time.perf_counter()
+        polar = PolarAccumulator.load(path)
+        polar.add_track(new)
+        polar.save(path)
+        polar.quantiles()
+        incremental = time.perf_counter() - start
+    assert np.allclose(polar.seconds, rebuilt.seconds)
+    print(
+        f"{args.tracks} tracks of {args.segments} segments: rebuild "
+        f"{rebuild:.2f}s, add the new track {incremental:.3f}s "
+        f"({rebuild / incremental:.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold start of the command line: a fresh interpreter per run for `--help`, each
+subcommand's `--help` and each subcommand run offline on data/SailingTrack.gpx
+(GeoPackage tables in a temporary directory, cached tiles only, OWM calls
+planned but not made), against importing every module eagerly as the scripts
+did before the package. Import time is measured with `-X importtime`.
+
+    python benchmarks/bench_startup.py --repeat 3
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+GPX = ROOT / "data" / "SailingTrack.gpx"
+TRACK_ID = "ade00740-2bad-5392-9554-dc266062abaf"
+EAGER = (
+    "import models, spatial_tools, tile_tools, parquet_tools, matplotlib.pyplot; "
+    "models.engine"
+)
+COMMANDS = {
+    "--help": ["--help"],
+    "ingest --help": ["ingest", "--help"],
+    "weather --help": ["weather", "--help"],
+    "render --help": ["render", "--help"],
+    "report --help": ["report", "--help"],
+    # a new manifest per run, so the file is ingested again
+    "ingest": ["ingest", str(GPX), "--gpkg-tables", "--manifest", "{run}.jsonl"],
+    "weather": ["weather", str(GPX), "--plan"],
+    "report": ["report", "--gpkg-tables"],
+    "render": ["render", TRACK_ID, "--gpkg", "--workers", "1"],
+}
+
+
+def run(arguments, cwd, env):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"{arguments} failed:\n{result.stderr[-2000:]}")
+    # top level imports only, their cumulative time includes the nested ones
+    imports = sum(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+        and "|" in line
+        and not line.split("|")[2].startswith("  ")
+        and line.split("|")[1].strip().isdigit()
+    )
+    return seconds, imports / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "TILES_OFFLINE": "true",
+            "DB_URL": f"sqlite:///{directory}/startup.db",
+        }
+        runs = {"eager imports": ["-c", EAGER]}
+        runs.update(
+            (name, ["-m", "sailinganalysis", *arguments])
+            for name, arguments in COMMANDS.items()
+        )
+        for name, arguments in runs.items():
+            seconds, imports = min(
+                run([a.format(run=i) for a in arguments], directory, env)
+                for i in range(args.repeat)
+            )
+            print(f"{name:>16}: {seconds:.2f}s ({imports:.2f}s importing)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the single-pass NumPy metrics engine against the chained movingpandas
+`add_*` calls previously used by `export_gpx`.
+
+    python benchmarks/bench_trajectory_metrics.py --sizes 100000 1000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import movingpandas as mpd
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from metrics_tools import to_line_gdf  # noqa: E402
+
+
+def synthetic_track(n, seed=0):
+    rng = np.random.default_rng(seed)
+    heading = np.cumsum(rng.normal(0, 5, n))
+    step = rng.uniform(0.5, 3.0, n)  # meters per second at 1 Hz
+    lat = -27.34 + np.cumsum(step * np.cos(np.radians(heading))) / 111_320
+    lon = -55.95 + np.cumsum(step * np.sin(np.radians(heading))) / 98_900
+    return gpd.GeoDataFrame(
+        {
+            "track_id": "benchmark",
+            "track_fid": 0,
+            "track_seg_id": 0,
+            "track_seg_point_id": np.arange(n),
+            "ele": 100.0,
+            "time": pd.date_range("2023-04-23 10:00", periods=n, freq="1s", tz="UTC"),
+        },
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )
+
+
+def movingpandas_path(track_df):
+    trajectory = mpd.Trajectory(df=track_df, traj_id="track_seg_point_id", t="time")
+    trajectory.add_acceleration(overwrite=True)
+    trajectory.add_angular_difference(overwrite=True)
+    trajectory.add_direction(overwrite=True)
+    trajectory.add_distance(overwrite=True)
+    trajectory.add_speed(overwrite=True)
+    trajectory.add_timedelta(overwrite=True)
+    trajectory.df.timedelta = trajectory.df.timedelta.dt.total_seconds()
+    return trajectory.to_line_gdf()
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument(
+        "--skip-movingpandas",
+        action="store_true",
+        help="only time the NumPy engine (movingpandas takes minutes at 1M points)",
+    )
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        track_df = synthetic_track(n)
+        ellipsoidal = timed(to_line_gdf, track_df)
+        haversine = timed(to_line_gdf, track_df, method="haversine")
+        line = f"{n:>9} points | numpy ellipsoidal {ellipsoidal:8.2f}s | numpy haversine {haversine:8.2f}s"
+        if not args.skip_movingpandas:
+            reference = timed(movingpandas_path, track_df)
+            line += f" | movingpandas {reference:8.2f}s | speedup x{reference / ellipsoidal:.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
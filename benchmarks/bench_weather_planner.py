@@ -0,0 +1,37 @@
+"""
+OWM calls needed by the query planner against the fixed index stride of
+`get_OWM_data`, on the sample track.
+
+    python benchmarks/bench_weather_planner.py data/SailingTrack.gpx
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from gpx_tools import gpx_to_geodataframe, read_gpx  # noqa: E402
+from owm_tools import planner_report  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("gpx_path", nargs="?", default="data/SailingTrack.gpx")
+    parser.add_argument("--cell-size", type=float, nargs="+", default=[0.1, 0.05])
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    track_df = gpx_to_geodataframe(read_gpx(args.gpx_path))
+    for cell_size in args.cell_size:
+        for step in args.steps:
+            report = planner_report(track_df, step=step, cell_size=cell_size)
+            print(
+                f"cell {cell_size:>5}° vs step {step:>3}: {report['points']} points, "
+                f"{report['stride_calls']} stride calls, "
+                f"{report['planned_calls']} planned calls "
+                f"({report['reduction']:.0%} fewer)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import struct
+from datetime import timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from metrics_tools import LINE_COLUMNS, METRIC_COLUMNS
+
+SRID = 4326
+# EWKB LineString type with the Z, M and SRID flags
+EWKB_LINESTRING_ZM = 2 | 0x80000000 | 0x40000000 | 0x20000000
+RUN_KEY = ["track_id", "track_fid", "track_seg_id"]
+
+
+def linestring_zm(x, y, z, m, srid=SRID):
+    """
+    Little endian EWKB of a LINESTRING ZM with x, y, z and m coordinate arrays.
+    """
+    coords = np.stack([x, y, z, m], axis=1).astype("<f8")
+    header = struct.pack("<BIII", 1, EWKB_LINESTRING_ZM, srid, len(coords))
+    return header + coords.tobytes()
+
+
+def to_compact(track_df, line_df):
+    """
+    One row per track segment run (track_id, track_fid, track_seg_id) of a track
+    points GeoDataFrame and its `to_line_gdf` segments: the points as a
+    LINESTRING ZM (elevation as Z, UTC epoch seconds as M) and the segment
+    metrics as arrays aligned with the points, the metrics of the segment
+    ending at each point (NaN at the first point of the track). The UTC offset
+    of the first point is kept to rebuild the local segment times.
+    """
+    import geopandas as gpd
+    import shapely
+
+    track_df = track_df.sort_values("time", kind="stable").reset_index(drop=True)
+    time = pd.DatetimeIndex(track_df.time)
+    if time.tz is None:
+        time = time.tz_localize("UTC")
+    utc_offset = time[0].utcoffset().total_seconds()
+    seconds = time.tz_convert("UTC").as_unit("ns").asi8 / 1e9
+    x = shapely.get_x(track_df.geometry.values)
+    y = shapely.get_y(track_df.geometry.values)
+    metrics = {
+        name: np.r_[np.nan, line_df[name].to_numpy(dtype=float)]
+        for name in METRIC_COLUMNS
+    }
+
+    key = track_df[RUN_KEY[1:]].to_numpy()
+    starts = np.flatnonzero(np.r_[True, (key[1:] != key[:-1]).any(axis=1)])
+    ends = np.r_[starts[1:], len(track_df)]
+    point_ids = track_df.track_seg_point_id.to_numpy()
+    rows = []
+    for start, end in zip(starts, ends):
+        if not (np.diff(point_ids[start:end]) == 1).all():
+            raise ValueError(
+                f"track_seg_point_id is not consecutive in segment run {key[start]}"
+            )
+        rows.append(
+            {
+                "track_id": str(track_df.track_id.iloc[0]),
+                "track_fid": int(key[start][0]),
+                "track_seg_id": int(key[start][1]),
+                "first_point_id": int(point_ids[start]),
+                "points": int(end - start),
+                "start_time": time[start].tz_convert("UTC").tz_localize(None),
+                "end_time": time[end - 1].tz_convert("UTC").tz_localize(None),
+                "utc_offset": utc_offset,
+                **{name: values[start:end] for name, values in metrics.items()},
+                "geometry": shapely.from_wkb(
+                    linestring_zm(
+                        x[start:end],
+                        y[start:end],
+                        track_df.ele.to_numpy(dtype=float)[start:end],
+                        seconds[start:end],
+                    )
+                ),
+            }
+        )
+    return gpd.GeoDataFrame(rows, geometry="geometry", crs=track_df.crs)
+
+
+def from_compact(compact):
+    """
+    Track points and segments GeoDataFrames (the sailing_track_point and
+    sailing_track_line layouts) of the compact rows of a track.
+    """
+    import geopandas as gpd
+    import shapely
+
+    compact = compact.sort_values(RUN_KEY[1:], kind="stable")
+    coords, run = shapely.get_coordinates(
+        compact.geometry.values, include_z=True, include_m=True, return_index=True
+    )
+    points = compact.points.to_numpy()
+    first = np.repeat(np.cumsum(points) - points, points)
+    utc_offset = timedelta(seconds=float(compact.utc_offset.iloc[0]))
+    time = pd.to_datetime(np.round(coords[:, 3] * 1e6).astype("int64"), unit="us")
+    track_df = gpd.GeoDataFrame(
+        {
+            "track_fid": compact.track_fid.to_numpy()[run],
+            "track_seg_id": compact.track_seg_id.to_numpy()[run],
+            "track_seg_point_id": compact.first_point_id.to_numpy()[run]
+            + np.arange(len(run))
+            - first,
+            "ele": coords[:, 2],
+            "time": time.tz_localize("UTC").tz_convert(timezone(utc_offset)),
+            "track_id": compact.track_id.to_numpy()[run],
+        },
+        geometry=gpd.points_from_xy(coords[:, 0], coords[:, 1]),
+        crs=compact.crs,
+    )
+
+    # like to_line_gdf, t and prev_t keep the local wall time without timezone
+    local = (time + utc_offset).to_numpy()
+    line_df = gpd.GeoDataFrame(
+        {name: track_df[name].to_numpy()[1:] for name in LINE_COLUMNS[:5]},
+        geometry=shapely.linestrings(
+            np.stack([coords[:-1, :2], coords[1:, :2]], axis=1)
+        ),
+        crs=compact.crs,
+    )
+    for name in METRIC_COLUMNS:
+        line_df[name] = np.concatenate(
+            [np.asarray(values, dtype=float) for values in compact[name]]
+        )[1:]
+    line_df["t"] = local[1:]
+    line_df["prev_t"] = local[:-1]
+    return track_df, line_df[LINE_COLUMNS]
@@ -0,0 +1,637 @@
+import io
+import logging
+import re
+import sqlite3
+from contextlib import closing
+from datetime import timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import shapely
+from geoalchemy2 import Geometry, WKBElement
+from sqlalchemy import UniqueConstraint, bindparam, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import (
+    get_engine,
+    OWM_data,
+    SailingManeuver,
+    SailingPointOfSail,
+    SailingPolar,
+    SailingTrackCompact,
+    SailingTrackLine,
+    SailingTrackLOD,
+    TrackSummary,
+)
+from lod_tools import pick_level
+from polar_tools import PolarAccumulator
+
+COPY_CHUNK_ROWS = 50_000
+# bind parameters of a single statement, SQLite's limit (PostgreSQL allows 65535)
+MAX_BIND_PARAMS = 32_766
+SRID = 4326
+# GeoPackage layer suffix of each table saved by spatial_tools.export_gpx
+GPKG_SUFFIXES = {
+    "sailing_track_point": "track_points",
+    "sailing_track_line": "trajectory",
+    "sailing_track_lod": "lod",
+}
+# tables timed by the naive local time of the trajectory segments (and what is
+# derived from them); the other tables keep naive UTC times
+LOCAL_TIME_TABLES = {
+    "sailing_track_line",
+    "sailing_track_lod",
+    "sailing_maneuver",
+    "sailing_point_of_sail",
+    "track_summary",
+}
+# local time zone of the tracks, spatial_tools.BAIRES_TZ
+LOCAL_TZ = timezone(timedelta(hours=-3))
+
+
+def natural_key(model):
+    """
+    Columns of the unique constraint identifying a row of `model`.
+    """
+    for constraint in model.__table__.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            return [column.name for column in constraint.columns]
+    return [column.name for column in model.__table__.primary_key]
+
+
+def insert_on_conflict(index_elements, update=False):
+    """
+    `DataFrame.to_sql` method writing bulk `INSERT ... ON CONFLICT DO NOTHING`,
+    or `DO UPDATE` of the non key columns when `update` is True.
+    """
+
+    def method(table, conn, keys, data_iter):
+        dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+        rows = [dict(zip(keys, row)) for row in data_iter]
+        if not rows:
+            return 0
+        statement = dialect_insert[conn.dialect.name](table.table).values(rows)
+        if update:
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    key: statement.excluded[key]
+                    for key in keys
+                    if key not in index_elements
+                },
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=index_elements)
+        return conn.execute(statement).rowcount
+
+    return method
+
+
+def insert_chunksize(columns):
+    """
+    `DataFrame.to_sql` chunksize keeping the bulk INSERT of a frame with
+    `columns` columns (index levels included) under the bind parameter limit.
+    """
+    return max(1, MAX_BIND_PARAMS // columns)
+
+
+def _copy_columns(track_df, model):
+    return [
+        column.name
+        for column in model.__table__.columns
+        if column.name != "id" and column.name in track_df.columns
+    ]
+
+
+def _copy_frame(track_df, columns):
+    frame = pd.DataFrame(
+        {c: track_df[c].values for c in columns if c != "geometry"},
+    )
+    for name in frame.columns:
+        if isinstance(frame[name].dtype, pd.DatetimeTZDtype):
+            # timestamp columns have no time zone: store tz-aware values as UTC
+            frame[name] = frame[name].dt.tz_convert("UTC").dt.tz_localize(None)
+        elif len(frame) and isinstance(frame[name].iloc[0], (list, np.ndarray)):
+            # array columns as PostgreSQL array literals
+            frame[name] = [
+                "{"
+                + ",".join(map(repr, np.asarray(values, dtype=float).tolist()))
+                + "}"
+                for values in frame[name]
+            ]
+    if "geometry" in columns:
+        geometry = shapely.set_srid(track_df.geometry.values, SRID)
+        frame["geometry"] = shapely.to_wkb(geometry, hex=True, include_srid=True)
+    return frame[columns]
+
+
+def _table_frame(frame, model):
+    # the PostGIS columns and types: timestamps as naive UTC, floats as float
+    columns = _copy_columns(frame, model)
+    frame = frame[columns].reset_index(drop=True)
+    for name in columns:
+        if isinstance(frame[name].dtype, pd.DatetimeTZDtype):
+            frame[name] = frame[name].dt.tz_convert("UTC").dt.tz_localize(None)
+        elif (
+            name != "geometry"
+            and model.__table__.columns[name].type.python_type is float
+        ):
+            frame[name] = frame[name].astype(float)
+    return frame
+
+
+def _naive_utc(value):
+    value = pd.Timestamp(value)
+    if value.tz is not None:
+        value = value.tz_convert("UTC").tz_localize(None)
+    return value
+
+
+def _iter_csv_chunks(frame, chunk_rows):
+    for start in range(0, len(frame), chunk_rows):
+        buffer = io.StringIO()
+        frame.iloc[start : start + chunk_rows].to_csv(
+            buffer, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S.%f"
+        )
+        buffer.seek(0)
+        yield buffer
+
+
+def copy_track(track_df, model, chunk_rows=COPY_CHUNK_ROWS):
+    """
+    Stream a track into the `model` table with PostgreSQL COPY, sending the
+    geometries as hex EWKB, in a single transaction. Rows are staged in a
+    temporary table and inserted with ON CONFLICT DO NOTHING on the natural key,
+    so re-runs and concurrent workers are safe. Returns the inserted rows.
+    """
+    columns = _copy_columns(track_df, model)
+    frame = _copy_frame(track_df, columns)
+    table = model.__tablename__
+    staging = f"staging_{table}"
+    column_list = ", ".join(columns)
+    connection = get_engine().raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT {column_list} FROM {table} WITH NO DATA"
+            )
+            for buffer in _iter_csv_chunks(frame, chunk_rows):
+                cursor.copy_expert(
+                    f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+            cursor.execute(
+                f"INSERT INTO {table} ({column_list}) "
+                f"SELECT {column_list} FROM {staging} "
+                f"ON CONFLICT ({', '.join(natural_key(model))}) DO NOTHING"
+            )
+            inserted = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return inserted
+
+
+def supports_copy():
+    dialect = get_engine().dialect
+    return dialect.name == "postgresql" and dialect.driver == "psycopg2"
+
+
+def bulk_save_track(track_df, model, update=False):
+    """
+    Save the new rows of a track on PostGIS with COPY, falling back to bulk
+    `INSERT ... ON CONFLICT DO NOTHING` when the engine is not PostgreSQL
+    through psycopg2. With `update`, rows already saved are updated with
+    `INSERT ... ON CONFLICT DO UPDATE` instead. Returns the inserted rows.
+    """
+    if not supports_copy():
+        logging.warning(
+            f"COPY not available on {get_engine().dialect.name}, using INSERT"
+        )
+    elif not update:
+        return copy_track(track_df, model)
+    columns = _copy_columns(track_df, model)
+    frame = pd.DataFrame({c: track_df[c].values for c in columns if c != "geometry"})
+    dtype = {}
+    if "geometry" in columns:
+        geometry_type = track_df.geom_type.iloc[0].upper()
+        frame["geometry"] = [
+            WKBElement(wkb, srid=SRID, extended=True)
+            for wkb in shapely.to_wkb(
+                shapely.set_srid(track_df.geometry.values, SRID), include_srid=True
+            )
+        ]
+        dtype["geometry"] = Geometry(geometry_type=geometry_type, srid=SRID)
+    return frame.to_sql(
+        model.__tablename__,
+        get_engine(),
+        if_exists="append",
+        index=False,
+        dtype=dtype,
+        chunksize=insert_chunksize(len(frame.columns)),
+        method=insert_on_conflict(natural_key(model), update=update),
+    )
+
+
+def replace_track(track_df, model):
+    """
+    Replace the rows of the tracks of `track_df` on the `model` table, so rows
+    whose natural key changed (e.g. a maneuver entry time moved by a new wind)
+    are not kept next to the new ones. Returns the inserted rows.
+    """
+    track_ids = [str(track_id) for track_id in track_df.track_id.unique()]
+    with get_engine().begin() as connection:
+        connection.execute(
+            text(
+                f"DELETE FROM {model.__tablename__} WHERE track_id IN :track_ids"
+            ).bindparams(bindparam("track_ids", expanding=True)),
+            {"track_ids": track_ids},
+        )
+    return bulk_save_track(track_df, model)
+
+
+def time_column(model):
+    columns = model.__table__.columns
+    return next(
+        name for name in ("t", "start_time", "entry_time", "time") if name in columns
+    )
+
+
+def time_bound(value, model):
+    """
+    A time window bound in the convention of the time column of `model`: naive
+    local time (`LOCAL_TZ`) on the `LOCAL_TIME_TABLES`, naive UTC on the others.
+    Tz-aware bounds are converted, naive bounds are taken as already in it.
+    """
+    value = pd.Timestamp(value)
+    if value.tz is not None:
+        tz = LOCAL_TZ if model.__tablename__ in LOCAL_TIME_TABLES else "UTC"
+        value = value.tz_convert(tz).tz_localize(None)
+    return value
+
+
+def track_query(
+    model, track_id=None, bbox=None, start=None, stop=None, columns="*", level=None
+):
+    """
+    SQL and parameters selecting rows of `model` by track id, bounding box
+    (xmin, ymin, xmax, ymax), time window and level of detail, written so the
+    btree, GiST and BRIN indexes of the table can be used. Time bounds follow
+    `time_bound`: tz-aware bounds are converted to the naive UTC or naive local
+    times of the table, naive bounds are compared as they are.
+    """
+    where, params = [], {}
+    if track_id is not None:
+        where.append("track_id = :track_id")
+        params["track_id"] = str(track_id)
+    if level is not None:
+        where.append("level = :level")
+        params["level"] = int(level)
+    if bbox is not None:
+        envelope = "ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 4326)"
+        where.append(f"geometry && {envelope} AND ST_Intersects(geometry, {envelope})")
+        params.update(zip(("xmin", "ymin", "xmax", "ymax"), map(float, bbox)))
+    if start is not None:
+        where.append(f"{time_column(model)} >= :start")
+        params["start"] = time_bound(start, model).to_pydatetime()
+    if stop is not None:
+        where.append(f"{time_column(model)} < :stop")
+        params["stop"] = time_bound(stop, model).to_pydatetime()
+    sql = f"SELECT {columns} FROM {model.__tablename__}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql, params
+
+
+def query_track(
+    model=SailingTrackLine, track_id=None, bbox=None, start=None, stop=None, level=None
+):
+    """
+    Read the rows of `model` filtered by track id, bounding box, time window and
+    (for sailing_track_lod) level of detail.
+    """
+    import geopandas as gpd
+
+    sql, params = track_query(model, track_id, bbox, start, stop, level=level)
+    sql += f" ORDER BY {time_column(model)}"
+    return gpd.read_postgis(text(sql), get_engine(), geom_col="geometry", params=params)
+
+
+def query_track_ids(model=SailingTrackLine, bbox=None, start=None, stop=None):
+    """
+    Ids of the tracks with rows of `model` in a bounding box and time window.
+    """
+    sql, params = track_query(
+        model, bbox=bbox, start=start, stop=stop, columns="DISTINCT track_id"
+    )
+    with get_engine().connect() as connection:
+        return sorted(connection.execute(text(sql), params).scalars())
+
+
+def explain_track_query(
+    model=SailingTrackLine, track_id=None, bbox=None, start=None, stop=None
+):
+    """
+    EXPLAIN plan lines of the `query_track` query.
+    """
+    sql, params = track_query(model, track_id, bbox, start, stop)
+    with get_engine().connect() as connection:
+        return [row[0] for row in connection.execute(text(f"EXPLAIN {sql}"), params)]
+
+
+def used_indexes(plan):
+    """
+    Names of the indexes scanned in an EXPLAIN plan.
+    """
+    pattern = re.compile(r"(?:Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)")
+    return {name for line in plan for name in pattern.findall(line)}
+
+
+def maneuver_stats(kind=None, track_ids=None):
+    """
+    Count and mean duration, speed loss and distance lost of the saved
+    maneuvers per track and kind, read from the sailing_maneuver table only.
+    """
+    where, params = [], {}
+    if kind is not None:
+        where.append("kind = :kind")
+        params["kind"] = kind
+    if track_ids is not None:
+        where.append("track_id = ANY(:track_ids)")
+        params["track_ids"] = [str(track_id) for track_id in track_ids]
+    sql = (
+        "SELECT track_id, kind, count(*) AS maneuvers, avg(duration) AS duration, "
+        "avg(speed_loss) AS speed_loss, avg(distance_lost) AS distance_lost "
+        f"FROM {SailingManeuver.__tablename__}"
+    )
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " GROUP BY track_id, kind ORDER BY track_id, kind"
+    return pd.read_sql(text(sql), get_engine(), params=params)
+
+
+def point_of_sail_stats(track_ids=None, start=None, stop=None):
+    """
+    Time, distance and mean speed sailed per track, point of sail and board,
+    read from the run-length encoded sailing_point_of_sail table only.
+    """
+    sql, params = track_query(
+        SailingPointOfSail,
+        start=start,
+        stop=stop,
+        columns="track_id, point_of_sail, board, count(*) AS runs, "
+        "sum(duration) AS duration, sum(distance) AS distance, "
+        "sum(distance) / nullif(sum(duration), 0) AS mean_speed",
+    )
+    if track_ids is not None:
+        sql += " AND" if params else " WHERE"
+        sql += " track_id = ANY(:track_ids)"
+        params["track_ids"] = [str(track_id) for track_id in track_ids]
+    sql += (
+        " GROUP BY track_id, point_of_sail, board"
+        " ORDER BY track_id, point_of_sail, board"
+    )
+    return pd.read_sql(text(sql), get_engine(), params=params)
+
+
+def query_polar(track_ids=None):
+    """
+    Boat polar of the saved tracks (all of them by default), summed per bin by
+    the database from the sailing_polar table.
+    """
+    where, params = "", {}
+    if track_ids is not None:
+        where = " WHERE track_id = ANY(:track_ids)"
+        params["track_ids"] = [str(track_id) for track_id in track_ids]
+    table = SailingPolar.__tablename__
+    bins = pd.read_sql(
+        text(
+            f"SELECT twa, tws, speed, sum(seconds) AS seconds FROM {table}{where} "
+            "GROUP BY twa, tws, speed"
+        ),
+        get_engine(),
+        params=params,
+    )
+    polar = PolarAccumulator.from_frame(bins)
+    with get_engine().connect() as connection:
+        polar.track_ids.update(
+            connection.execute(
+                text(f"SELECT DISTINCT track_id FROM {table}{where}"), params
+            ).scalars()
+        )
+    return polar
+
+
+def track_summary_hash(track_id):
+    """
+    Content hash of the saved summary of a track, None when there is none.
+    """
+    with get_engine().connect() as connection:
+        return connection.execute(
+            text(
+                f"SELECT content_hash FROM {TrackSummary.__tablename__} "
+                "WHERE track_id = :track_id"
+            ),
+            {"track_id": str(track_id)},
+        ).scalar()
+
+
+def list_tracks(bbox=None, start=None, stop=None, min_length=None, min_maneuvers=None):
+    """
+    Summaries of the saved tracks starting in a time window, crossing a bounding
+    box (xmin, ymin, xmax, ymax) and at least `min_length` meters long or with
+    `min_maneuvers`, in a single query on the track_summary table.
+    """
+    import geopandas as gpd
+
+    sql, params = track_query(TrackSummary, bbox=bbox, start=start, stop=stop)
+    where = []
+    if min_length is not None:
+        where.append("length >= :min_length")
+        params["min_length"] = float(min_length)
+    if min_maneuvers is not None:
+        where.append("maneuvers >= :min_maneuvers")
+        params["min_maneuvers"] = int(min_maneuvers)
+    if where:
+        sql += (" AND " if " WHERE " in sql else " WHERE ") + " AND ".join(where)
+    sql += " ORDER BY start_time"
+    return gpd.read_postgis(text(sql), get_engine(), geom_col="geometry", params=params)
+
+
+def query_owm_data(start=None, stop=None):
+    """
+    Saved OWM weather between start and stop, with the lat and lon columns
+    `join_weather` expects.
+    """
+    sql, params = track_query(OWM_data, start=start, stop=stop)
+    return pd.read_sql(text(sql), get_engine(), params=params).rename(
+        columns={"latitude": "lat", "longitude": "lon"}
+    )
+
+
+def load_compact(track_id):
+    """
+    Track points and segments of a track saved on the compact
+    sailing_track_compact table, in the sailing_track_point and
+    sailing_track_line layouts.
+    """
+    import geopandas as gpd
+
+    from compact_tools import from_compact
+
+    sql, params = track_query(SailingTrackCompact, track_id)
+    compact = gpd.read_postgis(
+        text(f"{sql} ORDER BY track_fid, track_seg_id"),
+        get_engine(),
+        geom_col="geometry",
+        params=params,
+    )
+    if compact.empty:
+        raise ValueError(f"No {SailingTrackCompact.__tablename__} rows for {track_id}")
+    return from_compact(compact)
+
+
+def _iter_postgis(sql, params, chunksize):
+    import geopandas as gpd
+
+    # a server side cursor keeps only one chunk in memory at a time
+    with get_engine().connect().execution_options(stream_results=True) as connection:
+        yield from gpd.read_postgis(
+            text(sql),
+            connection,
+            geom_col="geometry",
+            params=params,
+            chunksize=chunksize,
+        )
+
+
+def _gpkg_layer(gpkg_path, track_id, model):
+    import fiona
+
+    suffix = GPKG_SUFFIXES[model.__tablename__]
+    for layer in fiona.listlayers(gpkg_path):
+        if layer.endswith(f"_{track_id}_{suffix}"):
+            return layer
+    raise ValueError(f"No {suffix} layer for track {track_id} on {gpkg_path}")
+
+
+def _gpkg_tz(gpkg_path, layer, time):
+    # time zone of the times stored on a layer, None when they are naive
+    with closing(sqlite3.connect(gpkg_path)) as connection:
+        row = connection.execute(f'SELECT "{time}" FROM "{layer}" LIMIT 1').fetchone()
+    return None if row is None else pd.Timestamp(row[0]).tz
+
+
+def _gpkg_bound(value, model, layer_tz):
+    # tz-aware layers (track points) compare in their offset, naive ones in
+    # the convention of `time_bound`
+    value = pd.Timestamp(value)
+    if layer_tz is None:
+        value = time_bound(value, model)
+    elif value.tz is None:
+        value = value.tz_localize(layer_tz)
+    # OGR writes whole seconds without milliseconds: compare as julian days
+    return f"julianday('{value.isoformat()}')"
+
+
+def _gpkg_where(gpkg_path, layer, model, start, stop, level=None):
+    where = []
+    if level is not None:
+        where.append(f"level = {int(level)}")
+    if start is None and stop is None:
+        return " AND ".join(where) or None
+    time = time_column(model)
+    layer_tz = _gpkg_tz(gpkg_path, layer, time)
+    if start is not None:
+        where.append(f"julianday({time}) >= {_gpkg_bound(start, model, layer_tz)}")
+    if stop is not None:
+        where.append(f"julianday({time}) < {_gpkg_bound(stop, model, layer_tz)}")
+    return " AND ".join(where)
+
+
+def _iter_gpkg(gpkg_path, layer, bbox, where, chunksize):
+    import fiona
+    import geopandas as gpd
+
+    with fiona.open(gpkg_path, layer=layer) as source:
+        chunk = []
+        for feature in source.filter(bbox=bbox, where=where):
+            chunk.append(feature)
+            if len(chunk) == chunksize:
+                yield gpd.GeoDataFrame.from_features(chunk, crs=source.crs)
+                chunk = []
+        if chunk:
+            yield gpd.GeoDataFrame.from_features(chunk, crs=source.crs)
+
+
+def load_track(
+    track_id,
+    model=SailingTrackLine,
+    post_gis=True,
+    bbox=None,
+    start=None,
+    stop=None,
+    chunksize=None,
+    gpkg_path="SailingAnalysis.gpkg",
+    resolution=None,
+    archive_dir=None,
+):
+    """
+    Load a saved track, or a time window / bounding box (xmin, ymin, xmax, ymax)
+    slice of it, from PostGIS, the GeoParquet archive on `archive_dir` or
+    SailingAnalysis.gpkg (single tables or a layer per track). Filters run in
+    the database (or on the archive row group statistics); with `chunksize` a
+    generator of GeoDataFrames is returned instead.
+    With a `resolution` in meters per pixel (see `lod_tools.map_resolution`)
+    the segments are read from the coarsest level of detail fitting it.
+    """
+    level = pick_level(resolution) if resolution is not None else 0
+    if level and model is SailingTrackLine:
+        model = SailingTrackLOD
+    else:
+        level = None
+    if post_gis:
+        if chunksize is None:
+            return query_track(model, track_id, bbox, start, stop, level)
+        sql, params = track_query(model, track_id, bbox, start, stop, level=level)
+        sql += f" ORDER BY {time_column(model)}"
+        return _iter_postgis(sql, params, chunksize)
+    if archive_dir is not None:
+        from parquet_tools import read_archive
+
+        return read_archive(
+            model,
+            [track_id],
+            bbox,
+            start,
+            stop,
+            level=level,
+            archive_dir=archive_dir,
+            chunksize=chunksize,
+        )
+
+    import geopandas as gpd
+
+    from gpkg_tools import has_table, read_gpkg
+
+    # single table layout, one table per model shared by every track
+    if has_table(model, gpkg_path):
+        return read_gpkg(
+            model,
+            [track_id],
+            bbox,
+            start,
+            stop,
+            level=level,
+            gpkg_path=gpkg_path,
+            chunksize=chunksize,
+        )
+    layer = _gpkg_layer(gpkg_path, track_id, model)
+    where = _gpkg_where(gpkg_path, layer, model, start, stop, level)
+    if chunksize is None:
+        return gpd.read_file(gpkg_path, layer=layer, bbox=bbox, where=where)
+    return _iter_gpkg(gpkg_path, layer, bbox, where, chunksize)
@@ -0,0 +1,155 @@
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from db_tools import _iter_gpkg, _table_frame, time_bound, time_column
+from models import SailingTrackLine
+
+GPKG_PATH = "SailingAnalysis.gpkg"
+
+
+def _connect(gpkg_path):
+    return closing(sqlite3.connect(gpkg_path))
+
+
+def has_table(model, gpkg_path=GPKG_PATH):
+    """
+    True when the GeoPackage has the single table of `model` (named like the
+    PostGIS table) instead of a layer per track.
+    """
+    if not Path(gpkg_path).exists():
+        return False
+    with _connect(gpkg_path) as connection:
+        return (
+            connection.execute(
+                "SELECT 1 FROM gpkg_contents WHERE table_name = ?",
+                (model.__tablename__,),
+            ).fetchone()
+            is not None
+        )
+
+
+def saved(track_id, model=SailingTrackLine, gpkg_path=GPKG_PATH):
+    """
+    True when the `model` table of the GeoPackage has rows of `track_id`.
+    """
+    if not has_table(model, gpkg_path):
+        return False
+    with _connect(gpkg_path) as connection:
+        return (
+            connection.execute(
+                f"SELECT 1 FROM {model.__tablename__} WHERE track_id = ? LIMIT 1",
+                (str(track_id),),
+            ).fetchone()
+            is not None
+        )
+
+
+def create_indexes(model, gpkg_path=GPKG_PATH):
+    """
+    SQLite indexes on (track_id, julianday(time)) and julianday(time) of the
+    `model` table, next to the R-tree spatial index GDAL keeps on its geometry.
+    """
+    table, time = model.__tablename__, time_column(model)
+    with _connect(gpkg_path) as connection, connection:
+        # replaced by the julianday indexes, OGR does not write every time alike
+        connection.execute(f"DROP INDEX IF EXISTS ix_{table}_track_id_{time}")
+        connection.execute(f"DROP INDEX IF EXISTS ix_{table}_{time}")
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_track_id_julianday_{time} "
+            f"ON {table} (track_id, julianday({time}))"
+        )
+        connection.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_julianday_{time} "
+            f"ON {table} (julianday({time}))"
+        )
+
+
+def append_gpkg(frame, model, gpkg_path=GPKG_PATH):
+    """
+    Insert the rows of one or many tracks in the `model` table of the
+    GeoPackage, with the PostGIS columns and naive UTC timestamps, in a single
+    transaction. The table, its R-tree and its indexes are created on the first
+    insert. Returns the inserted rows.
+    """
+    frame = _table_frame(frame, model)
+    frame = frame.sort_values(["track_id", time_column(model)], kind="stable")
+    frame.to_file(
+        gpkg_path,
+        layer=model.__tablename__,
+        driver="GPKG",
+        engine="pyogrio",
+        mode="a" if has_table(model, gpkg_path) else "w",
+    )
+    create_indexes(model, gpkg_path)
+    return len(frame)
+
+
+def replace_gpkg(frame, model, gpkg_path=GPKG_PATH):
+    """
+    Replace the rows of the tracks of `frame` on the `model` table of the
+    GeoPackage.
+    """
+    if has_table(model, gpkg_path):
+        track_ids = [str(track_id) for track_id in frame.track_id.unique()]
+        with _connect(gpkg_path) as connection, connection:
+            connection.execute(
+                f"DELETE FROM {model.__tablename__} WHERE track_id IN "
+                f"({', '.join('?' * len(track_ids))})",
+                track_ids,
+            )
+    return append_gpkg(frame, model, gpkg_path)
+
+
+def _bound(value, model):
+    # OGR writes whole seconds without and other times with milliseconds, so
+    # times are compared as julian days, through the julianday indexes
+    return f"julianday('{time_bound(value, model).isoformat()}')"
+
+
+def _where(model, track_ids, start, stop, level):
+    where = []
+    if track_ids is not None:
+        quoted = ", ".join(f"'{track_id}'" for track_id in track_ids)
+        where.append(f"track_id IN ({quoted})")
+    if level is not None:
+        where.append(f"level = {int(level)}")
+    if start is not None:
+        where.append(f"julianday({time_column(model)}) >= {_bound(start, model)}")
+    if stop is not None:
+        where.append(f"julianday({time_column(model)}) < {_bound(stop, model)}")
+    return " AND ".join(where) or None
+
+
+def read_gpkg(
+    model=SailingTrackLine,
+    track_ids=None,
+    bbox=None,
+    start=None,
+    stop=None,
+    columns=None,
+    level=None,
+    gpkg_path=GPKG_PATH,
+    chunksize=None,
+):
+    """
+    Read the rows of the `model` table of the GeoPackage filtered by track ids,
+    bounding box (xmin, ymin, xmax, ymax, through the R-tree), time window and
+    level of detail (through the SQLite indexes), across every track in one
+    query. With `chunksize` a generator of GeoDataFrames is returned instead.
+    """
+    import geopandas as gpd
+
+    layer = model.__tablename__
+    if not has_table(model, gpkg_path):
+        raise ValueError(f"No {layer} table on {gpkg_path}")
+    where = _where(model, track_ids, start, stop, level)
+    if chunksize is not None:
+        return _iter_gpkg(gpkg_path, layer, bbox, where, chunksize)
+    frame = gpd.read_file(
+        gpkg_path, layer=layer, bbox=bbox, where=where, columns=columns
+    )
+    time = time_column(model)
+    if time in frame:
+        frame = frame.sort_values(time, kind="stable").reset_index(drop=True)
+    return frame
@@ -0,0 +1,132 @@
+from array import array
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+
+GPX_CRS = "EPSG:4326"
+GPX_COLUMNS = ("track_fid", "track_seg_id", "track_seg_point_id", "lat", "lon", "ele")
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _new_buffer():
+    return {
+        "track_fid": array("q"),
+        "track_seg_id": array("q"),
+        "track_seg_point_id": array("q"),
+        "lat": array("d"),
+        "lon": array("d"),
+        "ele": array("d"),
+        "time": [],
+    }
+
+
+def _parse_times(times):
+    # GPX times are UTC ISO 8601, usually with a "Z" suffix numpy refuses to parse
+    try:
+        return np.array(
+            [t[:-1] if t and t.endswith("Z") else t or "NaT" for t in times],
+            dtype="datetime64[ns]",
+        )
+    except ValueError:
+        return pd.to_datetime(pd.Series(times), utc=True).dt.tz_localize(None).values
+
+
+def _to_columns(buffer):
+    columns = {name: np.array(buffer[name]) for name in GPX_COLUMNS}
+    columns["time"] = _parse_times(buffer["time"])
+    return columns
+
+
+def iter_gpx_chunks(gpx_path, chunk_size=100_000):
+    """
+    Stream the track points of a GPX file as dicts of NumPy arrays holding at
+    most `chunk_size` points each. Ids follow OGR's GPX `track_points` layer.
+    """
+    track_fid = track_seg_id = track_seg_point_id = -1
+    buffer = _new_buffer()
+    point = parent = None
+    for event, element in iterparse(Path(gpx_path), events=("start", "end")):
+        tag = _local_name(element.tag)
+        if event == "start":
+            if tag == "trk":
+                track_fid += 1
+                track_seg_id = -1
+            elif tag == "trkseg":
+                track_seg_id += 1
+                track_seg_point_id = -1
+                parent = element
+            elif tag == "trkpt":
+                track_seg_point_id += 1
+                point = {"ele": np.nan, "time": None}
+            continue
+
+        if point is None:
+            if tag in ("trk", "wpt", "rte"):
+                element.clear()
+            continue
+        if tag == "ele":
+            point["ele"] = float(element.text)
+        elif tag == "time":
+            point["time"] = element.text.strip()
+        elif tag == "trkpt":
+            buffer["track_fid"].append(track_fid)
+            buffer["track_seg_id"].append(track_seg_id)
+            buffer["track_seg_point_id"].append(track_seg_point_id)
+            buffer["lat"].append(float(element.get("lat")))
+            buffer["lon"].append(float(element.get("lon")))
+            buffer["ele"].append(point["ele"])
+            buffer["time"].append(point["time"])
+            point = None
+            # drop parsed points from the tree so memory stays bounded
+            del parent[:]
+            if len(buffer["lat"]) >= chunk_size:
+                yield _to_columns(buffer)
+                buffer = _new_buffer()
+    if len(buffer["lat"]):
+        yield _to_columns(buffer)
+
+
+def read_gpx(gpx_path):
+    """
+    Read all track points of a GPX file into a dict of NumPy arrays
+    (track_fid, track_seg_id, track_seg_point_id, lat, lon, ele, time as UTC).
+    """
+    chunks = list(iter_gpx_chunks(gpx_path, chunk_size=1_000_000))
+    if not chunks:
+        return _to_columns(_new_buffer())
+    if len(chunks) == 1:
+        return chunks[0]
+    return {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+
+
+def gpx_to_geodataframe(columns, tz=None):
+    """
+    Build the track points GeoDataFrame from `read_gpx`/`iter_gpx_chunks` columns,
+    with the same columns `export_gpx` used to get from fiona.
+    """
+    import geopandas as gpd
+
+    time = pd.to_datetime(columns["time"]).tz_localize("UTC")
+    if tz is not None:
+        time = time.tz_convert(tz)
+    return gpd.GeoDataFrame(
+        {
+            "track_fid": columns["track_fid"],
+            "track_seg_id": columns["track_seg_id"],
+            "track_seg_point_id": columns["track_seg_point_id"],
+            "ele": columns["ele"],
+            "time": time,
+        },
+        geometry=gpd.points_from_xy(columns["lon"], columns["lat"]),
+        crs=GPX_CRS,
+    )
+
+
+def iter_gpx_geodataframes(gpx_path, chunk_size=100_000, tz=None):
+    for columns in iter_gpx_chunks(gpx_path, chunk_size=chunk_size):
+        yield gpx_to_geodataframe(columns, tz=tz)
@@ -0,0 +1,165 @@
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from pathlib import Path
+
+import jsonlines
+
+MANIFEST_FILE = Path("./data/ingest_manifest.jsonl")
+# pools started again for the files left unfinished when a worker crashes
+MAX_POOL_RESTARTS = 3
+
+
+def find_gpx_files(source):
+    """
+    List the GPX files of a directory (recursively) or matching a glob pattern.
+    """
+    source_path = Path(source)
+    if source_path.is_dir():
+        files = (p for p in source_path.rglob("*") if p.suffix.lower() == ".gpx")
+    else:
+        files = (Path(p) for p in glob.glob(str(source), recursive=True))
+    return sorted(p.resolve() for p in files if p.is_file())
+
+
+def read_manifest(manifest_path=MANIFEST_FILE):
+    """
+    Return the latest manifest entry of each ingested file, keyed by path.
+    """
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return {}
+    with jsonlines.open(manifest_path) as reader:
+        return {entry["path"]: entry for entry in reader.iter(skip_invalid=True)}
+
+
+def _init_worker():
+    # connections pooled by the parent process must not be shared with workers
+    from models import get_engine
+
+    if get_engine.cache_info().currsize:
+        get_engine().dispose(close=False)
+
+
+def _ingest_file(gpx_path, layer, to_postgis, options):
+    from spatial_tools import export_gpx
+
+    start = time.perf_counter()
+    entry = {"path": str(gpx_path), "track_id": None, "points": 0, "segments": 0}
+    try:
+        track_df, trajectory = export_gpx(
+            gpx_path=gpx_path, layer=layer, to_postgis=to_postgis, **options
+        )
+        entry.update(
+            track_id=str(track_df.track_id.iloc[0]),
+            points=len(track_df),
+            segments=len(trajectory),
+            status="ok",
+            error=None,
+        )
+    except Exception as error:  # a corrupt file must not stop the batch
+        entry.update(status="error", error=f"{type(error).__name__}: {error}")
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    entry["ingested_at"] = datetime.now(timezone.utc).isoformat()
+    return entry
+
+
+def _crash_entry(gpx_path):
+    return {
+        "path": str(gpx_path),
+        "track_id": None,
+        "points": 0,
+        "segments": 0,
+        "status": "error",
+        "error": "BrokenProcessPool: the worker process crashed",
+        "seconds": None,
+        "ingested_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def _ingest_pool(paths, workers, layer, to_postgis, options, record):
+    # ingest paths on a new pool, returning the paths left unfinished when a
+    # worker dies (e.g. a crash inside GDAL), which breaks every pending future
+    unfinished = []
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(paths)), initializer=_init_worker
+    ) as executor:
+        futures = {
+            executor.submit(_ingest_file, path, layer, to_postgis, options): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            try:
+                entry = future.result()
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+                continue
+            record(entry)
+    return sorted(unfinished)
+
+
+def ingest_directory(
+    source,
+    manifest_path=MANIFEST_FILE,
+    layer="track_points",
+    to_postgis=True,
+    workers=None,
+    retry_failed=False,
+    **options,
+):
+    """
+    Ingest every GPX file of a directory or glob with `export_gpx` (passing it
+    `options`, e.g. `archive_dir` or `gpkg_tables`), one worker process per
+    core. Each processed file is appended to the manifest with its track id and
+    timing; files already in the manifest are skipped. When a worker crashes
+    the files left are ingested on a new pool, up to `MAX_POOL_RESTARTS` times,
+    then one process each, and only the crashing file is recorded as failed.
+    """
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(manifest_path)
+    skip_status = {"ok"} if retry_failed else {"ok", "error"}
+    pending = [
+        path
+        for path in find_gpx_files(source)
+        if manifest.get(str(path), {}).get("status") not in skip_status
+    ]
+    logging.warning(
+        f"{len(pending)} GPX files to ingest from {source} ({len(manifest)} in manifest)"
+    )
+    if not pending:
+        return []
+
+    entries = []
+    workers = workers or os.cpu_count()
+    if not to_postgis and workers > 1:
+        # SailingAnalysis.gpkg is a single SQLite file: writers must not overlap
+        logging.warning("Writing to GeoPackage, ingesting with a single worker")
+        workers = 1
+    with jsonlines.open(manifest_path, "a", flush=True) as writer:
+
+        def record(entry):
+            writer.write(entry)
+            entries.append(entry)
+            if entry["status"] == "ok":
+                logging.warning(
+                    f"{entry['path']} ingested as {entry['track_id']} in {entry['seconds']}s"
+                )
+            else:
+                logging.warning(f"{entry['path']} failed: {entry['error']}")
+
+        for _ in range(MAX_POOL_RESTARTS + 1):
+            pending = _ingest_pool(pending, workers, layer, to_postgis, options, record)
+            if not pending:
+                return entries
+            logging.warning(f"Worker crashed, {len(pending)} files left to ingest")
+        # a file crashing every pool: ingest the rest one process each, so only
+        # the file killing its own worker is recorded as crashed
+        for path in pending:
+            if _ingest_pool([path], 1, layer, to_postgis, options, record):
+                record(_crash_entry(path))
+    return entries
@@ -0,0 +1,168 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from metrics_tools import haversine_distance
+
+# trajectory segments joined at once, bounding the segment by site arrays
+JOIN_CHUNK_ROWS = 100_000
+
+
+def _epoch(time, tz=None):
+    time = pd.DatetimeIndex(time)
+    if time.tz is None:
+        # naive times are read in `tz`, or as UTC when it is not given
+        time = time.tz_localize(tz or "UTC")
+    return (time - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+
+
+def _unit_vectors(lon, lat):
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+def _positions(gdf):
+    geometry = gdf.geometry.values
+    if (shapely.get_type_id(geometry) == 0).all():
+        return shapely.get_x(geometry), shapely.get_y(geometry)
+    # segment midpoints
+    coords = shapely.get_coordinates(geometry).reshape(len(gdf), -1, 2)
+    middle = coords[:, [0, -1]].mean(axis=1)
+    return middle[:, 0], middle[:, 1]
+
+
+def meteostat_to_owm(data, latitude, longitude):
+    """
+    Rename and convert meteostat hourly data (naive UTC time index, wind in
+    km/h) to the OWM columns, so both sources can be joined together.
+    """
+    return pd.DataFrame(
+        {
+            "lat": latitude,
+            "lon": longitude,
+            "temp": data["temp"].values,
+            "pressure": data["pres"].values,
+            "humidity": data["rhum"].values,
+            "wind_speed": data["wspd"].values / 3.6,
+            "wind_deg": data["wdir"].values,
+            "time": pd.DatetimeIndex(data.index).tz_localize("UTC"),
+        }
+    )
+
+
+def join_weather(
+    traj,
+    weather,
+    time_column="t",
+    traj_tz=None,
+    weather_tz=None,
+    columns=("temp", "pressure", "humidity"),
+    speed="wind_speed",
+    direction="wind_deg",
+    power=2,
+    max_sites=4,
+    max_gap=timedelta(hours=2),
+):
+    """
+    Attach weather to every trajectory segment (or point). Each weather site
+    (distinct lat/lon) is interpolated linearly in time at the segment time, and
+    sites are combined with inverse distance weighting from the segment
+    midpoint, using the `max_sites` nearest sites with data less than `max_gap`
+    away in time. Wind direction is interpolated on the circle, so 350° and 10°
+    average to 0°.
+    """
+    columns = [c for c in columns if c in weather.columns]
+    seconds = np.asarray(_epoch(traj[time_column], traj_tz))
+    x, y = _positions(traj)
+    gap = max_gap.total_seconds()
+
+    weather = weather.assign(_seconds=np.asarray(_epoch(weather["time"], weather_tz)))
+    weather = weather[
+        weather[speed].notna()
+        & weather[direction].notna()
+        & weather._seconds.between(seconds.min() - gap, seconds.max() + gap)
+    ]
+    sites, site_index = np.unique(
+        weather[["lat", "lon"]].to_numpy(), axis=0, return_inverse=True
+    )
+    weather = weather.assign(_site=site_index.ravel()).sort_values(
+        ["_site", "_seconds"], kind="stable"
+    )
+
+    n = len(traj)
+    joined = traj.copy()
+    if not len(sites):
+        for name in [*columns, speed, direction]:
+            joined[name] = np.nan
+        return joined
+
+    # the nearest sites by chord length on the unit sphere, which orders them
+    # like the great circle distance, without a segment by site matrix
+    k = min(max_sites or len(sites), len(sites))
+    tree = cKDTree(_unit_vectors(sites[:, 1], sites[:, 0]))
+    traj_vectors = _unit_vectors(x, y)
+
+    # weather rows of site s are offsets[s]:offsets[s + 1], sorted by time, so
+    # one searchsorted on (site, time) keys interpolates every site at once
+    times = weather._seconds.to_numpy()
+    site_of_row = weather._site.to_numpy()
+    offsets = np.searchsorted(site_of_row, np.arange(len(sites) + 1))
+    span = times.max() - times.min() + 1
+    keys = site_of_row * span + (times - times.min())
+    values = {name: weather[name].to_numpy(dtype=float) for name in [*columns, speed]}
+    radians = np.radians(weather[direction].to_numpy(dtype=float))
+    values["sin"], values["cos"] = np.sin(radians), np.cos(radians)
+
+    results = {name: np.full(n, np.nan) for name in [*columns, speed, direction]}
+    for first in range(0, n, JOIN_CHUNK_ROWS):
+        chunk = slice(first, first + JOIN_CHUNK_ROWS)
+        _, site = tree.query(traj_vectors[chunk], k=k)
+        site = site.reshape(len(traj_vectors[chunk]), k)
+        distance = haversine_distance(
+            x[chunk, None], y[chunk, None], sites[site, 1], sites[site, 0]
+        )
+        chunk_seconds = seconds[chunk, None]
+
+        low, high = offsets[site], offsets[site + 1]
+        position = np.searchsorted(keys, site * span + (chunk_seconds - times.min()))
+        after = np.clip(position, low + 1, high - 1)
+        before = np.maximum(after - 1, low)
+        gaps = times[after] - times[before]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.clip(
+                np.where(gaps > 0, (chunk_seconds - times[before]) / gaps, 0.0), 0, 1
+            )
+        nearest_gap = np.minimum(
+            np.abs(chunk_seconds - times[before]), np.abs(chunk_seconds - times[after])
+        )
+        weight = np.where(
+            nearest_gap <= gap, 1 / np.maximum(distance, 1.0) ** power, 0.0
+        )
+
+        def interpolate(name):
+            return values[name][before] + fraction * (
+                values[name][after] - values[name][before]
+            )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name in [*columns, speed]:
+                interpolated = interpolate(name)
+                valid = np.isfinite(interpolated) & (weight > 0)
+                results[name][chunk] = np.where(valid, weight * interpolated, 0.0).sum(
+                    axis=1
+                ) / np.where(valid, weight, 0.0).sum(axis=1)
+        sin = (weight * interpolate("sin")).sum(axis=1)
+        cos = (weight * interpolate("cos")).sum(axis=1)
+        wind_deg = np.round(np.degrees(np.arctan2(sin, cos)), 6) % 360
+        results[direction][chunk] = np.where(
+            np.isfinite(results[speed][chunk]), wind_deg, np.nan
+        )
+
+    for name, result in results.items():
+        joined[name] = result
+    return joined
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+from metrics_tools import EARTH_RADIUS, initial_bearing
+
+# Douglas-Peucker tolerance (meters) and minimum seconds between kept points of
+# each level of detail, level 0 is the full resolution trajectory. A boat under
+# 5 m/s does not sail further than the tolerance between kept points.
+LOD_LEVELS = {
+    1: (2.0, 1.0),
+    2: (10.0, 2.0),
+    3: (50.0, 10.0),
+    4: (250.0, 50.0),
+}
+# simplification error allowed on a map, in pixels
+PIXEL_TOLERANCE = 1.0
+LOD_COLUMNS = [
+    "track_id",
+    "level",
+    "angular_difference",
+    "direction",
+    "distance",
+    "speed",
+    "timedelta",
+    "t",
+    "prev_t",
+    "geometry",
+]
+
+
+def _track_points(traj):
+    # the start of every segment plus the end of the last one
+    geometry = np.asarray(traj.geometry.values)
+    coords = np.concatenate(
+        [
+            shapely.get_coordinates(shapely.get_point(geometry, 0)),
+            shapely.get_coordinates(shapely.get_point(geometry[-1:], -1)),
+        ]
+    )
+    times = np.r_[
+        pd.DatetimeIndex(traj.prev_t).as_unit("ns").asi8,
+        pd.DatetimeIndex(traj.t[-1:]).as_unit("ns").asi8,
+    ]
+    return coords, times
+
+
+def keep_points(coords, times, tolerance, min_interval, forced=None):
+    """
+    Mask of the points of a time-sorted lon/lat track kept by keeping the first
+    point of every `min_interval` seconds and simplifying the result with
+    Douglas-Peucker at `tolerance` meters. The ends of the track and the
+    `forced` point indexes (e.g. maneuvers) are always kept.
+    """
+    n = len(coords)
+    keep = np.zeros(n, dtype=bool)
+    bucket = (times - times[0]) // int(min_interval * 1e9)
+    keep[np.r_[True, bucket[1:] != bucket[:-1]]] = True
+    anchor = np.zeros(n, dtype=bool)
+    anchor[[0, -1]] = True
+    if forced is not None:
+        anchor[forced] = True
+    keep |= anchor
+    if not tolerance:
+        return keep
+
+    # simplify in local meters, between consecutive anchors so they are kept
+    index = np.flatnonzero(keep)
+    lat0 = np.radians(coords[index, 1].mean())
+    x = np.radians(coords[index, 0]) * np.cos(lat0) * EARTH_RADIUS
+    y = np.radians(coords[index, 1]) * EARTH_RADIUS
+    pieces = np.flatnonzero(anchor[index])
+    lengths = np.diff(pieces) + 1
+    piece = np.repeat(np.arange(len(lengths)), lengths)
+    position = (
+        pieces[piece]
+        + np.arange(len(piece))
+        - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    )
+    lines = shapely.linestrings(
+        np.stack([x[position], y[position], position], axis=1), indices=piece
+    )
+    simplified = shapely.simplify(lines, tolerance, preserve_topology=False)
+    kept = shapely.get_coordinates(simplified, include_z=True)[:, 2].astype(int)
+    keep[:] = False
+    keep[index[kept]] = True
+    return keep
+
+
+def simplify_trajectory(traj, tolerance, min_interval, maneuvers=None, level=None):
+    """
+    Trajectory segments GeoDataFrame simplified by `keep_points`, keeping the
+    entry and exit points of `maneuvers`. Each simplified segment sums the
+    distance and time of the segments it replaces and keeps their largest
+    angular difference.
+    """
+    import geopandas as gpd
+
+    traj = traj.sort_values("t", kind="stable")
+    coords, times = _track_points(traj)
+    forced = None
+    if maneuvers is not None and len(maneuvers):
+        events = np.r_[
+            pd.DatetimeIndex(maneuvers.entry_time).as_unit("ns").asi8,
+            pd.DatetimeIndex(maneuvers.exit_time).as_unit("ns").asi8,
+        ]
+        forced = np.clip(np.searchsorted(times, events), 0, len(times) - 1)
+    kept = np.flatnonzero(keep_points(coords, times, tolerance, min_interval, forced))
+
+    starts = kept[:-1]
+    distance = np.add.reduceat(traj["distance"].to_numpy(dtype=float), starts)
+    timedelta = np.add.reduceat(traj["timedelta"].to_numpy(dtype=float), starts)
+    x, y = coords[kept, 0], coords[kept, 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = np.where(timedelta > 0, distance / timedelta, 0.0)
+    return gpd.GeoDataFrame(
+        {
+            "track_id": traj.track_id.to_numpy()[starts],
+            "level": level,
+            "angular_difference": np.maximum.reduceat(
+                traj.angular_difference.fillna(0).to_numpy(dtype=float), starts
+            ),
+            "direction": initial_bearing(x[:-1], y[:-1], x[1:], y[1:]),
+            "distance": distance,
+            "speed": speed,
+            "timedelta": timedelta,
+            "t": traj.t.to_numpy()[kept[1:] - 1],
+            "prev_t": traj.prev_t.to_numpy()[starts],
+        },
+        geometry=shapely.linestrings(
+            np.stack([coords[kept[:-1]], coords[kept[1:]]], axis=1)
+        ),
+        crs=traj.crs,
+    )
+
+
+def build_levels(traj, maneuvers=None, levels=LOD_LEVELS):
+    """
+    Every simplified level of a trajectory in one GeoDataFrame with a `level`
+    column, for the sailing_track_lod table.
+    """
+    import geopandas as gpd
+
+    if len(traj) < 2:
+        return gpd.GeoDataFrame(columns=LOD_COLUMNS, geometry="geometry", crs=traj.crs)
+    return pd.concat(
+        [
+            simplify_trajectory(traj, tolerance, min_interval, maneuvers, level)
+            for level, (tolerance, min_interval) in levels.items()
+        ],
+        ignore_index=True,
+    )
+
+
+def map_resolution(bounds, width):
+    """
+    Meters per pixel of a lon/lat bounding box drawn `width` pixels wide.
+    """
+    xmin, ymin, xmax, ymax = bounds
+    latitude = np.radians((ymin + ymax) / 2)
+    return np.radians(xmax - xmin) * np.cos(latitude) * EARTH_RADIUS / width
+
+
+def pick_level(resolution, levels=LOD_LEVELS, pixel_tolerance=PIXEL_TOLERANCE):
+    """
+    Coarsest level whose tolerance is within `pixel_tolerance` pixels at a
+    `resolution` in meters per pixel, 0 (full resolution) when there is none.
+    """
+    fitting = [
+        level
+        for level, (tolerance, _) in levels.items()
+        if tolerance <= resolution * pixel_tolerance
+    ]
+    return max(fitting, default=0)
+
+
+def level_of_detail(traj, width, maneuvers=None, levels=LOD_LEVELS):
+    """
+    Trajectory simplified to the level fitting its extent drawn `width` pixels
+    wide, or the trajectory itself when the full resolution is needed.
+    """
+    if len(traj) < 2:
+        return traj
+    level = pick_level(map_resolution(traj.total_bounds, width), levels)
+    if not level:
+        return traj
+    return simplify_trajectory(traj, *levels[level], maneuvers, level)
@@ -0,0 +1,312 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from metrics_tools import angular_difference, haversine_distance, initial_bearing
+
+# heading change between consecutive segments (degrees) starting a maneuver,
+# and below which the boat is back on a steady course
+ENTER_TURN = 10.0
+EXIT_TURN = 5.0
+# minimum total heading change of a tack or gybe (degrees)
+MIN_HEADING_CHANGE = 60.0
+# seconds of steady course required before and after a maneuver
+MIN_STEADY = 10.0
+# maneuvers longer than this (seconds) are course changes, not tacks or gybes
+MAX_DURATION = 120.0
+# seconds before the maneuver used for the entry speed and course
+PRE_WINDOW = 30.0
+MANEUVER_COLUMNS = [
+    "track_id",
+    "kind",
+    "entry_time",
+    "exit_time",
+    "duration",
+    "entry_heading",
+    "exit_heading",
+    "heading_change",
+    "entry_speed",
+    "min_speed",
+    "exit_speed",
+    "speed_loss",
+    "distance_lost",
+    "geometry",
+]
+
+
+def _segment_arrays(traj, wind_column="wind_deg"):
+    geometry = np.asarray(traj.geometry.values)
+    start = shapely.get_point(geometry, 0)
+    end = shapely.get_point(geometry, -1)
+    return {
+        "t": pd.DatetimeIndex(traj.t).as_unit("ns").asi8 / 1e9,
+        "prev_t": pd.DatetimeIndex(traj.prev_t).as_unit("ns").asi8 / 1e9,
+        "direction": traj.direction.to_numpy(dtype=float),
+        "speed": traj.speed.to_numpy(dtype=float),
+        "x0": shapely.get_x(start),
+        "y0": shapely.get_y(start),
+        "x1": shapely.get_x(end),
+        "y1": shapely.get_y(end),
+        "wind": (
+            traj[wind_column].to_numpy(dtype=float)
+            if wind_column in traj.columns
+            else np.full(len(traj), np.nan)
+        ),
+    }
+
+
+def _signed_turn(direction):
+    turn = np.zeros(len(direction))
+    turn[1:] = (np.diff(direction) + 180) % 360 - 180
+    return turn
+
+
+def _hysteresis(turn, enter, exit):
+    # 1 from a turn above `enter` until the next turn below `exit`
+    code = np.where(turn >= enter, 1, np.where(turn < exit, 0, -1))
+    code[0] = max(code[0], 0)
+    last = np.maximum.accumulate(np.where(code >= 0, np.arange(len(code)), 0))
+    return code[last]
+
+
+def _runs(active):
+    edges = np.diff(np.r_[0, active, 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def _window_mean(values, cumulative, first, last):
+    # mean of values[first:last], NaN where the window is empty
+    count = last - first
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(
+            count > 0, (cumulative[last] - cumulative[first]) / count, np.nan
+        )
+
+
+def find_maneuvers(
+    arrays,
+    track_id=None,
+    enter_turn=ENTER_TURN,
+    exit_turn=EXIT_TURN,
+    min_heading_change=MIN_HEADING_CHANGE,
+    min_steady=MIN_STEADY,
+    max_duration=MAX_DURATION,
+    pre_window=PRE_WINDOW,
+):
+    """
+    Tack and gybe events of time-sorted segment arrays (see `_segment_arrays`)
+    in O(n) array operations. A maneuver starts at a heading change above
+    `enter_turn` and lasts until changes stay below `exit_turn` for `min_steady`
+    seconds; it is kept when its total heading change is above
+    `min_heading_change`, it lasts at most `max_duration` and the course is
+    steady for `min_steady` seconds before and after it.
+
+    Events are tacks or gybes when the course crosses the wind direction, or
+    dead downwind, while turning; other events (and all of them when the wind
+    is unknown) are turns. Distance lost is measured against the entry VMG,
+    along the wind for tacks and gybes and along the bisector of the entry and
+    exit courses for turns.
+    """
+    t, prev_t = arrays["t"], arrays["prev_t"]
+    n = len(t)
+    if n < 3:
+        return _events_frame({}, track_id)
+    turn = _signed_turn(arrays["direction"])
+    active = _hysteresis(np.abs(turn), enter_turn, exit_turn)
+    starts, ends = _runs(active)
+    if len(starts) > 1:
+        # runs split by less than `min_steady` seconds of steady course are one
+        gap = prev_t[starts[1:]] - t[ends[:-1]]
+        new = np.r_[True, gap >= min_steady]
+        starts, ends = starts[new], ends[np.r_[new[1:], True]]
+
+    cumulative_turn = np.r_[0, np.cumsum(turn)]
+    heading_change = cumulative_turn[ends + 1] - cumulative_turn[starts]
+    entry_time, exit_time = prev_t[starts], t[ends]
+    keep = (
+        (starts > 0)
+        & (np.abs(heading_change) >= min_heading_change)
+        & (exit_time - entry_time <= max_duration)
+        & (entry_time - prev_t[0] >= min_steady)
+        & (t[-1] - exit_time >= min_steady)
+    )
+    starts, ends, heading_change = starts[keep], ends[keep], heading_change[keep]
+    entry_time, exit_time = entry_time[keep], exit_time[keep]
+
+    speed = arrays["speed"]
+    cumulative_speed = np.r_[0, np.cumsum(speed)]
+    pre_first = np.searchsorted(t, entry_time - pre_window, side="right")
+    entry_speed = _window_mean(speed, cumulative_speed, pre_first, starts)
+    post_last = np.searchsorted(prev_t, exit_time + pre_window, side="left")
+    exit_speed = _window_mean(speed, cumulative_speed, ends + 1, post_last)
+    min_speed = np.minimum.reduceat(
+        np.r_[speed, np.inf], np.ravel([starts, ends + 1], "F")
+    )[::2]
+
+    entry_heading = arrays["direction"][starts - 1]
+    exit_heading = arrays["direction"][ends]
+    wind = arrays["wind"][starts]
+    # the course crosses the wind (tack) or dead downwind (gybe) while turning
+    entry_twa = (entry_heading - wind + 180) % 360 - 180
+    low = np.minimum(entry_twa, entry_twa + heading_change)
+    high = np.maximum(entry_twa, entry_twa + heading_change)
+    tack = np.floor(high / 360) > np.floor(low / 360)
+    gybe = np.floor((high - 180) / 360) > np.floor((low - 180) / 360)
+    kind = np.where(tack, "tack", np.where(gybe, "gybe", "turn"))
+    bisector = np.degrees(
+        np.arctan2(
+            np.sin(np.radians(entry_heading)) + np.sin(np.radians(exit_heading)),
+            np.cos(np.radians(entry_heading)) + np.cos(np.radians(exit_heading)),
+        )
+    )
+    target = np.where(
+        kind == "tack", wind, np.where(kind == "gybe", wind + 180, bisector)
+    )
+
+    x0, y0 = arrays["x0"][starts], arrays["y0"][starts]
+    x1, y1 = arrays["x1"][ends], arrays["y1"][ends]
+    made_good = haversine_distance(x0, y0, x1, y1) * np.cos(
+        np.radians(initial_bearing(x0, y0, x1, y1) - target)
+    )
+    entry_vmg = entry_speed * np.cos(np.radians(entry_heading - target))
+    duration = exit_time - entry_time
+    return _events_frame(
+        {
+            "kind": kind,
+            "entry_time": entry_time,
+            "exit_time": exit_time,
+            "duration": duration,
+            "entry_heading": entry_heading,
+            "exit_heading": exit_heading,
+            "heading_change": heading_change,
+            "entry_speed": entry_speed,
+            "min_speed": min_speed,
+            "exit_speed": exit_speed,
+            "speed_loss": entry_speed - min_speed,
+            "distance_lost": entry_vmg * duration - made_good,
+            "x": x0,
+            "y": y0,
+        },
+        track_id,
+    )
+
+
+def _events_frame(columns, track_id):
+    frame = pd.DataFrame(
+        {name: columns.get(name, []) for name in MANEUVER_COLUMNS[1:-1]}
+    ).astype({"kind": str, "entry_time": float, "exit_time": float})
+    for name in ("entry_time", "exit_time"):
+        frame[name] = pd.to_datetime(frame[name] * 1e9, unit="ns").dt.round("ms")
+    frame.insert(0, "track_id", track_id)
+    return gpd.GeoDataFrame(
+        frame,
+        geometry=gpd.points_from_xy(columns.get("x", []), columns.get("y", [])),
+        crs="EPSG:4326",
+    )
+
+
+class ManeuverDetector:
+    """
+    Streaming maneuver detection: feed the segments of a track in time-sorted
+    chunks (e.g. from `load_track(..., chunksize=...)`) and get each maneuver
+    once the course after it has been seen, then `flush` at the end of the
+    track. Only the segments since the last steady course before the last few
+    minutes are kept between chunks, and the events are the same as
+    `detect_maneuvers` finds on the whole track.
+    """
+
+    def __init__(self, track_id=None, wind_column="wind_deg", **params):
+        self.track_id = track_id
+        self.wind_column = wind_column
+        self.params = params
+        self._buffer = None
+        self._last_exit = -np.inf
+        # course seen after a maneuver before it is final
+        self._wait = max(
+            params.get("min_steady", MIN_STEADY), params.get("pre_window", PRE_WINDOW)
+        )
+        # segments kept between chunks: a pending maneuver with the steady course
+        # and the speed windows around it
+        self._horizon = params.get("max_duration", MAX_DURATION) + 2 * self._wait
+
+    def _events(self, final):
+        if self._buffer is None:
+            return _events_frame({}, self.track_id)
+        events = find_maneuvers(self._buffer, self.track_id, **self.params)
+        entry = (events.entry_time - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+        exit = (events.exit_time - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+        # maneuvers already returned are found again on the kept segments
+        new = entry.to_numpy() > self._last_exit + 1e-3
+        if not final:
+            new &= exit.to_numpy() + self._wait <= self._buffer["t"][-1]
+        events = events[new].reset_index(drop=True)
+        if len(events):
+            self._last_exit = exit[new].iloc[-1]
+        return events
+
+    def update(self, traj):
+        """
+        Add the next chunk of segments, returning the maneuvers completed.
+        """
+        if not len(traj):
+            return _events_frame({}, self.track_id)
+        if self.track_id is None and "track_id" in traj.columns:
+            self.track_id = str(traj.track_id.iloc[0])
+        arrays = _segment_arrays(traj, self.wind_column)
+        if self._buffer is not None:
+            arrays = {
+                name: np.concatenate([self._buffer[name], values])
+                for name, values in arrays.items()
+            }
+        self._buffer = arrays
+        events = self._events(final=False)
+        self._trim()
+        return events
+
+    def _trim(self):
+        # drop the segments before the last steady course long enough to
+        # separate maneuvers, so the kept segments give the same events
+        t, prev_t = self._buffer["t"], self._buffer["prev_t"]
+        last = np.searchsorted(t, t[-1] - self._horizon)
+        state = _hysteresis(
+            np.abs(_signed_turn(self._buffer["direction"])),
+            self.params.get("enter_turn", ENTER_TURN),
+            self.params.get("exit_turn", EXIT_TURN),
+        )
+        starts, ends = _runs(1 - state)
+        steady = (t[ends] - prev_t[starts] >= self._wait) & (starts <= last)
+        if steady.any():
+            first = starts[steady][-1]
+            self._buffer = {
+                name: values[first:] for name, values in self._buffer.items()
+            }
+
+    def flush(self):
+        """
+        Maneuvers at the end of the track, waiting for more segments.
+        """
+        return self._events(final=True)
+
+
+def detect_maneuvers(traj, wind_column="wind_deg", **params):
+    """
+    Tack and gybe (or, without a `wind_column`, turn) events of a trajectory
+    GeoDataFrame as returned by `to_line_gdf` or `join_weather`.
+    """
+    track_id = str(traj.track_id.iloc[0]) if len(traj) and "track_id" in traj else None
+    return find_maneuvers(_segment_arrays(traj, wind_column), track_id, **params)
+
+
+def iter_maneuvers(chunks, track_id=None, wind_column="wind_deg", **params):
+    """
+    Stream the maneuvers of a track read in chunks of segments.
+    """
+    detector = ManeuverDetector(track_id, wind_column, **params)
+    for chunk in chunks:
+        events = detector.update(chunk)
+        if len(events):
+            yield events
+    events = detector.flush()
+    if len(events):
+        yield events
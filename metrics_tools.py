@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+# mean earth radius in meters (IUGG)
+EARTH_RADIUS = 6_371_008.8
+METRIC_COLUMNS = [
+    "acceleration",
+    "angular_difference",
+    "direction",
+    "distance",
+    "speed",
+    "timedelta",
+]
+# column set of models.SailingTrackLine
+LINE_COLUMNS = [
+    "track_id",
+    "track_fid",
+    "track_seg_id",
+    "track_seg_point_id",
+    "ele",
+    *METRIC_COLUMNS,
+    "t",
+    "prev_t",
+    "geometry",
+]
+# column set of models.TrackSummary
+SUMMARY_COLUMNS = [
+    "track_id",
+    "start_time",
+    "end_time",
+    "duration",
+    "length",
+    "mean_speed",
+    "max_speed",
+    "xmin",
+    "ymin",
+    "xmax",
+    "ymax",
+    "points",
+    "maneuvers",
+    "content_hash",
+    "geometry",
+]
+
+
+def haversine_distance(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def ellipsoidal_distance(lon1, lat1, lon2, lat2):
+    # geodesic on the WGS84 ellipsoid, as geopy does for movingpandas
+    from pyproj import Geod
+
+    return Geod(ellps="WGS84").inv(lon1, lat1, lon2, lat2)[2]
+
+
+def initial_bearing(lon1, lat1, lon2, lat2):
+    """
+    Initial compass bearing in degrees [0, 360) from point 1 to point 2.
+    """
+    lat1, lat2 = np.radians(lat1), np.radians(lat2)
+    delta_lon = np.radians(lon2 - lon1)
+    x = np.sin(delta_lon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(delta_lon)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def angular_difference(degrees1, degrees2):
+    """
+    Smallest absolute difference in degrees [0, 180] between two headings.
+    """
+    diff = np.abs(np.asarray(degrees2) - np.asarray(degrees1)) % 360
+    return np.where(diff > 180, 360 - diff, diff)
+
+
+def _seconds(time):
+    time = pd.DatetimeIndex(time)
+    if time.tz is not None:
+        time = time.tz_convert("UTC").tz_localize(None)
+    return time.as_unit("ns").asi8 / 1e9
+
+
+def compute_metrics(lon, lat, time, method="ellipsoidal"):
+    """
+    Compute acceleration, angular difference, direction, distance, speed and
+    timedelta (seconds) for every point of a time-sorted track in one pass.
+
+    Values match movingpandas' `add_*` methods: the first point repeats the
+    second point's speed, direction and acceleration, and has zero distance and
+    angular difference.
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    seconds = _seconds(time)
+    n = len(lon)
+    if method == "haversine":
+        distance_func = haversine_distance
+    elif method == "ellipsoidal":
+        distance_func = ellipsoidal_distance
+    else:
+        raise ValueError(f"Unknown distance method: {method}")
+
+    metrics = {name: np.zeros(n) for name in METRIC_COLUMNS}
+    metrics["timedelta"][:] = np.nan
+    if n < 2:
+        return metrics
+
+    lon0, lat0, lon1, lat1 = lon[:-1], lat[:-1], lon[1:], lat[1:]
+    same = (lon0 == lon1) & (lat0 == lat1)
+    timedelta = np.diff(seconds)
+    distance = np.where(same, 0.0, distance_func(lon0, lat0, lon1, lat1))
+    direction = np.where(same, 0.0, initial_bearing(lon0, lat0, lon1, lat1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(same, 0.0, distance / timedelta)
+
+    metrics["timedelta"][1:] = timedelta
+    metrics["distance"][1:] = distance
+    metrics["direction"][1:] = direction
+    metrics["direction"][0] = direction[0]
+    metrics["speed"][1:] = speed
+    metrics["speed"][0] = speed[0]
+
+    previous = metrics["direction"][:-1]
+    metrics["angular_difference"][1:] = np.where(
+        previous == direction, 0.0, angular_difference(previous, direction)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        acceleration = np.diff(metrics["speed"]) / timedelta
+    metrics["acceleration"][1:] = acceleration
+    metrics["acceleration"][0] = acceleration[0]
+    return metrics
+
+
+def to_line_gdf(track_df, method="ellipsoidal", time_column="time"):
+    """
+    Build the trajectory segments GeoDataFrame (`SailingTrackLine` columns) from
+    a track points GeoDataFrame, replacing movingpandas' chained `add_*` calls
+    followed by `to_line_gdf`.
+    """
+    import geopandas as gpd
+    import shapely
+
+    track_df = track_df.sort_values(time_column, kind="stable")
+    lon = shapely.get_x(track_df.geometry.values)
+    lat = shapely.get_y(track_df.geometry.values)
+    time = pd.DatetimeIndex(track_df[time_column])
+    metrics = compute_metrics(lon, lat, time, method=method)
+
+    coords = np.stack([lon, lat], axis=1)
+    lines = shapely.linestrings(np.stack([coords[:-1], coords[1:]], axis=1))
+    line_df = gpd.GeoDataFrame(
+        {
+            name: track_df[name].values[1:]
+            for name in LINE_COLUMNS[:5]
+            if name in track_df.columns
+        },
+        geometry=lines,
+        crs=track_df.crs,
+    )
+    for name in METRIC_COLUMNS:
+        line_df[name] = metrics[name][1:]
+    # like movingpandas, t and prev_t keep the local wall time without timezone
+    time = time.tz_localize(None)
+    line_df["t"] = time[1:]
+    line_df["prev_t"] = time[:-1]
+    return line_df[[c for c in LINE_COLUMNS if c in line_df.columns]]
+
+
+def track_hash(track_df, time_column="time"):
+    """
+    SHA-256 of the times and coordinates of a track points GeoDataFrame, to tell
+    when a saved track changed.
+    """
+    import hashlib
+
+    import shapely
+
+    digest = hashlib.sha256()
+    digest.update(pd.DatetimeIndex(track_df[time_column]).as_unit("ns").asi8.tobytes())
+    digest.update(shapely.get_coordinates(track_df.geometry.values).tobytes())
+    return digest.hexdigest()
+
+
+def summarize_track(line_df, content_hash=None, maneuvers=None):
+    """
+    One row GeoDataFrame (`TrackSummary` columns) of a trajectory segments
+    GeoDataFrame: start and end time, duration, length, mean and max speed,
+    bounding box (also as the geometry), point and maneuver count.
+    """
+    import geopandas as gpd
+    import shapely
+
+    start, end = line_df.prev_t.min(), line_df.t.max()
+    duration = (end - start).total_seconds()
+    length = float(line_df["distance"].sum())
+    xmin, ymin, xmax, ymax = line_df.total_bounds
+    return gpd.GeoDataFrame(
+        {
+            "track_id": [str(line_df.track_id.iloc[0])],
+            "start_time": [start],
+            "end_time": [end],
+            "duration": [duration],
+            "length": [length],
+            "mean_speed": [length / duration if duration else np.nan],
+            "max_speed": [float(line_df.speed.max())],
+            "xmin": [xmin],
+            "ymin": [ymin],
+            "xmax": [xmax],
+            "ymax": [ymax],
+            "points": [len(line_df) + 1],
+            "maneuvers": [maneuvers],
+            "content_hash": [content_hash],
+        },
+        geometry=[shapely.box(xmin, ymin, xmax, ymax)],
+        crs=line_df.crs,
+    )
@@ -0,0 +1,38 @@
+"""unique natural keys for track points, track lines and weather
+
+Revision ID: 4e2b7c91d0a3
+Revises: b5fdbb12f01a
+Create Date: 2026-10-17 10:12:31.508214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e2b7c91d0a3'
+down_revision = 'b5fdbb12f01a'
+branch_labels = None
+depends_on = None
+
+TRACK_KEY = ['track_id', 'track_fid', 'track_seg_id', 'track_seg_point_id']
+
+
+def _delete_duplicates(table, columns):
+    # keep the first inserted row of every natural key before adding the constraint
+    match = ' AND '.join(f'a.{c} = b.{c}' for c in columns)
+    op.execute(f'DELETE FROM {table} a USING {table} b WHERE a.id > b.id AND {match}')
+
+
+def upgrade() -> None:
+    for table in ('sailing_track_point', 'sailing_track_line'):
+        _delete_duplicates(table, TRACK_KEY)
+        op.create_unique_constraint(f'uq_{table}_natural_key', table, TRACK_KEY)
+    _delete_duplicates('weather', ['station', 'time'])
+    op.create_unique_constraint('uq_weather_station_time', 'weather', ['station', 'time'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_weather_station_time', 'weather', type_='unique')
+    for table in ('sailing_track_line', 'sailing_track_point'):
+        op.drop_constraint(f'uq_{table}_natural_key', table, type_='unique')
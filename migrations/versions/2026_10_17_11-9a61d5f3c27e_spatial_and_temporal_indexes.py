@@ -0,0 +1,38 @@
+"""spatial and temporal indexes on tracks and weather tables
+
+Revision ID: 9a61d5f3c27e
+Revises: 4e2b7c91d0a3
+Create Date: 2026-10-17 11:03:54.117362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a61d5f3c27e'
+down_revision = '4e2b7c91d0a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # geoalchemy2 may already have created the GiST indexes along with the tables
+    for table in ('sailing_track_point', 'sailing_track_line'):
+        op.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_geometry ON {table} USING gist (geometry)')
+    op.create_index('ix_sailing_track_point_track_id_time', 'sailing_track_point', ['track_id', 'time'], unique=False)
+    op.create_index('ix_sailing_track_line_track_id_t', 'sailing_track_line', ['track_id', 't'], unique=False)
+    op.create_index('ix_owm_data_time', 'owm_data', ['time'], unique=False)
+    # tracks are saved in time order, which BRIN needs; weather rows are saved
+    # station by station and read through the uq_weather_station_time btree
+    op.create_index('brin_sailing_track_point_time', 'sailing_track_point', ['time'], unique=False, postgresql_using='brin')
+    op.create_index('brin_sailing_track_line_t', 'sailing_track_line', ['t'], unique=False, postgresql_using='brin')
+
+
+def downgrade() -> None:
+    # the GiST indexes are left in place, b5fdbb12f01a drops them with the tables
+    op.drop_index('brin_sailing_track_line_t', table_name='sailing_track_line', postgresql_using='brin')
+    op.drop_index('brin_sailing_track_point_time', table_name='sailing_track_point', postgresql_using='brin')
+    op.drop_index('ix_owm_data_time', table_name='owm_data')
+    op.drop_index('ix_sailing_track_line_track_id_t', table_name='sailing_track_line')
+    op.drop_index('ix_sailing_track_point_track_id_time', table_name='sailing_track_point')
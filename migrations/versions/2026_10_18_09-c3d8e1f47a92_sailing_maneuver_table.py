@@ -0,0 +1,46 @@
+"""sailing maneuver table
+
+Revision ID: c3d8e1f47a92
+Revises: 9a61d5f3c27e
+Create Date: 2026-10-18 09:12:31.508214
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8e1f47a92'
+down_revision = '9a61d5f3c27e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('sailing_maneuver',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('track_id', sa.String(), nullable=False, comment='ID created from Datetime track iso as uuid'),
+    sa.Column('kind', sa.String(), nullable=False, comment='tack, gybe or turn (course change or unknown wind)'),
+    sa.Column('entry_time', sa.DateTime(), nullable=False, comment='The datetime the maneuver starts'),
+    sa.Column('exit_time', sa.DateTime(), nullable=False, comment='The datetime the boat is back on a steady course'),
+    sa.Column('duration', sa.Float(), nullable=False, comment='Maneuver duration in seconds'),
+    sa.Column('entry_heading', sa.Float(), nullable=False, comment='Course before the maneuver, degrees'),
+    sa.Column('exit_heading', sa.Float(), nullable=False, comment='Course after the maneuver, degrees'),
+    sa.Column('heading_change', sa.Float(), nullable=False, comment='Signed heading change in degrees, positive to starboard'),
+    sa.Column('entry_speed', sa.Float(), nullable=True, comment='Mean speed before the maneuver in metre/sec'),
+    sa.Column('min_speed', sa.Float(), nullable=False, comment='Minimum speed during the maneuver in metre/sec'),
+    sa.Column('exit_speed', sa.Float(), nullable=True, comment='Mean speed after the maneuver in metre/sec'),
+    sa.Column('speed_loss', sa.Float(), nullable=True, comment='Entry speed minus minimum speed in metre/sec'),
+    sa.Column('distance_lost', sa.Float(), nullable=True, comment='Meters made good lost against sailing on at the entry VMG'),
+    sa.Column('geometry', geoalchemy2.types.Geometry(geometry_type='POINT', srid=4326, from_text='ST_GeomFromEWKT', name='geometry'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('track_id', 'entry_time', name='uq_sailing_maneuver_natural_key')
+    )
+    op.create_index('ix_sailing_maneuver_kind_track_id', 'sailing_maneuver', ['kind', 'track_id'], unique=False)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_sailing_maneuver_geometry ON sailing_maneuver USING gist (geometry)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sailing_maneuver_kind_track_id', table_name='sailing_maneuver')
+    op.drop_table('sailing_maneuver')
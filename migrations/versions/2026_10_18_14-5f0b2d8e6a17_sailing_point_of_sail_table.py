@@ -0,0 +1,43 @@
+"""sailing point of sail table
+
+Revision ID: 5f0b2d8e6a17
+Revises: c3d8e1f47a92
+Create Date: 2026-10-18 14:03:47.215930
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0b2d8e6a17'
+down_revision = 'c3d8e1f47a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('sailing_point_of_sail',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('track_id', sa.String(), nullable=False, comment='ID created from Datetime track iso as uuid'),
+    sa.Column('point_of_sail', sa.String(), nullable=False, comment='no_go, upwind, beam_reach, broad_reach, downwind or unknown'),
+    sa.Column('board', sa.String(), nullable=False, comment='starboard, port or unknown: the side of the wind'),
+    sa.Column('start_time', sa.DateTime(), nullable=False, comment='The datetime the first segment of the run starts'),
+    sa.Column('end_time', sa.DateTime(), nullable=False, comment='The datetime the last segment of the run ends'),
+    sa.Column('duration', sa.Float(), nullable=False, comment='Run duration in seconds'),
+    sa.Column('distance', sa.Float(), nullable=False, comment='Distance sailed in the run in meters'),
+    sa.Column('mean_twa', sa.Float(), nullable=True, comment='Mean absolute true wind angle, degrees'),
+    sa.Column('mean_speed', sa.Float(), nullable=True, comment='Mean speed in metre/sec'),
+    sa.Column('segments', sa.Integer(), nullable=False, comment='Number of sailing_track_line segments in the run'),
+    sa.Column('geometry', geoalchemy2.types.Geometry(geometry_type='LINESTRING', srid=4326, from_text='ST_GeomFromEWKT', name='geometry'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('track_id', 'start_time', name='uq_sailing_point_of_sail_natural_key')
+    )
+    op.create_index('ix_sailing_point_of_sail_point_of_sail_track_id', 'sailing_point_of_sail', ['point_of_sail', 'track_id'], unique=False)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_sailing_point_of_sail_geometry ON sailing_point_of_sail USING gist (geometry)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sailing_point_of_sail_point_of_sail_track_id', table_name='sailing_point_of_sail')
+    op.drop_table('sailing_point_of_sail')
@@ -0,0 +1,35 @@
+"""sailing polar table
+
+Revision ID: 8d41c6a2b9e5
+Revises: 5f0b2d8e6a17
+Create Date: 2026-10-18 16:22:05.731644
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c6a2b9e5'
+down_revision = '5f0b2d8e6a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('sailing_polar',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('track_id', sa.String(), nullable=False, comment='ID created from Datetime track iso as uuid'),
+    sa.Column('twa', sa.Float(), nullable=False, comment='Lower edge of the true wind angle bin, degrees'),
+    sa.Column('tws', sa.Float(), nullable=False, comment='Lower edge of the true wind speed bin in metre/sec'),
+    sa.Column('speed', sa.Float(), nullable=False, comment='Lower edge of the boat speed bin in metre/sec'),
+    sa.Column('seconds', sa.Float(), nullable=False, comment='Seconds sailed in the bin'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('track_id', 'twa', 'tws', 'speed', name='uq_sailing_polar_natural_key')
+    )
+    op.create_index('ix_sailing_polar_twa_tws', 'sailing_polar', ['twa', 'tws'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sailing_polar_twa_tws', table_name='sailing_polar')
+    op.drop_table('sailing_polar')
@@ -0,0 +1,47 @@
+"""track summary table
+
+Revision ID: e27a9c5d1f84
+Revises: 8d41c6a2b9e5
+Create Date: 2026-10-18 18:40:12.094381
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e27a9c5d1f84'
+down_revision = '8d41c6a2b9e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('track_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('track_id', sa.String(), nullable=False, comment='ID created from Datetime track iso as uuid'),
+    sa.Column('start_time', sa.DateTime(), nullable=False, comment='The datetime of the first track point'),
+    sa.Column('end_time', sa.DateTime(), nullable=False, comment='The datetime of the last track point'),
+    sa.Column('duration', sa.Float(), nullable=False, comment='Track duration in seconds'),
+    sa.Column('length', sa.Float(), nullable=False, comment='Track length in meters'),
+    sa.Column('mean_speed', sa.Float(), nullable=True, comment='Length over duration in metre/sec'),
+    sa.Column('max_speed', sa.Float(), nullable=True, comment='Maximum segment speed in metre/sec'),
+    sa.Column('xmin', sa.Float(), nullable=False, comment='Minimum longitude of the track'),
+    sa.Column('ymin', sa.Float(), nullable=False, comment='Minimum latitude of the track'),
+    sa.Column('xmax', sa.Float(), nullable=False, comment='Maximum longitude of the track'),
+    sa.Column('ymax', sa.Float(), nullable=False, comment='Maximum latitude of the track'),
+    sa.Column('points', sa.Integer(), nullable=False, comment='Number of track points'),
+    sa.Column('maneuvers', sa.Integer(), nullable=True, comment='Number of tacks, gybes and turns detected'),
+    sa.Column('content_hash', sa.String(), nullable=False, comment='SHA-256 of the track point times and coordinates'),
+    sa.Column('geometry', geoalchemy2.types.Geometry(geometry_type='POLYGON', srid=4326, from_text='ST_GeomFromEWKT', name='geometry'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('track_id', name='uq_track_summary_track_id')
+    )
+    op.create_index('ix_track_summary_start_time', 'track_summary', ['start_time'], unique=False)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_track_summary_geometry ON track_summary USING gist (geometry)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_track_summary_start_time', table_name='track_summary')
+    op.drop_table('track_summary')
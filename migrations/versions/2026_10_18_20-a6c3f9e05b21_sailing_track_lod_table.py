@@ -0,0 +1,42 @@
+"""sailing track lod table
+
+Revision ID: a6c3f9e05b21
+Revises: e27a9c5d1f84
+Create Date: 2026-10-18 20:15:48.602117
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c3f9e05b21'
+down_revision = 'e27a9c5d1f84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('sailing_track_lod',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('track_id', sa.String(), nullable=False, comment='ID created from Datetime track iso as uuid'),
+    sa.Column('level', sa.Integer(), nullable=False, comment='Level of detail, see lod_tools.LOD_LEVELS'),
+    sa.Column('angular_difference', sa.Float(), nullable=False, comment='Largest angular difference of the segments simplified'),
+    sa.Column('direction', sa.Float(), nullable=False, comment='Direction of the simplified segment'),
+    sa.Column('distance', sa.Float(), nullable=False, comment='Travelled distance of the segments simplified'),
+    sa.Column('speed', sa.Float(), nullable=False, comment='Mean boat speed of the segments simplified'),
+    sa.Column('timedelta', sa.Float(), nullable=False, comment='Seconds of the segments simplified'),
+    sa.Column('t', sa.DateTime(), nullable=False, comment='The datetime the simplified segment ends'),
+    sa.Column('prev_t', sa.DateTime(), nullable=False, comment='The datetime the simplified segment starts'),
+    sa.Column('geometry', geoalchemy2.types.Geometry(geometry_type='LINESTRING', srid=4326, from_text='ST_GeomFromEWKT', name='geometry'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('track_id', 'level', 't', name='uq_sailing_track_lod_natural_key')
+    )
+    op.create_index('ix_sailing_track_lod_track_id_level_t', 'sailing_track_lod', ['track_id', 'level', 't'], unique=False)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_sailing_track_lod_geometry ON sailing_track_lod USING gist (geometry)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sailing_track_lod_track_id_level_t', table_name='sailing_track_lod')
+    op.drop_table('sailing_track_lod')
@@ -0,0 +1,95 @@
+"""sailing track compact table and row views
+
+Revision ID: 3b7e2d9f6c48
+Revises: a6c3f9e05b21
+Create Date: 2026-10-19 09:31:26.417805
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e2d9f6c48'
+down_revision = 'a6c3f9e05b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('sailing_track_compact',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('track_id', sa.String(), nullable=False, comment='ID created from Datetime track iso as uuid'),
+    sa.Column('track_fid', sa.Integer(), nullable=False, comment='Track feature ID'),
+    sa.Column('track_seg_id', sa.Integer(), nullable=False, comment='Track segment ID'),
+    sa.Column('first_point_id', sa.Integer(), nullable=False, comment='Track segment point ID of the first point'),
+    sa.Column('points', sa.Integer(), nullable=False, comment='Number of points of the segment run'),
+    sa.Column('start_time', sa.DateTime(), nullable=False, comment='The UTC datetime of the first point'),
+    sa.Column('end_time', sa.DateTime(), nullable=False, comment='The UTC datetime of the last point'),
+    sa.Column('utc_offset', sa.Float(), nullable=False, comment='Seconds from UTC to the local time of the track'),
+    sa.Column('acceleration', postgresql.ARRAY(sa.Float()), nullable=False, comment='Boat acceleration of the segment ending at each point'),
+    sa.Column('angular_difference', postgresql.ARRAY(sa.Float()), nullable=False, comment='Angular difference of the segment ending at each point'),
+    sa.Column('direction', postgresql.ARRAY(sa.Float()), nullable=False, comment='Direction of the segment ending at each point'),
+    sa.Column('distance', postgresql.ARRAY(sa.Float()), nullable=False, comment='Travelled distance of the segment ending at each point'),
+    sa.Column('speed', postgresql.ARRAY(sa.Float()), nullable=False, comment='Boat speed of the segment ending at each point'),
+    sa.Column('timedelta', postgresql.ARRAY(sa.Float()), nullable=False, comment='Seconds of the segment ending at each point'),
+    sa.Column('geometry', geoalchemy2.types.Geometry(geometry_type='LINESTRINGZM', srid=4326, from_text='ST_GeomFromEWKT', name='geometry'), nullable=True, comment='Points with elevation as Z and UTC epoch seconds as M'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('track_id', 'track_fid', 'track_seg_id', name='uq_sailing_track_compact_natural_key')
+    )
+    op.create_index('ix_sailing_track_compact_start_time', 'sailing_track_compact', ['start_time'], unique=False)
+    op.execute('CREATE INDEX IF NOT EXISTS idx_sailing_track_compact_geometry ON sailing_track_compact USING gist (geometry)')
+    # the compact rows in the sailing_track_point and sailing_track_line layouts
+    op.execute(
+        """
+        CREATE VIEW sailing_track_point_v AS
+        SELECT c.track_id, c.track_fid, c.track_seg_id,
+            c.first_point_id + d.path[1] - 1 AS track_seg_point_id,
+            ST_Z(d.geom) AS ele,
+            to_timestamp(ST_M(d.geom)) AT TIME ZONE 'UTC' AS time,
+            ST_Force2D(d.geom)::geometry(Point, 4326) AS geometry
+        FROM sailing_track_compact c
+        CROSS JOIN LATERAL ST_DumpPoints(c.geometry) AS d
+        """
+    )
+    op.execute(
+        """
+        CREATE VIEW sailing_track_line_v AS
+        SELECT c.track_id, c.track_fid, c.track_seg_id,
+            c.first_point_id + m.i::int - 1 AS track_seg_point_id,
+            ST_Z(p.p1) AS ele,
+            m.acceleration, m.angular_difference, m.direction, m.distance,
+            m.speed, m.timedelta,
+            to_timestamp(ST_M(p.p1) + c.utc_offset) AT TIME ZONE 'UTC' AS t,
+            to_timestamp(ST_M(p.p0) + c.utc_offset) AT TIME ZONE 'UTC' AS prev_t,
+            ST_MakeLine(ST_Force2D(p.p0), ST_Force2D(p.p1))::geometry(LineString, 4326) AS geometry
+        FROM (
+            SELECT *, lag(ST_EndPoint(geometry)) OVER (
+                PARTITION BY track_id ORDER BY track_fid, track_seg_id
+            ) AS prev_end
+            FROM sailing_track_compact
+        ) c
+        CROSS JOIN LATERAL unnest(
+            c.acceleration, c.angular_difference, c.direction, c.distance,
+            c.speed, c.timedelta
+        ) WITH ORDINALITY AS m(
+            acceleration, angular_difference, direction, distance, speed,
+            timedelta, i
+        )
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN m.i = 1 THEN c.prev_end
+                ELSE ST_PointN(c.geometry, m.i::int - 1) END AS p0,
+                ST_PointN(c.geometry, m.i::int) AS p1
+        ) p
+        WHERE p.p0 IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP VIEW IF EXISTS sailing_track_line_v')
+    op.execute('DROP VIEW IF EXISTS sailing_track_point_v')
+    op.drop_index('ix_sailing_track_compact_start_time', table_name='sailing_track_compact')
+    op.drop_table('sailing_track_compact')
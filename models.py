@@ -1,9 +1,11 @@
 import os
 from datetime import datetime
+from functools import cache
 
 from dotenv import load_dotenv
 from geoalchemy2 import Geometry
-from sqlalchemy import ForeignKey, create_engine, Column
+from sqlalchemy import ForeignKey, create_engine, Column, Float, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy import func
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -16,9 +18,30 @@ from typing_extensions import Annotated
 load_dotenv()
 # DB_NAME = os.getenv("DB_NAME")
 
-engine = create_engine(os.getenv("DB_URL"), echo=True)
+Session = sessionmaker()
+
+
+@cache
+def get_engine():
+    """
+    Engine of DB_URL, created on first use so the models import without a
+    database. `models.engine` is the same engine.
+    """
+    if not os.getenv("DB_URL"):
+        raise ValueError("DB_URL is not set, see Configuring the environment variables")
+    # set DB_ECHO=true to log every SQL statement
+    engine = create_engine(
+        os.getenv("DB_URL"), echo=os.getenv("DB_ECHO", "false").lower() == "true"
+    )
+    Session.configure(bind=engine)
+    return engine
+
+
+def __getattr__(name):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-Session = sessionmaker(bind=engine)
 
 timestamp = Annotated[
     datetime,
@@ -89,6 +112,10 @@ class WeatherStation(Base):
 
 class Weather(Base):  # Todo relacionar com track_id
     __tablename__ = "weather"
+    __table_args__ = (
+        # also the btree of the reads by station and time window
+        UniqueConstraint("station", "time", name="uq_weather_station_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)  # todo use uuri
     station: Mapped[str] = mapped_column(
@@ -132,6 +159,17 @@ class Weather(Base):  # Todo relacionar com track_id
 
 class SailingTrackPoints(Base):
     __tablename__ = "sailing_track_point"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id",
+            "track_fid",
+            "track_seg_id",
+            "track_seg_point_id",
+            name="uq_sailing_track_point_natural_key",
+        ),
+        Index("ix_sailing_track_point_track_id_time", "track_id", "time"),
+        Index("brin_sailing_track_point_time", "time", postgresql_using="brin"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)  # todo change to uuid
     track_id: Mapped[str] = mapped_column(
         nullable=False, comment="ID created from Datetime track iso as uuid"
@@ -160,6 +198,17 @@ class SailingTrackPoints(Base):
 
 class SailingTrackLine(Base):  # todo added
     __tablename__ = "sailing_track_line"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id",
+            "track_fid",
+            "track_seg_id",
+            "track_seg_point_id",
+            name="uq_sailing_track_line_natural_key",
+        ),
+        Index("ix_sailing_track_line_track_id_t", "track_id", "t"),
+        Index("brin_sailing_track_line_t", "t", postgresql_using="brin"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)  # todo change to uuid
     track_id: Mapped[str] = mapped_column(
         nullable=False, comment="ID created from Datetime track iso as uuid"
@@ -208,8 +257,302 @@ class SailingTrackLine(Base):  # todo added
     geometry = Column(Geometry(geometry_type="LINESTRING", srid=4326))
 
 
+class SailingTrackCompact(Base):
+    __tablename__ = "sailing_track_compact"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id",
+            "track_fid",
+            "track_seg_id",
+            name="uq_sailing_track_compact_natural_key",
+        ),
+        Index("ix_sailing_track_compact_start_time", "start_time"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_id: Mapped[str] = mapped_column(
+        nullable=False, comment="ID created from Datetime track iso as uuid"
+    )
+    track_fid: Mapped[int] = mapped_column(
+        nullable=False,
+        comment="Track feature ID",
+    )
+    track_seg_id: Mapped[int] = mapped_column(
+        nullable=False,
+        comment="Track segment ID",
+    )
+    first_point_id: Mapped[int] = mapped_column(
+        nullable=False, comment="Track segment point ID of the first point"
+    )
+    points: Mapped[int] = mapped_column(
+        nullable=False, comment="Number of points of the segment run"
+    )
+    start_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The UTC datetime of the first point"
+    )
+    end_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The UTC datetime of the last point"
+    )
+    utc_offset: Mapped[float] = mapped_column(
+        nullable=False, comment="Seconds from UTC to the local time of the track"
+    )
+    acceleration: Mapped[list[float]] = mapped_column(
+        ARRAY(Float),
+        nullable=False,
+        comment="Boat acceleration of the segment ending at each point",
+    )
+    angular_difference: Mapped[list[float]] = mapped_column(
+        ARRAY(Float),
+        nullable=False,
+        comment="Angular difference of the segment ending at each point",
+    )
+    direction: Mapped[list[float]] = mapped_column(
+        ARRAY(Float),
+        nullable=False,
+        comment="Direction of the segment ending at each point",
+    )
+    distance: Mapped[list[float]] = mapped_column(
+        ARRAY(Float),
+        nullable=False,
+        comment="Travelled distance of the segment ending at each point",
+    )
+    speed: Mapped[list[float]] = mapped_column(
+        ARRAY(Float),
+        nullable=False,
+        comment="Boat speed of the segment ending at each point",
+    )
+    timedelta: Mapped[list[float]] = mapped_column(
+        ARRAY(Float),
+        nullable=False,
+        comment="Seconds of the segment ending at each point",
+    )
+    geometry = Column(
+        Geometry(geometry_type="LINESTRINGZM", srid=4326),
+        comment="Points with elevation as Z and UTC epoch seconds as M",
+    )
+
+
+class SailingTrackLOD(Base):
+    __tablename__ = "sailing_track_lod"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id", "level", "t", name="uq_sailing_track_lod_natural_key"
+        ),
+        Index("ix_sailing_track_lod_track_id_level_t", "track_id", "level", "t"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_id: Mapped[str] = mapped_column(
+        nullable=False, comment="ID created from Datetime track iso as uuid"
+    )
+    level: Mapped[int] = mapped_column(
+        nullable=False, comment="Level of detail, see lod_tools.LOD_LEVELS"
+    )
+    angular_difference: Mapped[float] = mapped_column(
+        nullable=False,
+        comment="Largest angular difference of the segments simplified",
+    )
+    direction: Mapped[float] = mapped_column(
+        nullable=False, comment="Direction of the simplified segment"
+    )
+    distance: Mapped[float] = mapped_column(
+        nullable=False, comment="Travelled distance of the segments simplified"
+    )
+    speed: Mapped[float] = mapped_column(
+        nullable=False, comment="Mean boat speed of the segments simplified"
+    )
+    timedelta: Mapped[float] = mapped_column(
+        nullable=False, comment="Seconds of the segments simplified"
+    )
+    t: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime the simplified segment ends"
+    )
+    prev_t: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime the simplified segment starts"
+    )
+    geometry = Column(Geometry(geometry_type="LINESTRING", srid=4326))
+
+
+class SailingManeuver(Base):
+    __tablename__ = "sailing_maneuver"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id", "entry_time", name="uq_sailing_maneuver_natural_key"
+        ),
+        Index("ix_sailing_maneuver_kind_track_id", "kind", "track_id"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_id: Mapped[str] = mapped_column(
+        nullable=False, comment="ID created from Datetime track iso as uuid"
+    )
+    kind: Mapped[str] = mapped_column(
+        nullable=False, comment="tack, gybe or turn (course change or unknown wind)"
+    )
+    entry_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime the maneuver starts"
+    )
+    exit_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime the boat is back on a steady course"
+    )
+    duration: Mapped[float] = mapped_column(
+        nullable=False, comment="Maneuver duration in seconds"
+    )
+    entry_heading: Mapped[float] = mapped_column(
+        nullable=False, comment="Course before the maneuver, degrees"
+    )
+    exit_heading: Mapped[float] = mapped_column(
+        nullable=False, comment="Course after the maneuver, degrees"
+    )
+    heading_change: Mapped[float] = mapped_column(
+        nullable=False,
+        comment="Signed heading change in degrees, positive to starboard",
+    )
+    entry_speed: Mapped[float] = mapped_column(
+        nullable=True, comment="Mean speed before the maneuver in metre/sec"
+    )
+    min_speed: Mapped[float] = mapped_column(
+        nullable=False, comment="Minimum speed during the maneuver in metre/sec"
+    )
+    exit_speed: Mapped[float] = mapped_column(
+        nullable=True, comment="Mean speed after the maneuver in metre/sec"
+    )
+    speed_loss: Mapped[float] = mapped_column(
+        nullable=True, comment="Entry speed minus minimum speed in metre/sec"
+    )
+    distance_lost: Mapped[float] = mapped_column(
+        nullable=True,
+        comment="Meters made good lost against sailing on at the entry VMG",
+    )
+    geometry = Column(Geometry(geometry_type="POINT", srid=4326))
+
+
+class SailingPointOfSail(Base):
+    __tablename__ = "sailing_point_of_sail"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id", "start_time", name="uq_sailing_point_of_sail_natural_key"
+        ),
+        Index(
+            "ix_sailing_point_of_sail_point_of_sail_track_id",
+            "point_of_sail",
+            "track_id",
+        ),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_id: Mapped[str] = mapped_column(
+        nullable=False, comment="ID created from Datetime track iso as uuid"
+    )
+    point_of_sail: Mapped[str] = mapped_column(
+        nullable=False,
+        comment="no_go, upwind, beam_reach, broad_reach, downwind or unknown",
+    )
+    board: Mapped[str] = mapped_column(
+        nullable=False, comment="starboard, port or unknown: the side of the wind"
+    )
+    start_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime the first segment of the run starts"
+    )
+    end_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime the last segment of the run ends"
+    )
+    duration: Mapped[float] = mapped_column(
+        nullable=False, comment="Run duration in seconds"
+    )
+    distance: Mapped[float] = mapped_column(
+        nullable=False, comment="Distance sailed in the run in meters"
+    )
+    mean_twa: Mapped[float] = mapped_column(
+        nullable=True, comment="Mean absolute true wind angle, degrees"
+    )
+    mean_speed: Mapped[float] = mapped_column(
+        nullable=True, comment="Mean speed in metre/sec"
+    )
+    segments: Mapped[int] = mapped_column(
+        nullable=False, comment="Number of sailing_track_line segments in the run"
+    )
+    geometry = Column(Geometry(geometry_type="LINESTRING", srid=4326))
+
+
+class SailingPolar(Base):
+    __tablename__ = "sailing_polar"
+    __table_args__ = (
+        UniqueConstraint(
+            "track_id", "twa", "tws", "speed", name="uq_sailing_polar_natural_key"
+        ),
+        Index("ix_sailing_polar_twa_tws", "twa", "tws"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_id: Mapped[str] = mapped_column(
+        nullable=False, comment="ID created from Datetime track iso as uuid"
+    )
+    twa: Mapped[float] = mapped_column(
+        nullable=False, comment="Lower edge of the true wind angle bin, degrees"
+    )
+    tws: Mapped[float] = mapped_column(
+        nullable=False, comment="Lower edge of the true wind speed bin in metre/sec"
+    )
+    speed: Mapped[float] = mapped_column(
+        nullable=False, comment="Lower edge of the boat speed bin in metre/sec"
+    )
+    seconds: Mapped[float] = mapped_column(
+        nullable=False, comment="Seconds sailed in the bin"
+    )
+
+
+class TrackSummary(Base):
+    __tablename__ = "track_summary"
+    __table_args__ = (
+        UniqueConstraint("track_id", name="uq_track_summary_track_id"),
+        Index("ix_track_summary_start_time", "start_time"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_id: Mapped[str] = mapped_column(
+        nullable=False, comment="ID created from Datetime track iso as uuid"
+    )
+    start_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime of the first track point"
+    )
+    end_time: Mapped[datetime] = mapped_column(
+        nullable=False, comment="The datetime of the last track point"
+    )
+    duration: Mapped[float] = mapped_column(
+        nullable=False, comment="Track duration in seconds"
+    )
+    length: Mapped[float] = mapped_column(
+        nullable=False, comment="Track length in meters"
+    )
+    mean_speed: Mapped[float] = mapped_column(
+        nullable=True, comment="Length over duration in metre/sec"
+    )
+    max_speed: Mapped[float] = mapped_column(
+        nullable=True, comment="Maximum segment speed in metre/sec"
+    )
+    xmin: Mapped[float] = mapped_column(
+        nullable=False, comment="Minimum longitude of the track"
+    )
+    ymin: Mapped[float] = mapped_column(
+        nullable=False, comment="Minimum latitude of the track"
+    )
+    xmax: Mapped[float] = mapped_column(
+        nullable=False, comment="Maximum longitude of the track"
+    )
+    ymax: Mapped[float] = mapped_column(
+        nullable=False, comment="Maximum latitude of the track"
+    )
+    points: Mapped[int] = mapped_column(
+        nullable=False, comment="Number of track points"
+    )
+    maneuvers: Mapped[int] = mapped_column(
+        nullable=True, comment="Number of tacks, gybes and turns detected"
+    )
+    content_hash: Mapped[str] = mapped_column(
+        nullable=False,
+        comment="SHA-256 of the track point times and coordinates",
+    )
+    geometry = Column(Geometry(geometry_type="POLYGON", srid=4326))
+
+
 class OWM_data(Base):  # Todo relacionar com track_id
     __tablename__ = "owm_data"
+    __table_args__ = (Index("ix_owm_data_time", "time"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)  # todo change to uuid
     time: Mapped[datetime] = mapped_column(
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from array import array
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import jsonlines
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from weather_cache import CELL_SIZE, default_cache
+
+load_dotenv()
+
+OWM_URL = "https://api.openweathermap.org/data/2.5/onecall/timemachine"
+# calls allowed by the OpenWeatherMap plan
+OWM_CALLS_PER_MINUTE = float(os.getenv("OWM_CALLS_PER_MINUTE", "60"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# fields of the "current" answer kept by process_OWM_data
+OWM_FIELDS = ("temp", "pressure", "humidity", "wind_speed", "wind_deg")
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` calls per second on average, with bursts of
+    up to `capacity` calls.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _from_cache(payload, query):
+    # answers are shared by the whole cell and hour: keep the query position/time
+    payload = dict(payload, lat=query["lat"], lon=query["lon"], query=query)
+    payload["current"] = dict(payload["current"], dt=int(query["dt"]))
+    return payload
+
+
+def query_key(query):
+    return f"{query['lat']:.6f},{query['lon']:.6f},{int(query['dt'])}"
+
+
+def _answered_query(line):
+    # lines written before the query was saved with them carry its position
+    # and time in the answer
+    if "query" in line:
+        return line["query"]
+    if "current" in line:
+        return {"lat": line["lat"], "lon": line["lon"], "dt": line["current"]["dt"]}
+    return None
+
+
+def read_done_queries(jsonl_path):
+    """
+    Keys of the queries already answered in a OWM JSONL file.
+    """
+    jsonl_path = Path(jsonl_path)
+    if not jsonl_path.exists():
+        return set()
+    with jsonlines.open(jsonl_path) as reader:
+        queries = (
+            _answered_query(line) for line in reader.iter(type=dict, skip_invalid=True)
+        )
+        return {query_key(query) for query in queries if query is not None}
+
+
+def retry_delay(retry_after, attempt):
+    """
+    Seconds to wait before retrying: the Retry-After header, in seconds or as
+    an HTTP date, or exponential backoff with jitter without it.
+    """
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            pass
+        else:
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    return 2**attempt + random.random()
+
+
+async def _fetch_query(session, bucket, query, api_key, base_url, max_retries):
+    params = {
+        "lat": query["lat"],
+        "lon": query["lon"],
+        "units": "metric",
+        "dt": int(query["dt"]),
+        "lang": "es",
+        "appid": api_key,
+    }
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        async with session.get(base_url, params=params) as resp:
+            if resp.status not in RETRY_STATUS or attempt == max_retries:
+                resp.raise_for_status()
+                return await resp.json()
+            retry_after = resp.headers.get("Retry-After")
+        delay = retry_delay(retry_after, attempt)
+        logging.warning(f"OWM answered {resp.status}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def fetch_owm_data(
+    queries,
+    jsonl_path,
+    api_key=None,
+    calls_per_minute=OWM_CALLS_PER_MINUTE,
+    burst=1,
+    concurrency=8,
+    base_url=OWM_URL,
+    max_retries=5,
+    cache=None,
+):
+    """
+    Fetch OWM `timemachine` data for each query (dict with lat, lon and dt as a
+    unix timestamp) over a pooled HTTP session, rate limited to the plan quota.
+    Each response is appended to `jsonl_path` as soon as it arrives, with its
+    query under "query", so an interrupted run resumes where it stopped.
+    Queries whose grid cell and hour are in the weather cache are answered
+    from it. Returns the number of failed queries.
+    """
+    import aiohttp
+
+    api_key = api_key or os.getenv("OPENWEATHER_KEY")
+    cache = cache or default_cache()
+    done = read_done_queries(jsonl_path)
+    # queries sharing a grid cell and hour need a single call
+    pending = {}
+    with jsonlines.open(jsonl_path, "a", flush=True) as writer:
+        for query in queries:
+            if query_key(query) in done:
+                continue
+            key = (cache.cell(query["lat"], query["lon"]), cache.hour(query["dt"]))
+            if key not in pending:
+                cached = cache.get("owm", *key)
+                if cached is not None:
+                    writer.write(_from_cache(cached, query))
+                    continue
+                pending[key] = []
+            pending[key].append(query)
+    logging.warning(
+        f"Getting {len(pending)} OWM calls ({len(done)} already in {jsonl_path}, "
+        f"cache {cache.stats()})"
+    )
+    if not pending:
+        return 0
+
+    bucket = TokenBucket(calls_per_minute / 60, capacity=burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        with jsonlines.open(jsonl_path, "a", flush=True) as writer:
+
+            async def fetch(key, cell_queries):
+                async with semaphore:
+                    data = await _fetch_query(
+                        session,
+                        bucket,
+                        cell_queries[0],
+                        api_key,
+                        base_url,
+                        max_retries,
+                    )
+                cache.put("owm", *key, data)
+                writer.write_all(_from_cache(data, query) for query in cell_queries)
+
+            results = await asyncio.gather(
+                *(fetch(key, cell_queries) for key, cell_queries in pending.items()),
+                return_exceptions=True,
+            )
+    failures = [r for r in results if isinstance(r, Exception)]
+    for failure in failures[:5]:
+        logging.warning(f"OWM query failed: {failure!r}")
+    if failures:
+        logging.warning(f"{len(failures)} OWM queries failed, run again to retry")
+    return len(failures)
+
+
+def plan_weather_queries(lat, lon, time, cell_size=CELL_SIZE, hours=1):
+    """
+    Collapse track points into one weather query per distinct (grid cell,
+    time bucket of `hours`), instead of a fixed index stride. Returns the
+    queries (DataFrame with lat, lon and dt of the first point of each group,
+    in track order) and, for every track point, the index of its query.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    dt = (pd.DatetimeIndex(time) - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    keys = np.stack(
+        [
+            np.floor(lat / cell_size),
+            np.floor(lon / cell_size),
+            np.asarray(dt) // (3600 * hours),
+        ],
+        axis=1,
+    )
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    # renumber the groups in track order
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    first = first[order]
+    queries = pd.DataFrame(
+        {"lat": lat[first], "lon": lon[first], "dt": np.asarray(dt)[first]}
+    )
+    return queries, rank[inverse.ravel()]
+
+
+def planner_report(track_df, step=10, cell_size=CELL_SIZE, hours=1):
+    """
+    Number of OWM calls needed by the planner against a fixed `step` stride.
+    """
+    queries, _ = plan_weather_queries(
+        track_df.geometry.y, track_df.geometry.x, track_df.time, cell_size, hours
+    )
+    stride_calls = len(range(0, len(track_df), step))
+    return {
+        "points": len(track_df),
+        "stride_calls": stride_calls,
+        "planned_calls": len(queries),
+        "reduction": 1 - len(queries) / stride_calls,
+    }
+
+
+def expand_weather(weather_data, queries, query_index):
+    """
+    Repeat the weather row of each planned query for every track point mapped
+    to it by `plan_weather_queries`.
+    """
+    dt = (
+        pd.DatetimeIndex(weather_data.time) - pd.Timestamp(0, tz="UTC")
+    ) // pd.Timedelta(seconds=1)
+    weather_data = weather_data.assign(dt=np.asarray(dt)).drop_duplicates(
+        ["lat", "lon", "dt"]
+    )
+    planned = queries.reset_index().merge(
+        weather_data, on=["lat", "lon", "dt"], how="left"
+    )
+    planned = planned.sort_values("index").drop(columns=["index", "dt"])
+    return planned.iloc[query_index].reset_index(drop=True)
+
+
+def _parse_answer(line):
+    # the hourly forecast is most of each answer and is not used: skip parsing it
+    cut = line.find(b'"hourly"')
+    if cut > 0:
+        try:
+            answer = json.loads(line[:cut].rstrip(b", ") + b"}")
+            if "current" in answer:
+                return answer
+        except ValueError:
+            pass
+    return json.loads(line)
+
+
+def _owm_frame(columns, tz):
+    frame = pd.DataFrame({name: np.asarray(values) for name, values in columns.items()})
+    time = pd.to_datetime(frame.pop("dt"), unit="s", utc=True)
+    frame["time"] = time.dt.tz_convert(tz) if tz is not None else time
+    return frame
+
+
+def iter_owm_jsonl(jsonl_path, tz=None, chunk_size=100_000):
+    """
+    Stream a OWM JSONL file as DataFrames of at most `chunk_size` rows with
+    typed lat, lon, temp, pressure, humidity, wind_speed, wind_deg and time
+    columns, reading only those fields of each answer.
+    """
+    names = ("lat", "lon", *OWM_FIELDS)
+
+    def new_columns():
+        return {**{name: array("d") for name in names}, "dt": array("q")}
+
+    columns = new_columns()
+    with open(jsonl_path, "rb") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            answer = _parse_answer(line)
+            current = answer.get("current")
+            if current is None:  # error answers have no "current"
+                continue
+            columns["lat"].append(answer["lat"])
+            columns["lon"].append(answer["lon"])
+            for name in OWM_FIELDS:
+                value = current.get(name)
+                columns[name].append(np.nan if value is None else value)
+            columns["dt"].append(current["dt"])
+            if len(columns["dt"]) == chunk_size:
+                yield _owm_frame(columns, tz)
+                columns = new_columns()
+    if len(columns["dt"]):
+        yield _owm_frame(columns, tz)
+
+
+def read_owm_jsonl(jsonl_path, tz=None):
+    chunks = list(iter_owm_jsonl(jsonl_path, tz=tz))
+    if not chunks:
+        return _owm_frame({name: [] for name in ("lat", "lon", *OWM_FIELDS, "dt")}, tz)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,283 @@
+import logging
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import shapely
+from sqlalchemy import text
+
+from db_tools import (
+    COPY_CHUNK_ROWS,
+    SRID,
+    _iter_postgis,
+    _table_frame,
+    bulk_save_track,
+    time_bound,
+    time_column,
+    track_query,
+)
+from models import get_engine, SailingTrackLine
+
+ARCHIVE_DIR = Path("./data/archive")
+# rows per row group, the unit skipped by the time and bbox statistics
+ROW_GROUP_ROWS = 10_000
+# <archive>/<table>/year=<year of the track start>/track_id=<track_id>/*.parquet
+PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.int16()), ("track_id", pa.string())]), flavor="hive"
+)
+
+
+def _table_dir(model, archive_dir):
+    return Path(archive_dir) / model.__tablename__
+
+
+def _partitions(model, track_id, archive_dir):
+    return sorted(_table_dir(model, archive_dir).glob(f"year=*/track_id={track_id}"))
+
+
+def _files(model, track_id, archive_dir):
+    return [
+        path
+        for partition in _partitions(model, track_id, archive_dir)
+        for path in sorted(partition.glob("*.parquet"))
+    ]
+
+
+def archived(track_id, model=SailingTrackLine, archive_dir=ARCHIVE_DIR):
+    """
+    True when the archive has rows of `track_id` on the `model` table.
+    """
+    return bool(_files(model, track_id, archive_dir))
+
+
+def archived_tracks(model=SailingTrackLine, archive_dir=ARCHIVE_DIR):
+    """
+    Track ids with rows on the `model` table of the archive, from the partition
+    directories only.
+    """
+    return sorted(
+        {
+            partition.name.split("=", 1)[1]
+            for partition in _table_dir(model, archive_dir).glob("year=*/track_id=*")
+            if any(partition.glob("*.parquet"))
+        }
+    )
+
+
+def _write(rows, path):
+    if "geometry" in rows:
+        rows.to_parquet(
+            path,
+            index=False,
+            compression="zstd",
+            write_covering_bbox=True,
+            row_group_size=ROW_GROUP_ROWS,
+        )
+    else:
+        pd.DataFrame(rows).to_parquet(
+            path, index=False, compression="zstd", row_group_size=ROW_GROUP_ROWS
+        )
+
+
+def append_archive(frame, model, archive_dir=ARCHIVE_DIR):
+    """
+    Append the rows of one or many tracks to the `model` table of the archive
+    as new GeoParquet files, one per track, sorted by time with a bbox covering
+    column. Files already written are never rewritten. Returns the new files.
+    """
+    frame = _table_frame(frame, model)
+    time = time_column(model)
+    frame = frame.sort_values(["track_id", time], kind="stable")
+    paths = []
+    for track_id, rows in frame.groupby("track_id", sort=False):
+        # later rows of a track go to the partition of its first rows
+        partitions = _partitions(model, track_id, archive_dir)
+        if partitions:
+            directory = partitions[0]
+        else:
+            year = pd.Timestamp(rows[time].iloc[0]).year
+            directory = (
+                _table_dir(model, archive_dir) / f"year={year}" / f"track_id={track_id}"
+            )
+            directory.mkdir(parents=True, exist_ok=True)
+        # readers skip dot files, so a file being written is never read
+        name = f"part-{uuid.uuid4().hex}.parquet"
+        _write(rows.drop(columns="track_id"), directory / f".{name}")
+        paths.append((directory / f".{name}").rename(directory / name))
+    return paths
+
+
+def replace_archive(frame, model, archive_dir=ARCHIVE_DIR):
+    """
+    Replace the rows of the tracks of `frame` on the `model` table of the
+    archive, rewriting only the partitions of those tracks.
+    """
+    old = {
+        track_id: _files(model, track_id, archive_dir)
+        for track_id in frame.track_id.unique()
+    }
+    paths = append_archive(frame, model, archive_dir)
+    for path in (path for files in old.values() for path in files):
+        path.unlink()
+    return paths
+
+
+def _filter(model, schema, bbox, start, stop, level):
+    conditions = []
+    time = time_column(model)
+    if level is not None:
+        conditions.append(ds.field("level") == int(level))
+    if start is not None:
+        start = time_bound(start, model)
+        # the partition year is the year a track starts, it may end a year after
+        conditions.append(ds.field("year") >= start.year - 1)
+        conditions.append(
+            ds.field(time) >= pa.scalar(start, type=schema.field(time).type)
+        )
+    if stop is not None:
+        stop = time_bound(stop, model)
+        conditions.append(ds.field("year") <= stop.year)
+        conditions.append(
+            ds.field(time) < pa.scalar(stop, type=schema.field(time).type)
+        )
+    if bbox is not None:
+        xmin, ymin, xmax, ymax = map(float, bbox)
+        conditions += [
+            ds.field("bbox", "xmax") >= xmin,
+            ds.field("bbox", "xmin") <= xmax,
+            ds.field("bbox", "ymax") >= ymin,
+            ds.field("bbox", "ymin") <= ymax,
+        ]
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _to_frame(table, model, bbox):
+    import geopandas as gpd
+
+    frame = table.to_pandas()
+    order = [name for name in model.__table__.columns.keys() if name in frame]
+    frame = frame[order]
+    if "geometry" not in frame:
+        return frame
+    frame = gpd.GeoDataFrame(
+        frame,
+        geometry=gpd.GeoSeries.from_wkb(frame.geometry, crs=f"EPSG:{SRID}"),
+    )
+    if bbox is not None:
+        # the bbox statistics select candidates, keep the rows really crossing it
+        frame = frame[frame.intersects(shapely.box(*bbox))]
+    return frame
+
+
+def read_archive(
+    model=SailingTrackLine,
+    track_ids=None,
+    bbox=None,
+    start=None,
+    stop=None,
+    columns=None,
+    level=None,
+    archive_dir=ARCHIVE_DIR,
+    chunksize=None,
+):
+    """
+    Read the rows of the `model` table of the archive filtered by track ids,
+    bounding box (xmin, ymin, xmax, ymax), time window and level of detail.
+    Only the partitions of `track_ids` and the years of the time window are
+    opened, row groups outside the time window or bounding box are skipped by
+    their statistics and only `columns` are read. With `chunksize` a generator
+    of frames is returned instead.
+    """
+    table_dir = _table_dir(model, archive_dir)
+    if track_ids is None:
+        source = str(table_dir)
+    else:
+        source = [
+            str(path)
+            for track_id in track_ids
+            for path in _files(model, track_id, archive_dir)
+        ]
+    if not source or not table_dir.exists():
+        raise ValueError(
+            f"No {model.__tablename__} rows on {archive_dir} for tracks {track_ids}"
+        )
+    dataset = ds.dataset(
+        source,
+        format="parquet",
+        partitioning=PARTITIONING,
+        partition_base_dir=str(table_dir),
+    )
+    if bbox is not None and columns is not None and "geometry" not in columns:
+        columns = [*columns, "geometry"]
+    scanner = dataset.scanner(
+        columns=columns,
+        filter=_filter(model, dataset.schema, bbox, start, stop, level),
+        batch_size=chunksize or ROW_GROUP_ROWS,
+    )
+    if chunksize is not None:
+        return (
+            _to_frame(pa.Table.from_batches([batch]), model, bbox)
+            for batch in scanner.to_batches()
+            if batch.num_rows
+        )
+    frame = _to_frame(scanner.to_table(), model, bbox)
+    time = time_column(model)
+    if time in frame:
+        frame = frame.sort_values(time, kind="stable").reset_index(drop=True)
+    return frame
+
+
+def export_archive(
+    model=SailingTrackLine,
+    track_ids=None,
+    archive_dir=ARCHIVE_DIR,
+    chunksize=COPY_CHUNK_ROWS,
+):
+    """
+    Append the rows of `model` on PostGIS to the archive, of `track_ids` or of
+    every track, streaming each track in chunks. Tracks already archived are
+    skipped. Returns the rows archived.
+    """
+    if track_ids is None:
+        with get_engine().connect() as connection:
+            track_ids = connection.execute(
+                text(f"SELECT DISTINCT track_id FROM {model.__tablename__}")
+            ).scalars()
+            track_ids = list(track_ids)
+    rows = 0
+    for track_id in track_ids:
+        if archived(track_id, model, archive_dir):
+            logging.warning(f"{track_id} already archived on {model.__tablename__}")
+            continue
+        sql, params = track_query(model, track_id)
+        sql += f" ORDER BY {time_column(model)}"
+        for chunk in _iter_postgis(sql, params, chunksize):
+            append_archive(chunk, model, archive_dir)
+            rows += len(chunk)
+    logging.warning(f"{model.__tablename__} archived on {archive_dir}: {rows} rows")
+    return rows
+
+
+def import_archive(model=SailingTrackLine, track_ids=None, archive_dir=ARCHIVE_DIR):
+    """
+    Save the archived rows of `model`, of `track_ids` or of every track, on
+    PostGIS one track at a time. Rows already saved are skipped by the unique
+    constraint of the model. Returns the inserted rows.
+    """
+    if track_ids is None:
+        track_ids = archived_tracks(model, archive_dir)
+    rows = 0
+    for track_id in track_ids:
+        rows += (
+            bulk_save_track(
+                read_archive(model, [track_id], archive_dir=archive_dir), model
+            )
+            or 0
+        )
+    logging.warning(f"{model.__tablename__} imported from {archive_dir}: {rows} rows")
+    return rows
@@ -0,0 +1,136 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# upper true wind angle (degrees) of each point of sail, the last one is 180
+POINTS_OF_SAIL = {
+    "no_go": 45,
+    "upwind": 80,
+    "beam_reach": 110,
+    "broad_reach": 150,
+    "downwind": 180,
+}
+LABELS = np.array([*POINTS_OF_SAIL, "unknown"])
+BOARDS = np.array(["starboard", "port", "unknown"])
+# runs shorter than this (seconds) take the point of sail of the run before
+MIN_DURATION = 20.0
+
+
+def true_wind_angle(direction, wind_deg):
+    """
+    Signed true wind angle in degrees [-180, 180): the angle from the course to
+    the direction the wind blows from, positive with the wind on starboard.
+    """
+    return (np.asarray(wind_deg, dtype=float) - np.asarray(direction) + 180) % 360 - 180
+
+
+def classify(twa):
+    """
+    Point of sail and board codes (indexes of LABELS and BOARDS) of signed
+    true wind angles.
+    """
+    twa = np.asarray(twa, dtype=float)
+    bounds = list(POINTS_OF_SAIL.values())[:-1]
+    label = np.searchsorted(bounds, np.abs(twa), side="right")
+    board = np.where(twa >= 0, 0, 1)
+    unknown = np.isnan(twa)
+    label[unknown] = len(LABELS) - 1
+    board[unknown] = len(BOARDS) - 1
+    return label, board
+
+
+def _run_starts(track, key):
+    change = np.r_[True, (track[1:] != track[:-1]) | (key[1:] != key[:-1])]
+    return np.flatnonzero(change)
+
+
+def _fill_index(valid, group):
+    # index of the last valid item at or before each item of the same group, -1
+    # where there is none
+    last = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), -1))
+    return np.where((last >= 0) & (group[np.maximum(last, 0)] == group), last, -1)
+
+
+def _smooth(track, key, duration, min_duration):
+    # runs shorter than min_duration take the key of the run before them (or,
+    # at the start of a track, after them)
+    starts = _run_starts(track, key)
+    run_track = track[starts]
+    long = np.add.reduceat(duration, starts) >= min_duration
+    source = _fill_index(long, run_track)
+    after = _fill_index(long[::-1], run_track[::-1])[::-1]
+    after = np.where(after >= 0, len(starts) - 1 - after, -1)
+    source = np.where(source >= 0, source, after)
+    # tracks made only of short runs keep their keys
+    source = np.where(source >= 0, source, np.arange(len(starts)))
+    return np.repeat(key[starts][source], np.diff(np.r_[starts, len(key)]))
+
+
+def _run_sum(values, starts):
+    return np.add.reduceat(values, starts) if len(starts) else np.array([])
+
+
+def point_of_sail_segments(
+    lines, wind_column="wind_deg", min_duration=MIN_DURATION, with_geometry=True
+):
+    """
+    Run-length encoded point of sail of trajectory segments (of one track or a
+    whole archive sorted by track_id and t) with the wind direction joined in
+    `wind_column`: one row per run of consecutive segments of a track on the
+    same point of sail and board, with its start and end time, duration,
+    distance, mean absolute true wind angle, mean speed and, with
+    `with_geometry`, the LineString of the run.
+    """
+    n = len(lines)
+    track, track_ids = pd.factorize(lines.track_id)
+    twa = true_wind_angle(lines["direction"].to_numpy(dtype=float), lines[wind_column])
+    label, board = classify(twa)
+    duration = lines["timedelta"].to_numpy(dtype=float)
+    key = label * len(BOARDS) + board
+    if min_duration and n:
+        key = _smooth(track, key, duration, min_duration)
+    starts = _run_starts(track, key) if n else np.array([], dtype=int)
+    ends = np.r_[starts[1:], n] - 1 if n else starts
+
+    run_distance = _run_sum(lines["distance"].to_numpy(dtype=float), starts)
+    run_duration = _run_sum(duration, starts)
+    known = ~np.isnan(twa)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_twa = _run_sum(np.where(known, np.abs(twa), 0.0), starts) / _run_sum(
+            known, starts
+        )
+        mean_speed = run_distance / run_duration
+    segments = pd.DataFrame(
+        {
+            "track_id": np.asarray(track_ids, dtype=object)[track[starts]],
+            "point_of_sail": LABELS[key[starts] // len(BOARDS)],
+            "board": BOARDS[key[starts] % len(BOARDS)],
+            "start_time": lines.prev_t.to_numpy()[starts],
+            "end_time": lines.t.to_numpy()[ends],
+            "duration": run_duration,
+            "distance": run_distance,
+            "mean_twa": mean_twa,
+            "mean_speed": mean_speed,
+            "segments": ends - starts + 1,
+        }
+    )
+    if not with_geometry:
+        return segments
+    return gpd.GeoDataFrame(
+        segments, geometry=_run_lines(lines, starts, ends), crs=lines.crs
+    )
+
+
+def _run_lines(lines, starts, ends):
+    # the start point of every segment of a run, plus the end of its last one
+    geometry = np.asarray(lines.geometry.values)
+    first = shapely.get_coordinates(shapely.get_point(geometry, 0))
+    last = shapely.get_coordinates(shapely.get_point(geometry[ends], -1))
+    run = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    position = np.arange(len(run)) + run
+    coords = np.empty((len(run) + len(starts), 2))
+    coords[position] = first
+    coords[ends + np.arange(len(starts)) + 1] = last
+    indices = np.repeat(np.arange(len(starts)), ends - starts + 2)
+    return shapely.linestrings(coords, indices=indices) if len(starts) else []
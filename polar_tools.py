@@ -0,0 +1,210 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from point_of_sail_tools import true_wind_angle
+
+POLAR_FILE = Path("./data/polar.npz")
+# lower edges of the true wind angle (degrees), true wind speed and boat speed
+# (metre/sec) bins, values above the last edge fall in the last bin
+TWA_BINS = np.arange(0, 180, 10.0)
+TWS_BINS = np.arange(0, 20, 2.0)
+SPEED_BINS = np.arange(0, 12, 0.1).round(1)
+QUANTILES = (0.5, 0.75, 0.9, 0.99)
+
+
+def _bin_index(values, edges):
+    return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 1)
+
+
+class PolarAccumulator:
+    """
+    Boat polar built from histograms of the boat speed, weighted by the seconds
+    sailed, per true wind angle and true wind speed bin. Accumulators with the
+    same bins merge by adding their histograms, so the polar of a season is the
+    sum of the polars of its tracks (built one at a time or by parallel
+    workers), and quantiles of the boat speed are read from the histograms.
+    """
+
+    def __init__(self, twa_bins=TWA_BINS, tws_bins=TWS_BINS, speed_bins=SPEED_BINS):
+        self.twa_bins = np.asarray(twa_bins, dtype=float)
+        self.tws_bins = np.asarray(tws_bins, dtype=float)
+        self.speed_bins = np.asarray(speed_bins, dtype=float)
+        self.seconds = np.zeros(
+            (len(self.twa_bins), len(self.tws_bins), len(self.speed_bins))
+        )
+        self.track_ids = set()
+
+    def _check_bins(self, other):
+        for name in ("twa_bins", "tws_bins", "speed_bins"):
+            if not np.array_equal(getattr(self, name), getattr(other, name)):
+                raise ValueError(f"polars with different {name} can not be merged")
+
+    def add(self, twa, tws, speed, seconds=1.0):
+        """
+        Add samples of absolute true wind angle, true wind speed and boat speed,
+        weighted by `seconds`. Samples with a missing value are skipped.
+        """
+        twa, tws, speed = (np.asarray(v, dtype=float) for v in (twa, tws, speed))
+        seconds = np.broadcast_to(np.asarray(seconds, dtype=float), twa.shape)
+        known = ~(np.isnan(twa) | np.isnan(tws) | np.isnan(speed) | np.isnan(seconds))
+        flat = np.ravel_multi_index(
+            (
+                _bin_index(twa[known], self.twa_bins),
+                _bin_index(tws[known], self.tws_bins),
+                _bin_index(speed[known], self.speed_bins),
+            ),
+            self.seconds.shape,
+        )
+        self.seconds += np.bincount(
+            flat, weights=seconds[known], minlength=self.seconds.size
+        ).reshape(self.seconds.shape)
+
+    def add_track(
+        self, traj, track_id=None, wind_column="wind_deg", wind_speed="wind_speed"
+    ):
+        """
+        Add the segments of a trajectory with the wind joined (see
+        `join_weather`). Tracks already in the polar are skipped, returning False.
+        """
+        if track_id is None:
+            track_id = str(traj.track_id.iloc[0])
+        if track_id in self.track_ids:
+            return False
+        twa = true_wind_angle(
+            traj["direction"].to_numpy(dtype=float), traj[wind_column]
+        )
+        self.add(np.abs(twa), traj[wind_speed], traj["speed"], traj["timedelta"])
+        self.track_ids.add(track_id)
+        return True
+
+    @classmethod
+    def from_track(cls, traj, **kwargs):
+        polar = cls()
+        polar.add_track(traj, **kwargs)
+        return polar
+
+    def merge(self, other):
+        """
+        Add the histograms of another polar with the same bins and other tracks.
+        """
+        self._check_bins(other)
+        overlap = other.track_ids & self.track_ids
+        if overlap:
+            raise ValueError(f"tracks already in the polar: {sorted(overlap)}")
+        self.seconds += other.seconds
+        self.track_ids |= other.track_ids
+        return self
+
+    def __add__(self, other):
+        polar = PolarAccumulator(self.twa_bins, self.tws_bins, self.speed_bins)
+        return polar.merge(self).merge(other)
+
+    def quantiles(self, q=QUANTILES):
+        """
+        Seconds sailed and boat speed quantiles of every (TWA, TWS) bin with
+        data, interpolated linearly inside the speed bins.
+        """
+        # the last bin is open ended, interpolate in it as wide as the one before
+        width = np.diff(
+            self.speed_bins, append=2 * self.speed_bins[-1] - self.speed_bins[-2]
+        )
+        seconds = self.seconds.reshape(-1, len(self.speed_bins))
+        total = seconds.sum(axis=1)
+        cumulative = np.cumsum(seconds, axis=1)
+        twa, tws = np.unravel_index(np.arange(len(total)), self.seconds.shape[:2])
+        frame = pd.DataFrame(
+            {"twa": self.twa_bins[twa], "tws": self.tws_bins[tws], "seconds": total}
+        )
+        rows = np.arange(len(total))
+        for quantile in q:
+            target = quantile * total
+            speed = np.argmax(cumulative >= target[:, None], axis=1)
+            before = cumulative[rows, speed] - seconds[rows, speed]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fraction = (target - before) / seconds[rows, speed]
+            frame[f"q{round(quantile * 100)}"] = (
+                self.speed_bins[speed] + np.clip(fraction, 0, 1) * width[speed]
+            )
+        return frame[total > 0].reset_index(drop=True)
+
+    def polar(self, q=0.9):
+        """
+        Boat speed quantile `q` with the TWA bins as index and TWS bins as columns.
+        """
+        name = f"q{round(q * 100)}"
+        return self.quantiles([q]).pivot(index="twa", columns="tws", values=name)
+
+    def to_frame(self, track_id=None):
+        """
+        Non empty bins as rows (lower bin edges and seconds), for the
+        sailing_polar table. `track_id` defaults to the track of single track
+        polars.
+        """
+        twa, tws, speed = np.nonzero(self.seconds)
+        if track_id is None and len(self.track_ids) == 1:
+            track_id = next(iter(self.track_ids))
+        return pd.DataFrame(
+            {
+                "track_id": track_id,
+                "twa": self.twa_bins[twa],
+                "tws": self.tws_bins[tws],
+                "speed": self.speed_bins[speed],
+                "seconds": self.seconds[twa, tws, speed],
+            }
+        )
+
+    @classmethod
+    def from_frame(cls, frame, **bins):
+        """
+        Polar of the rows of `to_frame` (of one or many tracks), on the default
+        bins unless given.
+        """
+        polar = cls(**bins)
+        polar.add(frame.twa, frame.tws, frame.speed, frame.seconds)
+        if "track_id" in frame:
+            polar.track_ids.update(frame.track_id.dropna().unique())
+        return polar
+
+    def save(self, path=POLAR_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            seconds=self.seconds,
+            twa_bins=self.twa_bins,
+            tws_bins=self.tws_bins,
+            speed_bins=self.speed_bins,
+            track_ids=np.array(sorted(self.track_ids), dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path=POLAR_FILE):
+        """
+        Polar saved on `path`, or an empty one when the file does not exist.
+        """
+        if not Path(path).exists():
+            return cls()
+        with np.load(path) as data:
+            polar = cls(data["twa_bins"], data["tws_bins"], data["speed_bins"])
+            polar.seconds = data["seconds"]
+            polar.track_ids = set(data["track_ids"].tolist())
+        return polar
+
+
+def build_polar(tracks, workers=None, **kwargs):
+    """
+    Polar of trajectories with the wind joined, built by `workers` processes and
+    merged.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        polars = list(executor.map(_track_polar, tracks, repeat(kwargs)))
+    return reduce(PolarAccumulator.merge, polars, PolarAccumulator())
+
+
+def _track_polar(traj, kwargs):
+    return PolarAccumulator.from_track(traj, **kwargs)
@@ -0,0 +1,36 @@
+"""
+Sailing track analysis. The functions below are imported from their modules on
+first access, so importing the package (or running its command line) does not
+load geopandas, matplotlib or the database engine.
+"""
+
+import importlib
+
+__version__ = "0.1.0"
+# public name: module defining it
+_LAZY = {
+    "export_gpx": "spatial_tools",
+    "process_OWM_data": "spatial_tools",
+    "render_traj_maps": "spatial_tools",
+    "create_traj_map": "spatial_tools",
+    "ingest_directory": "ingest_tools",
+    "list_tracks": "db_tools",
+    "load_track": "db_tools",
+    "load_compact": "db_tools",
+    "read_archive": "parquet_tools",
+    "read_gpkg": "gpkg_tools",
+    "get_engine": "models",
+}
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_LAZY])
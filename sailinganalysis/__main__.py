@@ -0,0 +1,5 @@
+import sys
+
+from sailinganalysis.cli import main
+
+sys.exit(main())
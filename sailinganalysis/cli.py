@@ -0,0 +1,216 @@
+"""
+Command line interface: `sailinganalysis {ingest,weather,render,report}`.
+
+Only argparse is imported to build the parser; each subcommand imports the
+modules it needs (and creates the database engine) when it runs, so `--help`
+and subcommands that do not touch a dependency do not pay for it.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+
+def _storage_parser():
+    parser = argparse.ArgumentParser(add_help=False)
+    storage = parser.add_argument_group("storage (PostGIS on DB_URL by default)")
+    group = storage.add_mutually_exclusive_group()
+    group.add_argument(
+        "--gpkg",
+        action="store_true",
+        help="SailingAnalysis.gpkg, a layer per track (or its single tables)",
+    )
+    group.add_argument(
+        "--gpkg-tables",
+        action="store_true",
+        help="SailingAnalysis.gpkg, one table per model shared by every track",
+    )
+    group.add_argument(
+        "--archive", type=Path, metavar="DIR", help="GeoParquet archive directory"
+    )
+    return parser
+
+
+def _post_gis(args):
+    return not (args.gpkg or args.gpkg_tables or args.archive)
+
+
+def ingest(args):
+    from ingest_tools import ingest_directory
+
+    options = {"compact": args.compact}
+    if args.gpkg_tables:
+        options["gpkg_tables"] = True
+    if args.archive is not None:
+        options["archive_dir"] = args.archive
+    entries = ingest_directory(
+        args.source,
+        manifest_path=args.manifest,
+        layer=args.layer,
+        to_postgis=_post_gis(args),
+        workers=args.workers,
+        retry_failed=args.retry_failed,
+        **options,
+    )
+    errors = [entry for entry in entries if entry["status"] != "ok"]
+    print(f"{len(entries) - len(errors)} tracks ingested, {len(errors)} errors")
+    return 1 if errors else 0
+
+
+def weather(args):
+    from spatial_tools import BAIRES_TZ, create_id, gpx_to_geodataframe, read_gpx
+
+    track_df = gpx_to_geodataframe(read_gpx(args.gpx), tz=BAIRES_TZ)
+    track_df["track_id"] = str(create_id(track_df))
+    if args.plan:
+        from owm_tools import planner_report
+
+        print(planner_report(track_df))
+        return 0
+
+    from spatial_tools import process_OWM_data, save_OWM_data
+
+    weather_data = process_OWM_data(track_df)
+    print(f"{len(weather_data)} weather rows for track {track_df.track_id[0]}")
+    if args.save:
+        save_OWM_data(weather_data)
+    return 0
+
+
+def render(args):
+    from db_tools import load_track
+    from spatial_tools import render_traj_maps
+
+    traj = load_track(args.track_id, post_gis=_post_gis(args), archive_dir=args.archive)
+    windows = [(args.track_id, None, None, args.attribute)]
+    if args.window:
+        windows = [
+            (
+                title,
+                datetime.fromisoformat(start),
+                datetime.fromisoformat(stop),
+                args.attribute,
+            )
+            for title, start, stop in args.window
+        ]
+    for fname in render_traj_maps(traj, windows, workers=args.workers, lod=args.lod):
+        print(fname)
+    return 0
+
+
+def report(args):
+    filters = {"bbox": args.bbox, "start": args.start, "stop": args.stop}
+    if _post_gis(args):
+        from db_tools import list_tracks
+
+        summaries = list_tracks(
+            **filters, min_length=args.min_length, min_maneuvers=args.min_maneuvers
+        )
+    else:
+        from models import TrackSummary
+
+        if args.archive is not None:
+            from parquet_tools import read_archive
+
+            summaries = read_archive(TrackSummary, archive_dir=args.archive, **filters)
+        else:
+            from gpkg_tools import read_gpkg
+
+            summaries = read_gpkg(TrackSummary, **filters)
+        if args.min_length is not None:
+            summaries = summaries[summaries["length"] >= args.min_length]
+        if args.min_maneuvers is not None:
+            summaries = summaries[summaries["maneuvers"] >= args.min_maneuvers]
+    if not len(summaries):
+        print("No tracks")
+        return 0
+    print(
+        summaries.drop(columns=["geometry", "content_hash"], errors="ignore").to_string(
+            index=False
+        )
+    )
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="sailinganalysis", description="Sailing track analysis"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    storage = _storage_parser()
+
+    parser_ingest = commands.add_parser(
+        "ingest",
+        parents=[storage],
+        help="save GPX tracks with their metrics, maneuvers and summaries",
+    )
+    parser_ingest.add_argument("source", help="GPX file, directory or glob")
+    parser_ingest.add_argument("--layer", default="track_points")
+    parser_ingest.add_argument(
+        "--manifest", type=Path, default=Path("./data/ingest_manifest.jsonl")
+    )
+    parser_ingest.add_argument("--workers", type=int)
+    parser_ingest.add_argument("--retry-failed", action="store_true")
+    parser_ingest.add_argument(
+        "--compact", action="store_true", help="one row per segment (PostGIS)"
+    )
+    parser_ingest.set_defaults(handler=ingest)
+
+    parser_weather = commands.add_parser(
+        "weather", help="fetch the Open Weather Map weather along a GPX track"
+    )
+    parser_weather.add_argument("gpx", type=Path)
+    parser_weather.add_argument(
+        "--plan", action="store_true", help="only print the planned OWM calls"
+    )
+    parser_weather.add_argument(
+        "--save", action="store_true", help="save the weather on PostGIS"
+    )
+    parser_weather.set_defaults(handler=weather)
+
+    parser_render = commands.add_parser(
+        "render", parents=[storage], help="save trajectory maps of a saved track"
+    )
+    parser_render.add_argument("track_id")
+    parser_render.add_argument(
+        "--window",
+        nargs=3,
+        action="append",
+        metavar=("TITLE", "START", "STOP"),
+        help="map title and local ISO times, repeatable (default: whole track)",
+    )
+    parser_render.add_argument("--attribute", default="speed")
+    parser_render.add_argument("--workers", type=int)
+    parser_render.add_argument(
+        "--lod",
+        action="store_true",
+        help="draw zoomed out windows simplified to the map resolution",
+    )
+    parser_render.set_defaults(handler=render)
+
+    parser_report = commands.add_parser(
+        "report", parents=[storage], help="list the saved track summaries"
+    )
+    parser_report.add_argument(
+        "--start", type=datetime.fromisoformat, help="local ISO time"
+    )
+    parser_report.add_argument(
+        "--stop", type=datetime.fromisoformat, help="local ISO time"
+    )
+    parser_report.add_argument(
+        "--bbox", type=float, nargs=4, metavar=("XMIN", "YMIN", "XMAX", "YMAX")
+    )
+    parser_report.add_argument("--min-length", type=float, help="meters")
+    parser_report.add_argument("--min-maneuvers", type=int)
+    parser_report.set_defaults(handler=report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
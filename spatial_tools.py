@@ -1,30 +1,48 @@
+import asyncio
 import logging
 import os
-import time
 import uuid
-from datetime import timezone, timedelta, datetime
-from math import cos, sin, radians
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timezone, timedelta
 from pathlib import Path
 
-import contextily as ctx
 import fiona
 import geopandas as gpd
-import jsonlines
-import matplotlib.pyplot as plt
-import movingpandas as mpd
 import numpy as np
 import pandas as pd
-import requests
+import shapely
 from dotenv import load_dotenv
-from geoalchemy2 import Geometry
 
+from compact_tools import to_compact
+from db_tools import (
+    bulk_save_track,
+    query_owm_data,
+    query_track,
+    query_track_ids,
+    replace_track,
+    track_summary_hash,
+)
+from gpkg_tools import GPKG_PATH, append_gpkg, read_gpkg, replace_gpkg, saved
+from gpx_tools import read_gpx, gpx_to_geodataframe
+from join_tools import join_weather
+from lod_tools import LOD_COLUMNS, build_levels, level_of_detail
+from maneuver_tools import detect_maneuvers
+from metrics_tools import summarize_track, to_line_gdf, track_hash
 from models import (
-    engine,
-    Session,
+    get_engine,
     SailingTrackPoints,
     OWM_data,
+    SailingTrackCompact,
     SailingTrackLine,
+    SailingTrackLOD,
+    SailingManeuver,
+    SailingPointOfSail,
+    SailingPolar,
+    TrackSummary,
 )
+from owm_tools import fetch_owm_data, plan_weather_queries, read_owm_jsonl
+from point_of_sail_tools import point_of_sail_segments
+from polar_tools import POLAR_FILE, PolarAccumulator
 
 load_dotenv()
 
@@ -32,6 +50,7 @@ OWM_KEY = os.getenv("OPENWEATHER_KEY")
 GPX_FILE = Path("./data/SailingTrack.gpx")
 GPX_FILE = Path("/mnt/Trabalho/DonCarlos_Tracks/Track_21-JUL-22 171218.gpx")
 TRACK_LAYER = "track_points"
+SUMMARY_LAYER = "track_summary"
 WEATHER_FORECAST = "./data/weather.csv"
 # defining local timezone
 BAIRES_TZ = timezone(timedelta(hours=-3))
@@ -41,29 +60,77 @@ def create_id(track_df):
     return uuid.uuid5(uuid.NAMESPACE_DNS, track_df.time.iloc[0].isoformat())
 
 
-def save_track(track_df, name, post_gis=False, model=SailingTrackPoints):
-    if post_gis:
-        with Session() as session:
-            record_exists = (
-                session.query(model)
-                .filter_by(track_id=str(track_df.track_id[0]))
-                .first()
+def save_track(
+    track_df,
+    name,
+    post_gis=False,
+    model=SailingTrackPoints,
+    archive_dir=None,
+    gpkg_tables=False,
+    update=False,
+):
+    if post_gis and update:
+        # the rows of the track are deleted first, like on the archive and the
+        # GeoPackage tables, so rows whose natural key changed are not kept
+        rows = replace_track(track_df, model)
+        logging.warning(
+            f"{model.__tablename__} replaced: {track_df.track_id[0]} ({rows} rows)"
+        )
+    elif post_gis:
+        # rows already saved are skipped by the unique constraint of the model
+        rows = bulk_save_track(track_df, model)
+        if rows:
+            logging.warning(
+                f"{model.__tablename__} saved: {track_df.track_id[0]} ({rows} rows)"
+            )
+        else:
+            logging.warning(
+                f"record already exists {track_df.track_id[0]} on {model.__tablename__}"
+            )
+    elif archive_dir is not None:
+        from parquet_tools import append_archive, archived, replace_archive
+
+        # one partition directory per track, no layer listing before writing
+        if update:
+            replace_archive(track_df, model, archive_dir)
+            logging.warning(
+                f"{model.__tablename__} replaced on {archive_dir}: "
+                f"{track_df.track_id[0]} ({len(track_df)} rows)"
+            )
+        elif archived(track_df.track_id[0], model, archive_dir):
+            logging.warning(
+                f"record already exists {track_df.track_id[0]} on {model.__tablename__}"
+            )
+        else:
+            append_archive(track_df, model, archive_dir)
+            logging.warning(
+                f"{model.__tablename__} archived on {archive_dir}: "
+                f"{track_df.track_id[0]} ({len(track_df)} rows)"
+            )
+    elif gpkg_tables:
+        # one table per model shared by every track, like the PostGIS schema
+        if update:
+            rows = replace_gpkg(track_df, model)
+            logging.warning(
+                f"{model.__tablename__} replaced on {GPKG_PATH}: "
+                f"{track_df.track_id[0]} ({rows} rows)"
+            )
+        elif saved(track_df.track_id[0], model):
+            logging.warning(
+                f"record already exists {track_df.track_id[0]} on {model.__tablename__}"
+            )
+        else:
+            rows = append_gpkg(track_df, model)
+            logging.warning(
+                f"{model.__tablename__} saved on {GPKG_PATH}: "
+                f"{track_df.track_id[0]} ({rows} rows)"
             )
-            if record_exists:
-                logging.warning(
-                    f"record already exists {record_exists.track_id} on {SailingTrackPoints.__tablename__}"
-                )
-            else:
-                track_df.to_postgis(
-                    model.__tablename__,
-                    engine,
-                    if_exists="append",
-                    index=False,
-                    dtype={"geometry": Geometry(geometry_type="POINT", srid=4326)},
-                )
-                logging.warning(f"{model.__tablename__} saved: {track_df.track_id[0]}")
     else:
-        if name in fiona.listlayers("SailingAnalysis.gpkg"):
+        if (
+            not update
+            and Path("SailingAnalysis.gpkg").exists()
+            and name in fiona.listlayers("SailingAnalysis.gpkg")
+        ):
             logging.warning(f"{name} already exists")
         else:
             track_df.to_file(
@@ -74,58 +141,174 @@ def save_track(track_df, name, post_gis=False, model=SailingTrackPoints):
             logging.warning(f"Sailing track {name} saved on SailingAnalysis.gpkg")
 
 
+def summary_hash(track_id, post_gis=False, archive_dir=None, gpkg_tables=False):
+    """
+    Content hash of the saved summary of a track, None when there is none.
+    """
+    if post_gis:
+        return track_summary_hash(track_id)
+    if archive_dir is not None:
+        from parquet_tools import archived, read_archive
+
+        if not archived(track_id, TrackSummary, archive_dir):
+            return None
+        summaries = read_archive(
+            TrackSummary, [track_id], columns=["content_hash"], archive_dir=archive_dir
+        )
+        return summaries.content_hash.iloc[0]
+    if gpkg_tables:
+        if not saved(track_id, TrackSummary):
+            return None
+        summaries = read_gpkg(TrackSummary, [track_id], columns=["content_hash"])
+        return summaries.content_hash.iloc[0]
+    if not (
+        Path("SailingAnalysis.gpkg").exists()
+        and SUMMARY_LAYER in fiona.listlayers("SailingAnalysis.gpkg")
+    ):
+        return None
+    summaries = gpd.read_file(
+        "SailingAnalysis.gpkg", layer=SUMMARY_LAYER, where=f"track_id = '{track_id}'"
+    )
+    return summaries.content_hash.iloc[0] if len(summaries) else None
+
+
+def save_track_summary(summary, post_gis=False, archive_dir=None, gpkg_tables=False):
+    """
+    Insert or replace the summary row of a track on the track_summary table,
+    archive table or GeoPackage layer.
+    """
+    track_id = summary.track_id.iloc[0]
+    if post_gis:
+        bulk_save_track(summary, TrackSummary, update=True)
+    elif archive_dir is not None:
+        from parquet_tools import replace_archive
+
+        replace_archive(summary, TrackSummary, archive_dir)
+    elif gpkg_tables:
+        replace_gpkg(summary, TrackSummary)
+    else:
+        if Path("SailingAnalysis.gpkg").exists() and SUMMARY_LAYER in fiona.listlayers(
+            "SailingAnalysis.gpkg"
+        ):
+            summaries = gpd.read_file("SailingAnalysis.gpkg", layer=SUMMARY_LAYER)
+            summary = pd.concat(
+                [summaries[summaries.track_id != track_id], summary], ignore_index=True
+            )
+        summary.to_file("SailingAnalysis.gpkg", layer=SUMMARY_LAYER, driver="GPKG")
+    logging.warning(f"{SUMMARY_LAYER} saved: {track_id}")
+
+
 def export_gpx(
     gpx_path="/mnt/Trabalho/DonCarlos_Tracks/Track_23-ABR-23 132017.gpx",
     layer="track_points",
     to_postgis=True,
+    compact=False,
+    archive_dir=None,
+    gpkg_tables=False,
 ):
+    if compact and not to_postgis:
+        raise ValueError("compact storage is only available on PostGIS")
+    if (archive_dir is not None) + gpkg_tables + to_postgis > 1:
+        raise ValueError(
+            "save either to PostGIS, the GeoParquet archive or the GeoPackage tables"
+        )
     gpx_path = Path(gpx_path)
-    gpx_original = fiona.open(gpx_path, layer=layer)
-    # convert to geodataframe
-    track_df = gpd.GeoDataFrame.from_features(
-        [feature for feature in gpx_original], crs=gpx_original.crs
-    )
+    if layer == TRACK_LAYER:
+        # stream the GPX straight into columns, converting time to local timezone
+        track_df = gpx_to_geodataframe(read_gpx(gpx_path), tz=BAIRES_TZ)
+    else:
+        gpx_original = fiona.open(gpx_path, layer=layer)
+        # convert to geodataframe
+        track_df = gpd.GeoDataFrame.from_features(
+            [feature for feature in gpx_original], crs=gpx_original.crs
+        )
 
-    # convert the date time column to local timezone
-    track_df.time = pd.to_datetime(track_df.time, utc=True).dt.tz_convert(tz=BAIRES_TZ)
+        # convert the date time column to local timezone
+        track_df.time = pd.to_datetime(track_df.time, utc=True).dt.tz_convert(
+            tz=BAIRES_TZ
+        )
 
     # create track_id
     track_df["track_id"] = create_id(track_df)
     track_df["track_id"] = str(track_df["track_id"][0])
     track_df = track_df.drop(
-        "gpxtpx_TrackPointExtension", axis=1  # todo confirm necessity before drop
+        "gpxtpx_TrackPointExtension",
+        axis=1,
+        errors="ignore",  # todo confirm necessity before drop
     )  # confirmar necessidade
-    save_track(
-        track_df,
-        name=f"{track_df.time[0].date().isoformat()}_{track_df.track_id[0]}_track_points",
-        post_gis=to_postgis,
-        model=SailingTrackPoints,
-    )
+    if not compact:
+        save_track(
+            track_df,
+            name=f"{track_df.time[0].date().isoformat()}_{track_df.track_id[0]}_track_points",
+            post_gis=to_postgis,
+            model=SailingTrackPoints,
+            archive_dir=archive_dir,
+            gpkg_tables=gpkg_tables,
+        )
 
-    # conversion to a movingpandas' track
-    # test if track_seg_point_id column exist
+    # calculate acceleration, angular difference, direction, distance (meters),
+    # speed (meters per second) and timedelta (seconds) in a single pass
     logging.warning(f"Creating trjectory from track points")
-    trajectory = mpd.Trajectory(df=track_df, traj_id="track_seg_point_id", t="time")
-    # calculate few track attributes
-    trajectory.add_acceleration(overwrite=True)
-    trajectory.add_angular_difference(overwrite=True)
-    trajectory.add_direction(overwrite=True)
-    trajectory.add_distance(overwrite=True)  # in meters
-    trajectory.add_speed(overwrite=True)  # in meters per second
-    trajectory.add_timedelta(overwrite=True)
-    trajectory.df.timedelta = trajectory.df.timedelta.dt.total_seconds()
-    trajectory.df.direction = round(trajectory.df.direction, 1)
-
-    # persist on database
-    trajectory = trajectory.to_line_gdf()
-    # trajectory = trajectory.drop("gpxtpx_TrackPointExtension", axis=1)
-    trajectory.crs = track_df.crs
+    trajectory = to_line_gdf(track_df)
+    trajectory.direction = round(trajectory.direction, 1)
+
+    # persist on database, with `compact` as one row per track segment run
+    # instead of one row per point and per segment
+    if compact:
+        save_track(
+            track_df=to_compact(track_df, trajectory),
+            name=None,
+            post_gis=True,
+            model=SailingTrackCompact,
+        )
+    else:
+        save_track(
+            track_df=trajectory,
+            name=f"{trajectory.t[0].date().isoformat()}_{trajectory.track_id[0]}_trajectory",
+            post_gis=to_postgis,
+            model=SailingTrackLine,
+            archive_dir=archive_dir,
+            gpkg_tables=gpkg_tables,
+        )
+
+    # course changes, saved as turns until the wind is joined (see
+    # save_maneuvers), queried fleet wide from the sailing_maneuver table
+    maneuvers = detect_maneuvers(trajectory)
+    if len(maneuvers):
+        save_track(
+            track_df=maneuvers,
+            name=f"{trajectory.t[0].date().isoformat()}_{trajectory.track_id[0]}_maneuvers",
+            post_gis=to_postgis,
+            model=SailingManeuver,
+            archive_dir=archive_dir,
+            gpkg_tables=gpkg_tables,
+        )
+
+    # simplified levels of detail keeping the maneuvers, for zoomed out maps
     save_track(
-        track_df=trajectory,
-        name=f"{trajectory.t[0].date().isoformat()}_{trajectory.track_id[0]}_trajectory",
+        track_df=build_levels(trajectory, maneuvers),
+        name=f"{trajectory.t[0].date().isoformat()}_{trajectory.track_id[0]}_lod",
         post_gis=to_postgis,
-        model=SailingTrackLine,
+        model=SailingTrackLOD,
+        archive_dir=archive_dir,
+        gpkg_tables=gpkg_tables,
     )
+
+    # one row per track for listing and filtering tracks, recomputed only when
+    # the track points changed
+    content_hash = track_hash(track_df)
+    if (
+        summary_hash(trajectory.track_id[0], to_postgis, archive_dir, gpkg_tables)
+        == content_hash
+    ):
+        logging.warning(f"{SUMMARY_LAYER} up to date: {trajectory.track_id[0]}")
+    else:
+        save_track_summary(
+            summarize_track(trajectory, content_hash, maneuvers=len(maneuvers)),
+            post_gis=to_postgis,
+            archive_dir=archive_dir,
+            gpkg_tables=gpkg_tables,
+        )
     return track_df, trajectory
 
 
@@ -133,62 +316,35 @@ def get_unique_hours(track_df):
     return track_df.time.dt.strftime("%Y-%m-%d %H:00:00").unique()
 
 
-def get_OWM_data(track_df, step=10):
+def get_OWM_data(track_df, step=None):
     jsonl_path = Path(f"./data/{track_df.track_id[0]}_OWM_weather.jsonl")
-    if jsonl_path.exists():
-        logging.warning(f"{jsonl_path} already exists")
+    logging.warning(f"Getting weather data from Open Weather Map")
+    if step is None:
+        # one query per weather grid cell and hour crossed by the track
+        queries, _ = plan_weather_queries(
+            track_df.geometry.y, track_df.geometry.x, track_df.time
+        )
+        queries = queries.to_dict("records")
     else:
-        logging.warning(f"Getting weather data from Open Weather Map")
-        weather_lines = []
-        for ind in range(track_df.index.start, track_df.index.stop, step):
-            # ind = track_df.index[0]
-            lat = track_df.geometry.y[ind]
-            lon = track_df.geometry.x[ind]
-            timestamp = int(track_df.time[ind].timestamp())
-            url = f"https://api.openweathermap.org/data/2.5/onecall/timemachine?lat={lat}&lon={lon}&units=metric&dt={timestamp}&lang=es&appid={OWM_KEY}"
-            resp = requests.get(url=url)
-            data = resp.json()
-            weather_lines.append(data)
-            time.sleep(5)
-        with jsonlines.open(
-            f"./data/{track_df.track_id.iloc[0]}_OWM_weather.jsonl", "w"
-        ) as writer:
-            writer.write_all(weather_lines)
+        sampled = track_df.iloc[::step]
+        timestamps = (sampled.time - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(
+            seconds=1
+        )
+        queries = [
+            {"lat": lat, "lon": lon, "dt": int(dt)}
+            for lat, lon, dt in zip(sampled.geometry.y, sampled.geometry.x, timestamps)
+        ]
+    # queries already saved on jsonl_path are not requested again
+    asyncio.run(fetch_owm_data(queries, jsonl_path, api_key=OWM_KEY))
     return jsonl_path
 
 
 def process_OWM_data(
-    track_df, step=1
+    track_df, step=None
 ):  # todo rename lat and lon columns to latitude and longitude. # todo remove rename from save_owm  # todo change plot owm using longitud no lon anymore
     weather_lines = get_OWM_data(track_df, step=step)
-    weather_data = pd.read_json(weather_lines, lines=True)
-    weather_data = pd.concat(
-        [
-            weather_data.drop(["current"], axis=1),
-            weather_data["current"].apply(pd.Series),
-        ],
-        axis=1,
-    )
-    weather_data["time"] = weather_data.dt.apply(datetime.fromtimestamp, tz=BAIRES_TZ)
-    weather_data.drop(
-        [
-            "timezone",
-            "timezone_offset",
-            "hourly",
-            "dt",
-            "sunrise",
-            "sunset",
-            "feels_like",
-            "dew_point",
-            "uvi",
-            "clouds",
-            "visibility",
-            "weather",
-        ],
-        axis=1,
-        inplace=True,
-    )
-    return weather_data
+    # stream only the needed fields into typed columns
+    return read_owm_jsonl(weather_lines, tz=BAIRES_TZ)
 
 
 def save_OWM_data(owm_data):
@@ -197,11 +353,130 @@ def save_OWM_data(owm_data):
         owm_data.rename(columns={"lon": "longitude", "lat": "latitude"}, inplace=True)
 
     owm_data.rename({"lon": "longitude", "lat": "latitude"})
-    owm_data.to_sql(OWM_data.__tablename__, engine, if_exists="append", index=False)
+    owm_data.to_sql(
+        OWM_data.__tablename__, get_engine(), if_exists="append", index=False
+    )
     logging.warning(f"OWM data saved")
 
 
+def save_maneuvers(joined, to_postgis=True, archive_dir=None, gpkg_tables=False):
+    """
+    Detect the tacks and gybes of a trajectory with the wind joined and save
+    them on the sailing_maneuver table, replacing every maneuver saved for the
+    track (e.g. the turns `export_gpx` saved before the wind was known).
+    """
+    maneuvers = detect_maneuvers(joined)
+    if len(maneuvers):
+        save_track(
+            track_df=maneuvers,
+            name=f"{joined.t.iloc[0].date().isoformat()}_{joined.track_id.iloc[0]}_maneuvers",
+            post_gis=to_postgis,
+            model=SailingManeuver,
+            archive_dir=archive_dir,
+            gpkg_tables=gpkg_tables,
+            update=True,
+        )
+    return maneuvers
+
+
+def save_points_of_sail(
+    trajectory, weather, to_postgis=True, archive_dir=None, gpkg_tables=False
+):
+    """
+    Join the weather on a trajectory and save its point of sail runs and its
+    tacks and gybes, replacing the ones saved for the track before.
+    """
+    joined = join_weather(trajectory, weather, traj_tz=BAIRES_TZ)
+    segments = point_of_sail_segments(joined)
+    save_track(
+        track_df=segments,
+        name=f"{trajectory.t[0].date().isoformat()}_{trajectory.track_id[0]}_points_of_sail",
+        post_gis=to_postgis,
+        model=SailingPointOfSail,
+        archive_dir=archive_dir,
+        gpkg_tables=gpkg_tables,
+        update=True,
+    )
+    save_maneuvers(
+        joined, to_postgis=to_postgis, archive_dir=archive_dir, gpkg_tables=gpkg_tables
+    )
+    return segments
+
+
+def save_polar(joined, to_postgis=True, polar_path=POLAR_FILE):
+    """
+    Add a trajectory with the wind joined to the boat polar: its bins are saved
+    on the sailing_polar table, or merged into the polar saved on `polar_path`.
+    Tracks already in the polar are skipped.
+    """
+    track_polar = PolarAccumulator.from_track(joined)
+    track_id = str(joined.track_id.iloc[0])
+    if to_postgis:
+        save_track(track_polar.to_frame(), name=None, post_gis=True, model=SailingPolar)
+        return track_polar
+    polar = PolarAccumulator.load(polar_path)
+    if track_id in polar.track_ids:
+        logging.warning(f"{track_id} already in the polar {polar_path}")
+    else:
+        polar.merge(track_polar).save(polar_path)
+        logging.warning(f"{track_id} added to the polar {polar_path}")
+    return track_polar
+
+
+def classify_season(start, stop, weather=None, max_gap=timedelta(hours=2)):
+    """
+    Point of sail runs and tacks and gybes of every track saved on
+    sailing_track_line between start and stop, joined with `weather` (by
+    default the saved OWM data around each track, naive UTC like `weather`
+    when it has no time zone), replacing the runs and maneuvers saved on the
+    sailing_point_of_sail and sailing_maneuver tables one track at a time.
+    """
+    season = []
+    for track_id in query_track_ids(SailingTrackLine, start=start, stop=stop):
+        lines = query_track(SailingTrackLine, track_id, start=start, stop=stop)
+        track_weather = weather
+        if track_weather is None:
+            # segment times are naive local, OWM times naive UTC
+            track_weather = query_owm_data(
+                lines.t.min().tz_localize(BAIRES_TZ) - max_gap,
+                lines.t.max().tz_localize(BAIRES_TZ) + max_gap,
+            )
+        joined = join_weather(lines, track_weather, traj_tz=BAIRES_TZ, max_gap=max_gap)
+        segments = point_of_sail_segments(joined)
+        save_track(
+            segments, name=None, post_gis=True, model=SailingPointOfSail, update=True
+        )
+        save_maneuvers(joined)
+        season.append(segments)
+    if not season:
+        logging.warning(f"No {SailingTrackLine.__tablename__} rows to classify")
+        return pd.DataFrame()
+    return pd.concat(season, ignore_index=True)
+
+
+def wind_components(wind_speed, wind_deg):
+    """
+    U and V components of the wind barbs, from speed and meteorological
+    direction (where the wind blows from) in degrees.
+    """
+    wind_speed = np.asarray(wind_speed, dtype=float)
+    angle = np.radians(270 - np.asarray(wind_deg, dtype=float))
+    return wind_speed * np.cos(angle), wind_speed * np.sin(angle)
+
+
+def segment_starts(geometry):
+    """
+    X and Y coordinates of the first point of each LineString.
+    """
+    start = shapely.get_point(np.asarray(geometry), 0)
+    return shapely.get_x(start), shapely.get_y(start)
+
+
 def create_map(track, map_title="Regata", start=None, stop=None, weather=None):
+    import matplotlib.pyplot as plt
+
+    from tile_tools import add_basemap
+
     map_path = Path("./maps")
     if not map_path.exists():
         map_path.mkdir()
@@ -234,12 +509,9 @@ def create_map(track, map_title="Regata", start=None, stop=None, weather=None):
         ax.barbs(
             weather["lon"] + 0.0005,
             weather["lat"] + 0.0005,
-            weather["wind_speed"]
-            * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(cos),
-            weather["wind_speed"]
-            * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(sin),
+            *wind_components(weather["wind_speed"], weather["wind_deg"]),
         )
-    ctx.add_basemap(ax, crs=track.crs, source=ctx.providers.OpenStreetMap.get("Mapnik"))
+    add_basemap(ax, crs=track.crs)
     plt.title(map_title, fontdict={"size": 18})
     plt.savefig(
         fname=f"{map_path}/{track.time.iloc[0].date().isoformat()}_{map_title}.png",
@@ -255,6 +527,64 @@ def create_map(track, map_title="Regata", start=None, stop=None, weather=None):
     # plt.show()
 
 
+def _traj_window(traj, weather, start, stop):
+    # traj and weather are indexed by naive local time
+    traj = traj[start:stop] if start or stop else traj
+    if weather is not None and (start or stop):
+        weather = weather[start:stop]
+    return traj, weather
+
+
+def _window_bounds(traj):
+    aoi_bounds = traj.geometry.total_bounds
+    return (
+        aoi_bounds[0] - 0.0025,
+        aoi_bounds[1] - 0.0025,
+        aoi_bounds[2] + 0.0025,
+        aoi_bounds[3] + 0.0025,
+    )
+
+
+def _index_weather(weather):
+    weather = weather.set_index("time")
+    weather.index = weather.index.tz_localize(None)
+    return weather
+
+
+def _draw_traj(ax, traj, attribute, weather=None, lod=False):
+    xmin, ymin, xmax, ymax = _window_bounds(traj)
+    ax.set_xlim([xmin, xmax])
+    ax.set_ylim([ymin, ymax])
+    lines = traj
+    if lod and attribute in LOD_COLUMNS:
+        # segments smaller than a pixel are drawn simplified
+        lines = level_of_detail(traj.reset_index(), ax.bbox.width).set_index("t")
+    lines.plot(
+        attribute,
+        linewidth=3,
+        legend=True,
+        legend_kwds={"shrink": 0.3},
+        ax=ax,
+        cmap="Reds",
+    )
+    if weather is not None:
+        ax.barbs(
+            weather["lon"],
+            weather["lat"],
+            *wind_components(weather["wind_speed"], weather["wind_deg"]),
+        )
+
+
+def _draw_contra(ax, traj):
+    # drawn after the basemap and the title, as create_traj_map always did
+    col = np.where(
+        traj.angular_difference < 30,
+        "r",
+        np.where(traj.angular_difference > 100, "b", "r"),
+    )
+    ax.scatter(*segment_starts(traj.geometry), color=col)
+
+
 def create_traj_map(
     traj,
     map_title="Traj",
@@ -264,62 +594,26 @@ def create_traj_map(
     weather=None,
     contra=None,
     save=None,
+    lod=False,
 ):
+    import matplotlib.pyplot as plt
+
+    from tile_tools import add_basemap
+
     map_path = Path("./maps")
     if not map_path.exists():
         map_path.mkdir()
-    traj = traj.copy()
-    traj.set_index("t", inplace=True)
-    if start:
-        traj = traj[start:]
-    if stop:
-        traj = traj[:stop]
-    aoi_bounds = traj.geometry.total_bounds
-    xlim = [aoi_bounds[0] - 0.0025, aoi_bounds[2] + 0.0025]
-    ylim = [aoi_bounds[1] - 0.0025, aoi_bounds[3] + 0.0025]
+    traj = traj.set_index("t")
+    if weather is not None:
+        weather = _index_weather(weather)
+    traj, weather = _traj_window(traj, weather, start, stop)
 
     f, ax = plt.subplots(figsize=(15, 20))
-    ax.set_xlim(xlim)
-    ax.set_ylim(ylim)
-    traj.plot(
-        attribute,
-        linewidth=3,
-        legend=True,
-        legend_kwds={"shrink": 0.3},
-        ax=ax,
-        cmap="Reds",
-    )
-    if weather is not None:
-        weather = weather.copy()
-        weather.set_index("time", inplace=True)
-        weather.index = weather.index.tz_localize(None)
-        if start:
-            weather = weather[start:]
-        if stop:
-            weather = weather[:stop]
-        ax.barbs(
-            weather["lon"],
-            weather["lat"],
-            weather["wind_speed"]
-            * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(cos),
-            weather["wind_speed"]
-            * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(sin),
-        )
-    ctx.add_basemap(ax, crs=traj.crs, source=ctx.providers.OpenStreetMap.get("Mapnik"))
+    _draw_traj(ax, traj, attribute, weather, lod)
+    add_basemap(ax, crs=traj.crs)
     plt.title(map_title, fontdict={"size": 18})
     if contra is not None:
-        traj["tack.x"] = traj.apply(
-            lambda x: [y for y in x.geometry.coords][0][0], axis=1
-        )
-        traj["tack.y"] = traj.apply(
-            lambda x: [y for y in x.geometry.coords][0][1], axis=1
-        )
-        col = np.where(
-            traj.angular_difference < 30,
-            "r",
-            np.where(traj.angular_difference > 100, "b", "r"),
-        )
-        ax.scatter(traj["tack.x"], traj["tack.y"], color=col)
+        _draw_contra(ax, traj)
 
     if save is not None:
         plt.savefig(
@@ -327,3 +621,99 @@ def create_traj_map(
             dpi="figure",
             format="png",
         )
+
+
+_renderer = {}
+
+
+def _init_renderer(traj, weather, basemaps, attribution):
+    _renderer.update(
+        traj=traj, weather=weather, basemaps=basemaps, attribution=attribution
+    )
+
+
+def _render_window(window, contra=None, map_path=Path("./maps"), lod=False):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from tile_tools import basemap_zoom, crop_image, draw_basemap
+
+    title, start, stop, attribute = window
+    if "figure" not in _renderer:
+        # one figure per worker, cleared between windows
+        _renderer["figure"] = Figure(figsize=(15, 20))
+        FigureCanvasAgg(_renderer["figure"])
+    figure = _renderer["figure"]
+    figure.clf()
+    ax = figure.add_subplot()
+    traj, weather = _traj_window(_renderer["traj"], _renderer["weather"], start, stop)
+    _draw_traj(ax, traj, attribute, weather, lod)
+    bounds = _window_bounds(traj)
+    image, extent = _renderer["basemaps"][basemap_zoom(bounds, traj.crs)]
+    draw_basemap(ax, *crop_image(image, extent, bounds), _renderer["attribution"])
+    ax.set_title(title, fontdict={"size": 18})
+    if contra is not None:
+        _draw_contra(ax, traj)
+    fname = f"{map_path}/{attribute}_{title}.png"
+    figure.savefig(fname=fname, dpi="figure", format="png")
+    return fname
+
+
+def render_traj_maps(traj, windows, weather=None, contra=None, workers=None, lod=False):
+    """
+    Save a map of each (title, start, stop, attribute) window of a trajectory,
+    like `create_traj_map(..., save=True)` does for one. The trajectory and
+    weather are indexed once, the basemap is built once per zoom level for the
+    extent of all its windows and cropped for each of them, and windows are
+    rendered in parallel by `workers` processes. With `lod`, zoomed out windows
+    draw the trajectory simplified to the map resolution (the `contra` points
+    are always drawn from every segment). Returns the saved files.
+    """
+    from tile_tools import basemap_image, basemap_zoom, tile_store
+
+    map_path = Path("./maps")
+    map_path.mkdir(exist_ok=True)
+    traj = traj.set_index("t").sort_index()
+    if weather is not None:
+        weather = _index_weather(weather).sort_index()
+
+    # windows drawn at the same zoom level share a basemap
+    extents = {}
+    for _, start, stop, _ in windows:
+        bounds = _window_bounds(_traj_window(traj, None, start, stop)[0])
+        zoom = basemap_zoom(bounds, traj.crs)
+        xmin, ymin, xmax, ymax = extents.get(zoom, bounds)
+        extents[zoom] = (
+            min(xmin, bounds[0]),
+            min(ymin, bounds[1]),
+            max(xmax, bounds[2]),
+            max(ymax, bounds[3]),
+        )
+    store = tile_store()
+    basemaps = {
+        zoom: basemap_image(bounds, traj.crs, store, zoom=zoom)
+        for zoom, bounds in extents.items()
+    }
+    attribution = store.provider.get("attribution")
+
+    workers = min(workers or os.cpu_count(), len(windows))
+    if workers <= 1:
+        _init_renderer(traj, weather, basemaps, attribution)
+        try:
+            return [_render_window(window, contra, map_path, lod) for window in windows]
+        finally:
+            _renderer.clear()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_renderer,
+        initargs=(traj, weather, basemaps, attribution),
+    ) as executor:
+        return list(
+            executor.map(
+                _render_window,
+                windows,
+                [contra] * len(windows),
+                [map_path] * len(windows),
+                [lod] * len(windows),
+            )
+        )
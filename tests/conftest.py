@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+
+SAMPLE_GPX = Path(__file__).parent.parent / "data" / "SailingTrack.gpx"
+
+
+@pytest.fixture(scope="session")
+def track_points():
+    """
+    Track points of data/SailingTrack.gpx, as export_gpx reads them.
+    """
+    from db_tools import LOCAL_TZ
+    from gpx_tools import gpx_to_geodataframe, read_gpx
+
+    track_df = gpx_to_geodataframe(read_gpx(SAMPLE_GPX), tz=LOCAL_TZ)
+    track_df["track_id"] = "sample-track"
+    return track_df
+
+
+@pytest.fixture(scope="session")
+def trajectory(track_points):
+    """
+    Trajectory segments of data/SailingTrack.gpx.
+    """
+    from metrics_tools import to_line_gdf
+
+    return to_line_gdf(track_points)
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from compact_tools import from_compact, to_compact
+from metrics_tools import LINE_COLUMNS
+
+
+def test_round_trip(track_points, trajectory):
+    compact = to_compact(track_points, trajectory)
+    assert compact.points.sum() == len(track_points)
+    points, lines = from_compact(compact)
+
+    expected = track_points[points.columns]
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(points.drop(columns="geometry")),
+        pd.DataFrame(expected.drop(columns="geometry")),
+        # times come back in microseconds, the M precision
+        check_dtype=False,
+    )
+    assert points.geometry.geom_equals_exact(expected.geometry, 0).all()
+
+    expected = trajectory[LINE_COLUMNS].reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(lines.drop(columns="geometry")),
+        pd.DataFrame(expected.drop(columns="geometry")),
+        # times come back in microseconds, the M precision
+        check_dtype=False,
+    )
+    assert lines.geometry.geom_equals_exact(expected.geometry, 0).all()
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+from db_tools import LOCAL_TZ, load_track, time_bound, track_query
+from models import SailingTrackLine, SailingTrackPoints
+
+UTC_START = datetime(2023, 4, 23, 10, 0, 1, tzinfo=timezone.utc)
+UTC_STOP = datetime(2023, 4, 23, 10, 0, 3, tzinfo=timezone.utc)
+TRACK_ID = "abc"
+
+
+def test_aware_bounds_follow_the_table_convention():
+    _, points = track_query(SailingTrackPoints, start=UTC_START, stop=UTC_STOP)
+    _, lines = track_query(SailingTrackLine, start=UTC_START, stop=UTC_STOP)
+    # points are naive UTC, segments naive local time
+    assert points["start"] == datetime(2023, 4, 23, 10, 0, 1)
+    assert lines["start"] == datetime(2023, 4, 23, 7, 0, 1)
+    assert lines["stop"] == datetime(2023, 4, 23, 7, 0, 3)
+
+
+def test_naive_bounds_are_kept():
+    naive = datetime(2023, 4, 23, 7)
+    assert time_bound(naive, SailingTrackPoints) == pd.Timestamp(naive)
+    assert time_bound(naive, SailingTrackLine) == pd.Timestamp(naive)
+
+
+@pytest.fixture
+def gpkg_path(tmp_path):
+    # a layer per track as export_gpx saves them: tz-aware local point times and
+    # naive local segment times, whole and fractional seconds
+    path = tmp_path / "SailingAnalysis.gpkg"
+    time = pd.date_range("2023-04-23 07:00", periods=10, freq="500ms")
+    geometry = shapely.points(range(10), range(10))
+    gpd.GeoDataFrame(
+        {"time": time.tz_localize(LOCAL_TZ), "track_id": TRACK_ID},
+        geometry=geometry,
+        crs=4326,
+    ).to_file(path, layer=f"2023-04-23_{TRACK_ID}_track_points", driver="GPKG")
+    gpd.GeoDataFrame(
+        {"t": time, "track_id": TRACK_ID}, geometry=geometry, crs=4326
+    ).to_file(path, layer=f"2023-04-23_{TRACK_ID}_trajectory", driver="GPKG")
+    return path
+
+
+@pytest.mark.parametrize("model", [SailingTrackPoints, SailingTrackLine])
+def test_gpkg_layer_window(gpkg_path, model):
+    def rows(start, stop):
+        return len(
+            load_track(
+                TRACK_ID,
+                model,
+                post_gis=False,
+                gpkg_path=gpkg_path,
+                start=start,
+                stop=stop,
+            )
+        )
+
+    # 07:00:01, 07:00:01.5, 07:00:02 and 07:00:02.5 local
+    assert rows(UTC_START, UTC_STOP) == 4
+    local = timezone(timedelta(hours=-3))
+    assert rows(UTC_START.astimezone(local), UTC_STOP.astimezone(local)) == 4
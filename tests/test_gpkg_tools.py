@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from db_tools import LOCAL_TZ
+from gpkg_tools import append_gpkg, read_gpkg
+from models import SailingTrackLine, SailingTrackPoints
+
+
+@pytest.fixture
+def gpkg_path(tmp_path, track_points, trajectory):
+    path = tmp_path / "SailingAnalysis.gpkg"
+    append_gpkg(track_points, SailingTrackPoints, path)
+    append_gpkg(trajectory, SailingTrackLine, path)
+    return path
+
+
+def _window(trajectory):
+    # ten minutes from the middle of the track, tz-aware in UTC
+    start = trajectory.t.iloc[len(trajectory) // 2]
+    start = pd.Timestamp(start).tz_localize(LOCAL_TZ).tz_convert("UTC")
+    return start, start + timedelta(minutes=10)
+
+
+def test_line_table_aware_window(gpkg_path, trajectory):
+    start, stop = _window(trajectory)
+    local = trajectory.t.dt.tz_localize(LOCAL_TZ)
+    expected = ((local >= start) & (local < stop)).sum()
+    assert expected > 0
+    lines = read_gpkg(SailingTrackLine, start=start, stop=stop, gpkg_path=gpkg_path)
+    assert len(lines) == expected
+
+
+def test_point_and_line_tables_agree(gpkg_path, trajectory):
+    start, stop = _window(trajectory)
+    points = read_gpkg(SailingTrackPoints, start=start, stop=stop, gpkg_path=gpkg_path)
+    lines = read_gpkg(SailingTrackLine, start=start, stop=stop, gpkg_path=gpkg_path)
+    # every segment ends on a point of the window
+    assert len(points) == len(lines)
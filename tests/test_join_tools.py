@@ -0,0 +1,105 @@
+from datetime import timedelta, timezone
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from join_tools import join_weather
+from metrics_tools import haversine_distance
+
+START = pd.Timestamp("2023-04-23 10:00")
+
+
+def _traj(x, y, t):
+    return gpd.GeoDataFrame(
+        {"track_id": "a", "t": pd.DatetimeIndex(t)},
+        geometry=shapely.points(x, y),
+        crs=4326,
+    )
+
+
+def _weather(rows):
+    return pd.DataFrame(
+        rows, columns=["lat", "lon", "time", "temp", "wind_speed", "wind_deg"]
+    )
+
+
+def test_wind_direction_wraps_around_north():
+    weather = _weather(
+        [
+            (-34.0, -58.0, START, 20.0, 5.0, 350.0),
+            (-34.0, -58.0, START + timedelta(hours=1), 20.0, 5.0, 10.0),
+        ]
+    )
+    joined = join_weather(
+        _traj([-58.0], [-34.0], [START + timedelta(minutes=30)]), weather
+    )
+    assert (joined.wind_deg.iloc[0] + 180) % 360 - 180 == pytest.approx(0.0)
+    assert joined.wind_speed.iloc[0] == pytest.approx(5.0)
+    # and between two sites as far from the segment
+    weather = _weather(
+        [
+            (-34.0, -58.1, START, 20.0, 5.0, 350.0),
+            (-34.0, -57.9, START, 20.0, 5.0, 10.0),
+        ]
+    )
+    joined = join_weather(_traj([-58.0], [-34.0], [START]), weather)
+    assert (joined.wind_deg.iloc[0] + 180) % 360 - 180 == pytest.approx(0.0, abs=1e-6)
+
+
+def test_inverse_distance_weights():
+    # two sites, the segment three times closer to the first one
+    weather = _weather(
+        [
+            (-34.0, -58.0, START, 10.0, 2.0, 90.0),
+            (-34.0, -57.6, START, 30.0, 6.0, 90.0),
+        ]
+    )
+    x, y = -57.9, -34.0
+    joined = join_weather(_traj([x], [y], [START]), weather, power=2)
+    near = 1 / haversine_distance(x, y, -58.0, -34.0) ** 2
+    far = 1 / haversine_distance(x, y, -57.6, -34.0) ** 2
+    expected = (near * 10.0 + far * 30.0) / (near + far)
+    assert joined.temp.iloc[0] == pytest.approx(expected)
+    assert joined.wind_speed.iloc[0] == pytest.approx(
+        (near * 2 + far * 6) / (near + far)
+    )
+    assert joined.wind_deg.iloc[0] == pytest.approx(90.0)
+    # only the nearest site with max_sites=1
+    joined = join_weather(_traj([x], [y], [START]), weather, max_sites=1)
+    assert joined.temp.iloc[0] == pytest.approx(10.0)
+
+
+def test_linear_time_interpolation():
+    weather = _weather(
+        [
+            (-34.0, -58.0, START, 10.0, 2.0, 0.0),
+            (-34.0, -58.0, START + timedelta(hours=1), 22.0, 8.0, 90.0),
+        ]
+    )
+    times = [START + timedelta(minutes=m) for m in (0, 15, 60)]
+    joined = join_weather(_traj([-58.0] * 3, [-34.0] * 3, times), weather)
+    assert joined.temp.tolist() == pytest.approx([10.0, 13.0, 22.0])
+    assert joined.wind_speed.tolist() == pytest.approx([2.0, 3.5, 8.0])
+    # directions are interpolated on the circle
+    assert joined.wind_deg.tolist() == pytest.approx(
+        [0.0, np.degrees(np.arctan2(0.25, 0.75)), 90.0]
+    )
+
+
+def test_time_zones_and_gaps():
+    weather = _weather([(-34.0, -58.0, START, 10.0, 2.0, 0.0)])
+    # naive local trajectory times against naive UTC weather times
+    local = timezone(timedelta(hours=-3))
+    joined = join_weather(
+        _traj([-58.0] * 2, [-34.0] * 2, [START - timedelta(hours=3), START]),
+        weather,
+        traj_tz=local,
+        max_gap=timedelta(hours=2),
+    )
+    assert joined.temp.iloc[0] == pytest.approx(10.0)
+    # three hours away from the only weather row
+    assert np.isnan(joined.temp.iloc[1])
+    assert np.isnan(joined.wind_deg.iloc[1])
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from maneuver_tools import (
+    ENTER_TURN,
+    EXIT_TURN,
+    MAX_DURATION,
+    MIN_HEADING_CHANGE,
+    MIN_STEADY,
+    PRE_WINDOW,
+    _segment_arrays,
+    detect_maneuvers,
+    iter_maneuvers,
+)
+
+
+def _loop_maneuvers(traj):
+    # one segment at a time, as a reference for the array operations
+    arrays = _segment_arrays(traj)
+    t, prev_t = arrays["t"], arrays["prev_t"]
+    direction, speed = arrays["direction"], arrays["speed"]
+    runs, turning = [], False
+    for i in range(1, len(t)):
+        turn = (direction[i] - direction[i - 1] + 180) % 360 - 180
+        if abs(turn) >= ENTER_TURN:
+            if not turning:
+                runs.append([i, i, 0.0])
+            turning = True
+        elif abs(turn) < EXIT_TURN:
+            turning = False
+        if turning:
+            runs[-1][1] = i
+            runs[-1][2] += turn
+
+    merged = []
+    for run in runs:
+        if merged and prev_t[run[0]] - t[merged[-1][1]] < MIN_STEADY:
+            merged[-1][1] = run[1]
+            merged[-1][2] += run[2]
+        else:
+            merged.append(run)
+
+    events = []
+    for start, end, change in merged:
+        entry, exit = prev_t[start], t[end]
+        if (
+            abs(change) < MIN_HEADING_CHANGE
+            or exit - entry > MAX_DURATION
+            or entry - prev_t[0] < MIN_STEADY
+            or t[-1] - exit < MIN_STEADY
+        ):
+            continue
+        before = [speed[i] for i in range(start) if t[i] > entry - PRE_WINDOW]
+        events.append(
+            {
+                "entry_time": entry,
+                "exit_time": exit,
+                "heading_change": change,
+                "entry_speed": np.mean(before) if before else np.nan,
+                "min_speed": speed[start : end + 1].min(),
+            }
+        )
+    return pd.DataFrame(events)
+
+
+def _seconds(time):
+    return (time - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+
+
+@pytest.fixture(params=[None, 135.0])
+def joined(request, trajectory):
+    # without wind every maneuver is a turn, a wind makes tacks of some
+    if request.param is None:
+        return trajectory
+    return trajectory.assign(wind_deg=request.param)
+
+
+def test_matches_loop(joined):
+    maneuvers = detect_maneuvers(joined)
+    expected = _loop_maneuvers(joined)
+    assert len(maneuvers) == len(expected) > 0
+    for name in ("entry_time", "exit_time"):
+        np.testing.assert_allclose(_seconds(maneuvers[name]), expected[name], atol=1e-3)
+    for name in ("heading_change", "entry_speed", "min_speed"):
+        np.testing.assert_allclose(maneuvers[name], expected[name], rtol=1e-9)
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 100, 1000])
+def test_streaming_matches_batch(joined, chunk_rows):
+    maneuvers = detect_maneuvers(joined)
+    chunks = (
+        joined.iloc[first : first + chunk_rows]
+        for first in range(0, len(joined), chunk_rows)
+    )
+    streamed = pd.concat(iter_maneuvers(chunks), ignore_index=True)
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(streamed.drop(columns="geometry")),
+        pd.DataFrame(maneuvers.drop(columns="geometry")),
+    )
+    assert streamed.geometry.geom_equals(maneuvers.geometry).all()
@@ -0,0 +1,54 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from metrics_tools import METRIC_COLUMNS, compute_metrics, to_line_gdf
+
+
+@pytest.fixture(scope="module")
+def moving_trajectory(track_points):
+    # the metrics export_gpx computed with movingpandas before to_line_gdf
+    # movingpandas warns about its optional dependencies and about dropping the
+    # time zone, keeping the local wall time like to_line_gdf
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        mpd = pytest.importorskip("movingpandas")
+        trajectory = mpd.Trajectory(
+            df=track_points.copy(), traj_id="track_seg_point_id", t="time"
+        )
+    trajectory.add_acceleration(overwrite=True)
+    trajectory.add_angular_difference(overwrite=True)
+    trajectory.add_direction(overwrite=True)
+    trajectory.add_distance(overwrite=True)
+    trajectory.add_speed(overwrite=True)
+    trajectory.add_timedelta(overwrite=True)
+    trajectory.df.timedelta = trajectory.df.timedelta.dt.total_seconds()
+    return trajectory
+
+
+def test_point_metrics_match_movingpandas(track_points, moving_trajectory):
+    metrics = compute_metrics(
+        track_points.geometry.x, track_points.geometry.y, track_points.time
+    )
+    for name in METRIC_COLUMNS:
+        np.testing.assert_allclose(
+            metrics[name],
+            moving_trajectory.df[name].to_numpy(dtype=float),
+            rtol=0,
+            atol=1e-8,
+            err_msg=name,
+        )
+
+
+def test_segments_match_movingpandas(track_points, moving_trajectory):
+    lines = to_line_gdf(track_points)
+    expected = moving_trajectory.to_line_gdf()
+    assert len(lines) == len(expected)
+    assert (lines.t.to_numpy() == expected.t.to_numpy()).all()
+    assert (lines.prev_t.to_numpy() == expected.prev_t.to_numpy()).all()
+    for name in ("speed", "direction", "distance"):
+        np.testing.assert_allclose(
+            lines[name], expected[name], rtol=0, atol=1e-8, err_msg=name
+        )
+    assert lines.geometry.geom_equals_exact(expected.geometry, 0).all()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from owm_tools import fetch_owm_data, read_done_queries, read_owm_jsonl, retry_delay
+from weather_cache import WeatherCache
+
+QUERIES = [
+    {"lat": -34.55, "lon": -58.45, "dt": 1682244000},
+    {"lat": -34.95, "lon": -58.05, "dt": 1682251200},
+]
+
+
+def _answer(request):
+    return {
+        "lat": float(request.query["lat"]),
+        "lon": float(request.query["lon"]),
+        "current": {
+            "dt": int(request.query["dt"]),
+            "temp": 18.5,
+            "pressure": 1015,
+            "humidity": 70,
+            "wind_speed": 5.1,
+            "wind_deg": 120,
+        },
+    }
+
+
+def _timemachine(calls):
+    async def handler(request):
+        calls.append(dict(request.query))
+        # the first call is rate limited
+        if len(calls) == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        return web.json_response(_answer(request))
+
+    return handler
+
+
+def _fetch(calls, queries, jsonl_path, cache_path):
+    async def run():
+        app = web.Application()
+        app.router.add_get("/timemachine", _timemachine(calls))
+        async with TestServer(app) as server:
+            return await fetch_owm_data(
+                queries,
+                jsonl_path,
+                api_key="test",
+                calls_per_minute=6000,
+                base_url=str(server.make_url("/timemachine")),
+                max_retries=2,
+                cache=WeatherCache(cache_path),
+            )
+
+    return asyncio.run(run())
+
+
+def test_retry_after_seconds_and_http_date():
+    assert retry_delay("3", attempt=0) == 3.0
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < retry_delay(format_datetime(later, usegmt=True), attempt=0) <= 30
+    assert retry_delay("Wed, 21 Oct 2015 07:28:00 GMT", attempt=0) == 0.0
+    assert 1 <= retry_delay("soon", attempt=0) < 2
+
+
+def test_fetch_retries_429_and_resumes(tmp_path):
+    calls = []
+    jsonl_path = tmp_path / "owm.jsonl"
+    assert _fetch(calls, QUERIES, jsonl_path, tmp_path / "cache.sqlite") == 0
+    # two calls and the retry of the rate limited one
+    assert len(calls) == 3
+    assert len(read_owm_jsonl(jsonl_path)) == 2
+
+    # a new cache, so the second run is only skipped by the JSONL file
+    assert _fetch(calls, QUERIES, jsonl_path, tmp_path / "cache2.sqlite") == 0
+    assert len(calls) == 3
+    assert len(read_owm_jsonl(jsonl_path)) == 2
+
+
+def test_resume_from_lines_without_query(tmp_path):
+    jsonl_path = tmp_path / "owm.jsonl"
+    with open(jsonl_path, "w") as lines:
+        lines.write(
+            json.dumps({"lat": -34.55, "lon": -58.45, "current": {"dt": 1682244000}})
+        )
+        lines.write("\n")
+        lines.write(json.dumps({"cod": 429, "message": "limit"}) + "\n")
+    assert read_done_queries(jsonl_path) == {"-34.550000,-58.450000,1682244000"}
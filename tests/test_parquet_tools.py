@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from db_tools import LOCAL_TZ
+from models import SailingTrackLine, SailingTrackPoints
+from parquet_tools import append_archive, archived_tracks, read_archive
+
+
+@pytest.fixture
+def archive_dir(tmp_path, track_points, trajectory):
+    append_archive(track_points, SailingTrackPoints, tmp_path)
+    append_archive(trajectory, SailingTrackLine, tmp_path)
+    return tmp_path
+
+
+def _window(trajectory):
+    # ten minutes from the middle of the track, tz-aware in UTC
+    start = trajectory.t.iloc[len(trajectory) // 2]
+    start = pd.Timestamp(start).tz_localize(LOCAL_TZ).tz_convert("UTC")
+    return start, start + timedelta(minutes=10)
+
+
+def test_round_trip(archive_dir, trajectory):
+    assert archived_tracks(SailingTrackLine, archive_dir) == ["sample-track"]
+    lines = read_archive(SailingTrackLine, ["sample-track"], archive_dir=archive_dir)
+    assert len(lines) == len(trajectory)
+    assert lines.t.tolist() == trajectory.t.tolist()
+    assert lines.geometry.geom_equals_exact(trajectory.geometry, 1e-12).all()
+
+
+def test_line_table_aware_window(archive_dir, trajectory):
+    start, stop = _window(trajectory)
+    local = trajectory.t.dt.tz_localize(LOCAL_TZ)
+    expected = ((local >= start) & (local < stop)).sum()
+    assert expected > 0
+    lines = read_archive(
+        SailingTrackLine, start=start, stop=stop, archive_dir=archive_dir
+    )
+    assert len(lines) == expected
+
+
+def test_point_and_line_tables_agree(archive_dir, trajectory):
+    start, stop = _window(trajectory)
+    points = read_archive(
+        SailingTrackPoints, start=start, stop=stop, archive_dir=archive_dir
+    )
+    lines = read_archive(
+        SailingTrackLine, start=start, stop=stop, archive_dir=archive_dir
+    )
+    assert len(points) == len(lines)
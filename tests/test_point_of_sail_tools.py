@@ -0,0 +1,79 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from point_of_sail_tools import classify, point_of_sail_segments
+
+
+def _lines(directions, track_ids=None, wind_deg=0.0, seconds=10.0):
+    # one segment east every `seconds`, on the given courses
+    n = len(directions)
+    t = pd.Timestamp("2023-04-23 07:00") + pd.to_timedelta(
+        np.arange(1, n + 1) * seconds, unit="s"
+    )
+    x = np.arange(n + 1) * 1e-4
+    return gpd.GeoDataFrame(
+        {
+            "track_id": track_ids or ["a"] * n,
+            "direction": np.asarray(directions, dtype=float),
+            "wind_deg": wind_deg,
+            "timedelta": seconds,
+            "distance": 10.0,
+            "t": t,
+            "prev_t": t - pd.Timedelta(seconds=seconds),
+        },
+        geometry=shapely.linestrings(
+            np.stack([np.c_[x[:-1], np.zeros(n)], np.c_[x[1:], np.zeros(n)]], axis=1)
+        ),
+        crs=4326,
+    )
+
+
+def test_classify():
+    label, board = classify([30.0, -60.0, 100.0, -120.0, 170.0, np.nan])
+    assert label.tolist() == [0, 1, 2, 3, 4, 5]
+    assert board.tolist() == [0, 1, 0, 1, 0, 2]
+
+
+def test_runs():
+    # wind from the north: upwind on port, beam reach on starboard, downwind
+    lines = _lines([60.0] * 3 + [270.0] * 4 + [180.0] * 2)
+    segments = point_of_sail_segments(lines, min_duration=0)
+    assert segments.point_of_sail.tolist() == ["upwind", "beam_reach", "downwind"]
+    assert segments.board.tolist() == ["port", "starboard", "port"]
+    assert segments.segments.tolist() == [3, 4, 2]
+    assert segments.duration.tolist() == [30.0, 40.0, 20.0]
+    assert segments.start_time.tolist() == lines.prev_t.iloc[[0, 3, 7]].tolist()
+    assert segments.end_time.tolist() == lines.t.iloc[[2, 6, 8]].tolist()
+    assert segments.mean_twa.tolist() == [60.0, 90.0, 180.0]
+    assert segments.mean_speed.tolist() == [1.0, 1.0, 1.0]
+    # each run line starts where its first segment starts and ends at its last
+    assert [len(line.coords) for line in segments.geometry] == [4, 5, 3]
+    assert segments.geometry.iloc[1].coords[0] == lines.geometry.iloc[3].coords[0]
+
+
+def test_short_runs_take_the_run_before():
+    lines = _lines([60.0] * 3 + [100.0] + [60.0] * 3, seconds=10.0)
+    segments = point_of_sail_segments(lines, min_duration=20.0)
+    assert segments.point_of_sail.tolist() == ["upwind"]
+    assert segments.segments.tolist() == [7]
+    # a short run at the start takes the run after it
+    lines = _lines([100.0] + [60.0] * 3, seconds=10.0)
+    segments = point_of_sail_segments(lines, min_duration=20.0)
+    assert segments.point_of_sail.tolist() == ["upwind"]
+
+
+def test_runs_stop_at_tracks():
+    lines = _lines([60.0] * 4, track_ids=["a", "a", "b", "b"])
+    segments = point_of_sail_segments(lines)
+    assert segments.track_id.tolist() == ["a", "b"]
+    assert segments.segments.tolist() == [2, 2]
+
+
+def test_unknown_wind():
+    lines = _lines([60.0] * 3, wind_deg=np.nan)
+    segments = point_of_sail_segments(lines)
+    assert segments.point_of_sail.tolist() == ["unknown"]
+    assert segments.board.tolist() == ["unknown"]
+    assert np.isnan(segments.mean_twa.iloc[0])
@@ -0,0 +1,41 @@
+import mercantile
+
+import tile_tools
+from tile_tools import TileStore
+
+TILES = [mercantile.Tile(x, 0, 2) for x in range(4)]
+
+
+def _accessed_at(store):
+    return dict(
+        store._connection.execute(
+            "SELECT tile_column, accessed_at FROM tiles ORDER BY tile_column"
+        ).fetchall()
+    )
+
+
+def test_hits_are_touched_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(tile_tools, "TOUCH_BATCH", 3)
+    store = TileStore(tmp_path / "tiles.mbtiles")
+    for tile in TILES:
+        store.put(tile, b"png")
+    saved = _accessed_at(store)
+
+    assert store.get(TILES[0]) == b"png"
+    assert store.get(TILES[1]) == b"png"
+    assert _accessed_at(store) == saved
+    assert store.get(TILES[2]) == b"png"
+    touched = _accessed_at(store)
+    assert [touched[x] > saved[x] for x in range(4)] == [True, True, True, False]
+    assert store.get(mercantile.Tile(0, 0, 3)) is None
+    assert store.stats()["hits"] == 3
+
+
+def test_eviction_sees_pending_hits(tmp_path):
+    store = TileStore(tmp_path / "tiles.mbtiles", max_bytes=30)
+    for tile in TILES[:3]:
+        store.put(tile, b"x" * 10)
+    # the oldest tile was read last, so the second one is evicted
+    store.get(TILES[0])
+    store.put(TILES[3], b"x" * 10)
+    assert [store.has(tile) for tile in TILES] == [True, False, False, True]
@@ -0,0 +1,91 @@
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from db_tools import LOCAL_TZ, explain_track_query, time_column, used_indexes
+from models import SailingTrackLine, SailingTrackPoints, Weather, get_engine
+
+needs_db = pytest.mark.skipif(
+    not os.getenv("DB_URL"), reason="needs a migrated PostGIS database on DB_URL"
+)
+
+BBOX = (-56.0, -27.4, -55.9, -27.3)
+# tz-aware, so each table is queried in its own convention: naive UTC for the
+# points, naive local time for the segments
+START = datetime(2023, 4, 23, 10, 5, tzinfo=LOCAL_TZ)
+STOP = datetime(2023, 4, 23, 12, 55, tzinfo=LOCAL_TZ)
+TRACK_ID = "8c1c8a5e-2b0f-5d3e-9a6e-0f4e5c3b2a10"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = get_engine()
+
+    # the test tables are small enough for a sequential scan to win, so plans
+    # are only checked for being able to use the indexes
+    def disable_seqscan(dbapi_connection, connection_record):
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+
+    event.listen(engine, "connect", disable_seqscan)
+    engine.dispose()
+    yield engine
+    event.remove(engine, "connect", disable_seqscan)
+    engine.dispose()
+
+
+@pytest.fixture(params=["point", "line"])
+def model(request):
+    return {"point": SailingTrackPoints, "line": SailingTrackLine}[request.param]
+
+
+def _indexes(model, **filters):
+    return used_indexes(explain_track_query(model, **filters))
+
+
+def _methods(model):
+    return {
+        index.name: index.dialect_options["postgresql"].get("using") or "btree"
+        for index in model.__table__.indexes
+    }
+
+
+def test_model_indexes(model):
+    table, time = model.__tablename__, time_column(model)
+    assert _methods(model) == {
+        f"ix_{table}_track_id_{time}": "btree",
+        f"idx_{table}_geometry": "gist",
+        f"brin_{table}_{time}": "brin",
+    }
+
+
+def test_weather_is_read_through_the_station_time_btree():
+    # weather rows are not saved in time order, which BRIN needs
+    assert _methods(Weather) == {}
+    (unique,) = [
+        constraint
+        for constraint in Weather.__table__.constraints
+        if constraint.name == "uq_weather_station_time"
+    ]
+    assert [column.name for column in unique.columns] == ["station", "time"]
+
+
+@needs_db
+def test_track_id_uses_btree(engine, model):
+    table, time = model.__tablename__, time_column(model)
+    indexes = _indexes(model, track_id=TRACK_ID, start=START, stop=STOP)
+    assert f"ix_{table}_track_id_{time}" in indexes
+
+
+@needs_db
+def test_bbox_uses_gist(engine, model):
+    indexes = _indexes(model, bbox=BBOX)
+    assert f"idx_{model.__tablename__}_geometry" in indexes
+
+
+@needs_db
+def test_time_window_uses_brin(engine, model):
+    indexes = _indexes(model, start=START, stop=STOP)
+    assert f"brin_{model.__tablename__}_{time_column(model)}" in indexes
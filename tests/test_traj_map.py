@@ -0,0 +1,105 @@
+from math import cos, radians, sin
+
+import numpy as np
+import pandas as pd
+import pytest
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import tile_tools
+from db_tools import LOCAL_TZ
+from spatial_tools import create_traj_map
+
+
+def _fake_basemap(ax, crs, **kwargs):
+    # an opaque gradient instead of the tiles, the same on every map
+    xmin, xmax, ymin, ymax = ax.axis()
+    image = np.linspace(0, 1, 64 * 64 * 3).reshape(64, 64, 3)
+    tile_tools.draw_basemap(ax, image, (xmin, xmax, ymin, ymax), "test")
+
+
+def _original_traj_map(traj, map_title, start, stop, attribute, weather, contra):
+    # create_traj_map before the tile store and the parallel renderer, with the
+    # basemap drawn by the same function
+    traj = traj.copy()
+    traj.set_index("t", inplace=True)
+    if start:
+        traj = traj[start:]
+    if stop:
+        traj = traj[:stop]
+    aoi_bounds = traj.geometry.total_bounds
+    xlim = [aoi_bounds[0] - 0.0025, aoi_bounds[2] + 0.0025]
+    ylim = [aoi_bounds[1] - 0.0025, aoi_bounds[3] + 0.0025]
+
+    f, ax = plt.subplots(figsize=(15, 20))
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    traj.plot(
+        attribute,
+        linewidth=3,
+        legend=True,
+        legend_kwds={"shrink": 0.3},
+        ax=ax,
+        cmap="Reds",
+    )
+    if weather is not None:
+        weather = weather.copy()
+        weather.set_index("time", inplace=True)
+        weather.index = weather.index.tz_localize(None)
+        if start:
+            weather = weather[start:]
+        if stop:
+            weather = weather[:stop]
+        ax.barbs(
+            weather["lon"],
+            weather["lat"],
+            weather["wind_speed"]
+            * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(cos),
+            weather["wind_speed"]
+            * (270 - weather["wind_deg"]).astype(float).apply(radians).apply(sin),
+        )
+    _fake_basemap(ax, crs=traj.crs)
+    plt.title(map_title, fontdict={"size": 18})
+    if contra is not None:
+        traj["tack.x"] = traj.apply(
+            lambda x: [y for y in x.geometry.coords][0][0], axis=1
+        )
+        traj["tack.y"] = traj.apply(
+            lambda x: [y for y in x.geometry.coords][0][1], axis=1
+        )
+        col = np.where(
+            traj.angular_difference < 30,
+            "r",
+            np.where(traj.angular_difference > 100, "b", "r"),
+        )
+        ax.scatter(traj["tack.x"], traj["tack.y"], color=col)
+    return f
+
+
+def test_same_pixels_as_the_original(tmp_path, monkeypatch, trajectory):
+    monkeypatch.setattr(tile_tools, "add_basemap", _fake_basemap)
+    monkeypatch.chdir(tmp_path)
+    start, stop = trajectory.t.iloc[100], trajectory.t.iloc[400]
+    middle = trajectory.geometry.iloc[250].centroid
+    weather = pd.DataFrame(
+        {
+            "time": pd.date_range(start, stop, periods=4).tz_localize(LOCAL_TZ),
+            "lat": middle.y,
+            "lon": middle.x,
+            "wind_speed": [4.0, 6.0, 8.0, 5.0],
+            "wind_deg": [350.0, 10.0, 90.0, 200.0],
+        }
+    )
+    arguments = ("Largada", start, stop, "speed", weather, True)
+
+    create_traj_map(trajectory, *arguments, save=True)
+    original = _original_traj_map(trajectory, *arguments)
+    original.savefig(tmp_path / "original.png", dpi="figure", format="png")
+    plt.close("all")
+
+    created = plt.imread(tmp_path / "maps" / "speed_Largada.png")
+    expected = plt.imread(tmp_path / "original.png")
+    assert created.shape == expected.shape
+    assert np.array_equal(created, expected)
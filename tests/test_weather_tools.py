@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import weather_tools
+from weather_cache import WeatherCache
+from weather_tools import StationIndex, fetch_hourly_bulk, get_nearby_weather_station
+
+STATIONS_FILE = Path(__file__).parent / "data" / "meteostat_stations.csv"
+BAIRES_TZ = timezone(timedelta(hours=-3))
+
+
+class FakeHourly:
+    """
+    meteostat Hourly answering every hour of every station but the `gaps`,
+    recording calls.
+    """
+
+    calls = []
+    gaps = set()
+
+    def __init__(self, stations, start, end):
+        self.stations = [stations] if isinstance(stations, str) else list(stations)
+        self.start, self.end = start, end
+        self.calls.append((tuple(self.stations), start, end))
+
+    def coverage(self):
+        return 1.0
+
+    def fetch(self):
+        times = pd.date_range(self.start, self.end, freq="h", name="time")
+        times = times[~times.isin(list(self.gaps))]
+        # meteostat drops the station level of a single station
+        if len(self.stations) == 1:
+            return pd.DataFrame({"temp": 20.0, "wspd": 18.0, "wdir": 90.0}, index=times)
+        return pd.concat(
+            {
+                station: pd.DataFrame(
+                    {"temp": 20.0, "wspd": 18.0, "wdir": 90.0}, index=times
+                )
+                for station in self.stations
+            },
+            names=["station", "time"],
+        )
+
+
+@pytest.fixture
+def index():
+    return StationIndex.from_file(STATIONS_FILE)
+
+
+@pytest.fixture
+def hourly(monkeypatch):
+    FakeHourly.calls = []
+    FakeHourly.gaps = set()
+    monkeypatch.setattr(weather_tools, "Hourly", FakeHourly)
+    return FakeHourly.calls
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return WeatherCache(tmp_path / "weather_cache.sqlite")
+
+
+def test_nearest_stations(index):
+    ids, distance = index.nearest([-34.55, -34.95], [-58.40, -57.95], k=2)
+    assert ids[:, 0].tolist() == ["87582", "87593"]
+    assert (distance[:, 0] < distance[:, 1]).all()
+    assert distance[0, 0] == pytest.approx(2_400, rel=0.1)
+
+
+def test_nearby_weather_station(index):
+    station = get_nearby_weather_station(-56.0, -34.85, index=index)
+    assert station.index.tolist() == ["86580"]
+    assert station.distance.iloc[0] < 5_000
+
+
+def test_tz_aware_and_naive_utc_requests_match(hourly, cache):
+    start = datetime(2023, 4, 23, 7, tzinfo=BAIRES_TZ)
+    aware = fetch_hourly_bulk([("87582", start, start + timedelta(hours=3))], cache)
+    naive = fetch_hourly_bulk(
+        [("87582", datetime(2023, 4, 23, 10), datetime(2023, 4, 23, 13))], cache
+    )
+    assert len(hourly) == 1
+    assert aware.index.equals(naive.index)
+    times = aware.index.get_level_values("time")
+    assert times[0] == pd.Timestamp("2023-04-23 10:00")
+    assert len(times) == 4
+
+
+def test_overlapping_missing_hours_share_a_request(hourly, cache):
+    day = datetime(2023, 4, 23)
+    weather = fetch_hourly_bulk(
+        [
+            ("87576", day + timedelta(hours=10), day + timedelta(hours=14)),
+            ("87582", day + timedelta(hours=12), day + timedelta(hours=18)),
+            ("87593", day + timedelta(hours=22), day + timedelta(hours=23)),
+        ],
+        cache,
+    )
+    assert [(stations, start.hour, end.hour) for stations, start, end in hourly] == [
+        (("87576", "87582"), 10, 18),
+        (("87593",), 22, 23),
+    ]
+    assert weather.groupby(level="station").size().to_dict() == {
+        "87576": 5,
+        "87582": 7,
+        "87593": 2,
+    }
+
+    # every hour is cached now
+    fetch_hourly_bulk(
+        [("87582", day + timedelta(hours=10), day + timedelta(hours=18))], cache
+    )
+    assert len(hourly) == 2
+
+
+def test_hours_without_data_are_not_requested_again(hourly, cache):
+    day = datetime(2023, 4, 23)
+    FakeHourly.gaps = {day + timedelta(hours=11), day + timedelta(hours=12)}
+    requests = [
+        ("87576", day + timedelta(hours=10), day + timedelta(hours=14)),
+        ("87582", day + timedelta(hours=12), day + timedelta(hours=13)),
+    ]
+    weather = fetch_hourly_bulk(requests, cache)
+    assert weather.groupby(level="station").size().to_dict() == {
+        "87576": 3,
+        "87582": 1,
+    }
+    assert fetch_hourly_bulk(requests, cache).equals(weather)
+    assert len(hourly) == 1
+
+
+def test_weather_from_dates_caches_gaps(hourly, cache):
+    day = datetime(2023, 4, 23)
+    FakeHourly.gaps = {day + timedelta(hours=11)}
+    start, end = day + timedelta(hours=10), day + timedelta(hours=13)
+    data = weather_tools.get_weather_from_dates(start, end, "87582", cache)
+    cached = weather_tools.get_weather_from_dates(start, end, "87582", cache)
+    assert len(hourly) == 1
+    assert cached.index.equals(data.index)
+    assert len(cached) == 3
+    assert cached.temp.tolist() == [20.0] * 3
+
+
+def test_only_overlapping_runs_share_a_request():
+    runs = [(10, 14, "a"), (15, 18, "b"), (16, 20, "c"), (0, 1000, "d")]
+    assert weather_tools._batch_runs(runs, max_hours=100) == [
+        [0, 1000, ["d"]],
+        [10, 14, ["a"]],
+        [15, 20, ["b", "c"]],
+    ]
+    # overlapping runs spanning more than max_hours are requested apart
+    assert weather_tools._batch_runs([(0, 50, "a"), (40, 150, "b")], 100) == [
+        [0, 50, ["a"]],
+        [40, 150, ["b"]],
+    ]
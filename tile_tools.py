@@ -0,0 +1,399 @@
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import contextily as ctx
+import mercantile
+import numpy as np
+import requests
+from dotenv import load_dotenv
+from PIL import Image
+from pyproj import Transformer
+
+load_dotenv()
+
+TILE_CACHE_DIR = Path("./data/tiles")
+# 500 MB of tiles per provider
+MAX_TILE_BYTES = 500 * 1024**2
+BASEMAP = ctx.providers.OpenStreetMap.get("Mapnik")
+# set TILES_OFFLINE=true to render maps only from cached tiles
+TILES_OFFLINE = os.getenv("TILES_OFFLINE", "false").lower() == "true"
+TILE_SIZE = 256
+# cache hits whose access time is written at once
+TOUCH_BATCH = 256
+
+
+class TileStore:
+    """
+    MBTiles (SQLite) store of the raw tiles of one provider, with least
+    recently used eviction above `max_bytes` and hit/miss counters. Access times
+    of cache hits are written in batches of `TOUCH_BATCH`, and before a put
+    evicts.
+    """
+
+    def __init__(self, path, provider=BASEMAP, max_bytes=MAX_TILE_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.provider = provider
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # access times of the hits not written yet, by (zoom, column, row)
+        self._touched = {}
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS tiles ("
+            "zoom_level INTEGER NOT NULL, tile_column INTEGER NOT NULL, "
+            "tile_row INTEGER NOT NULL, tile_data BLOB NOT NULL, "
+            "accessed_at REAL NOT NULL, "
+            "PRIMARY KEY (zoom_level, tile_column, tile_row))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_tiles_accessed_at ON tiles (accessed_at)"
+        )
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO metadata VALUES (?, ?)",
+            [
+                ("name", provider.name),
+                ("format", "png"),
+                ("type", "baselayer"),
+                ("attribution", provider.get("attribution", "")),
+            ],
+        )
+        self._connection.commit()
+        # running total of the tile bytes, so puts do not sum the whole table
+        (self._bytes,) = self._connection.execute(
+            "SELECT coalesce(sum(length(tile_data)), 0) FROM tiles"
+        ).fetchone()
+
+    @staticmethod
+    def _row(tile):
+        # MBTiles rows count from the south (TMS), XYZ tiles from the north
+        return (1 << tile.z) - 1 - tile.y
+
+    def get(self, tile):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND "
+                "tile_column = ? AND tile_row = ?",
+                (tile.z, tile.x, self._row(tile)),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[(tile.z, tile.x, self._row(tile))] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._write_touches()
+                self._connection.commit()
+            return row[0]
+
+    def _write_touches(self):
+        self._connection.executemany(
+            "UPDATE tiles SET accessed_at = ? WHERE zoom_level = ? AND "
+            "tile_column = ? AND tile_row = ?",
+            [(accessed_at, *key) for key, accessed_at in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def flush(self):
+        """
+        Write the access times of the cache hits not written yet.
+        """
+        with self._lock:
+            if self._touched:
+                self._write_touches()
+                self._connection.commit()
+
+    def has(self, tile):
+        with self._lock:
+            return (
+                self._connection.execute(
+                    "SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? "
+                    "AND tile_row = ?",
+                    (tile.z, tile.x, self._row(tile)),
+                ).fetchone()
+                is not None
+            )
+
+    def put(self, tile, data):
+        with self._lock:
+            replaced = self._connection.execute(
+                "SELECT length(tile_data) FROM tiles WHERE zoom_level = ? AND "
+                "tile_column = ? AND tile_row = ?",
+                (tile.z, tile.x, self._row(tile)),
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)",
+                (tile.z, tile.x, self._row(tile), data, time.time()),
+            )
+            self._bytes += len(data) - (replaced[0] if replaced else 0)
+            if self._bytes > self.max_bytes:
+                self._write_touches()
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        if self._bytes > self.max_bytes:
+            # free 10% more than needed so eviction does not run on every put
+            excess = self._bytes - int(self.max_bytes * 0.9)
+            rows = self._connection.execute(
+                "SELECT rowid, length(tile_data) FROM tiles ORDER BY accessed_at"
+            )
+            evicted, freed = [], 0
+            for rowid, length in rows:
+                if freed >= excess:
+                    break
+                evicted.append((rowid,))
+                freed += length
+            self._connection.executemany("DELETE FROM tiles WHERE rowid = ?", evicted)
+            self._bytes -= freed
+
+    def stats(self):
+        self.flush()
+        tiles, size = self._connection.execute(
+            "SELECT count(*), coalesce(sum(length(tile_data)), 0) FROM tiles"
+        ).fetchone()
+        requests_ = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests_ if requests_ else 0.0,
+            "tiles": tiles,
+            "bytes": size,
+        }
+
+
+_stores = {}
+
+
+def tile_store(provider=BASEMAP, cache_dir=TILE_CACHE_DIR):
+    """
+    Tile store of `provider` shared by the map functions, one MBTiles file
+    per provider on `cache_dir`.
+    """
+    path = Path(cache_dir) / f"{provider.name}.mbtiles"
+    if path not in _stores:
+        _stores[path] = TileStore(path, provider)
+    return _stores[path]
+
+
+def download_tile(provider, tile, timeout=30):
+    response = requests.get(
+        provider.build_url(x=tile.x, y=tile.y, z=tile.z),
+        headers={"user-agent": ctx.tile.USER_AGENT},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.content
+
+
+def _tile_array(data):
+    with Image.open(io.BytesIO(data)) as image:
+        return np.asarray(image.convert("RGBA"))
+
+
+def get_tile(tile, store, offline=TILES_OFFLINE):
+    """
+    RGBA array of a tile, downloaded and stored when it is not on `store`.
+    Offline, missing tiles are None.
+    """
+    data = store.get(tile)
+    if data is None:
+        if offline:
+            return None
+        data = download_tile(store.provider, tile)
+        store.put(tile, data)
+    return _tile_array(data)
+
+
+def prefetch_tiles(bounds, zooms, store=None, workers=2):
+    """
+    Download to the tile store every tile of the lon/lat `bounds` (west, south,
+    east, north) on each of `zooms` that is not there yet. Returns the number
+    of downloaded tiles.
+    """
+    store = store or tile_store()
+    tiles = [
+        tile for tile in mercantile.tiles(*bounds, list(zooms)) if not store.has(tile)
+    ]
+    logging.warning(f"Prefetching {len(tiles)} tiles of {store.provider.name}")
+
+    def fetch(tile):
+        store.put(tile, download_tile(store.provider, tile))
+
+    # tile servers ask for few concurrent connections (OSM: 2)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, tiles))
+    return len(tiles)
+
+
+def track_zooms(bounds, extra_levels=2, provider=BASEMAP):
+    """
+    Zoom levels up to `extra_levels` above the automatic zoom of the whole
+    track `bounds`, enough for maps of parts of the track.
+    """
+    zoom = auto_zoom(*bounds) + extra_levels
+    return range(
+        provider.get("min_zoom", 0), min(zoom, provider.get("max_zoom", 19)) + 1
+    )
+
+
+def prefetch_track(track, extra_levels=2, store=None, margin=0.0025):
+    """
+    Prefetch the basemap tiles of every zoom level used to map `track` (or any
+    part of it), so its maps can later be rendered offline.
+    """
+    store = store or tile_store()
+    west, south, east, north = track.to_crs(4326).total_bounds
+    bounds = (west - margin, south - margin, east + margin, north + margin)
+    return prefetch_tiles(
+        bounds, track_zooms(bounds, extra_levels, store.provider), store
+    )
+
+
+def auto_zoom(west, south, east, north):
+    """
+    Zoom level of about four tiles across the lon/lat bounds, the level
+    contextily picks by default.
+    """
+    zoom_lon = np.ceil(np.log2(360 * 2.0 / abs(east - west)))
+    zoom_lat = np.ceil(np.log2(360 * 2.0 / abs(north - south)))
+    return int(min(zoom_lon, zoom_lat))
+
+
+def _valid_zoom(zoom, provider, auto=True):
+    # an automatic zoom above the provider maximum is clipped, like contextily
+    min_zoom, max_zoom = provider.get("min_zoom", 0), provider.get("max_zoom", 30)
+    if min_zoom <= zoom <= max_zoom:
+        return zoom
+    if auto and zoom > max_zoom and "max_zoom" in provider:
+        return max_zoom
+    raise ValueError(
+        f"The {'inferred' if auto else 'specified'} zoom level of {zoom} is not "
+        f"valid for {provider.name} (valid zooms: {min_zoom} - {max_zoom})"
+    )
+
+
+def _lonlat_bounds(xmin, ymin, xmax, ymax, crs):
+    # same steps as contextily, so maps are identical to the ones it renders
+    left, bottom, right, top = Transformer.from_crs(
+        crs, "EPSG:3857", always_xy=True
+    ).transform_bounds(xmin, ymin, xmax, ymax)
+    west, south = mercantile.lnglat(left, bottom)
+    east, north = mercantile.lnglat(right, top)
+    return west, south, east, north
+
+
+def _merge_tiles(tiles, arrays):
+    # one image of the tiles, and its lon/lat bounds
+    columns = np.array([tile.x for tile in tiles])
+    rows = np.array([tile.y for tile in tiles])
+    height, width, depth = arrays[0].shape
+    image = np.zeros(
+        (
+            height * (rows.max() - rows.min() + 1),
+            width * (columns.max() - columns.min() + 1),
+            depth,
+        ),
+        dtype=np.uint8,
+    )
+    for column, row, array in zip(columns - columns.min(), rows - rows.min(), arrays):
+        image[
+            row * height : (row + 1) * height, column * width : (column + 1) * width
+        ] = array
+    west, north = mercantile.ul(columns.min(), rows.min(), tiles[0].z)
+    east, south = mercantile.ul(columns.max() + 1, rows.max() + 1, tiles[0].z)
+    return image, (west, south, east, north)
+
+
+def basemap_zoom(bounds, crs, provider=BASEMAP):
+    """
+    Zoom level contextily picks for a map of `bounds` (xmin, ymin, xmax, ymax
+    on `crs`).
+    """
+    return _valid_zoom(auto_zoom(*_lonlat_bounds(*bounds, crs)), provider, auto=True)
+
+
+def basemap_image(bounds, crs, store=None, zoom="auto", offline=TILES_OFFLINE):
+    """
+    Basemap of `bounds` (xmin, ymin, xmax, ymax on `crs`) warped to `crs`, as
+    an RGBA image and its (left, right, bottom, top) extent, reading the tiles
+    from the tile store. Offline, missing tiles are left blank.
+    """
+    store = store or tile_store()
+    west, south, east, north = _lonlat_bounds(*bounds, crs)
+    if zoom == "auto":
+        zoom = basemap_zoom(bounds, crs, store.provider)
+    zoom = _valid_zoom(zoom, store.provider, auto=False)
+    tiles = list(mercantile.tiles(west, south, east, north, [zoom]))
+    arrays = [get_tile(tile, store, offline) for tile in tiles]
+    # one write of the access times per map
+    store.flush()
+    missing = sum(array is None for array in arrays)
+    if missing:
+        logging.warning(f"{missing} of {len(tiles)} tiles not cached, left blank")
+        arrays = [
+            (
+                np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+                if array is None
+                else array
+            )
+            for array in arrays
+        ]
+    image, (west, south, east, north) = _merge_tiles(tiles, arrays)
+    left, bottom = mercantile.xy(west, south)
+    right, top = mercantile.xy(east, north)
+    return ctx.warp_tiles(image, (left, right, bottom, top), t_crs=crs)
+
+
+def crop_image(image, extent, bounds):
+    """
+    Pixels of an image with `extent` (left, right, bottom, top) covering
+    `bounds` (xmin, ymin, xmax, ymax), and their extent.
+    """
+    left, right, bottom, top = extent
+    rows, columns = image.shape[:2]
+    dx, dy = (right - left) / columns, (top - bottom) / rows
+    xmin, ymin, xmax, ymax = bounds
+    first_column = max(int(np.floor((xmin - left) / dx)), 0)
+    last_column = min(int(np.ceil((xmax - left) / dx)), columns)
+    first_row = max(int(np.floor((top - ymax) / dy)), 0)
+    last_row = min(int(np.ceil((top - ymin) / dy)), rows)
+    return image[first_row:last_row, first_column:last_column], (
+        left + first_column * dx,
+        left + last_column * dx,
+        top - last_row * dy,
+        top - first_row * dy,
+    )
+
+
+def draw_basemap(ax, image, extent, attribution=BASEMAP.get("attribution")):
+    """
+    Draw a `basemap_image` under the data of `ax`, keeping its limits.
+    """
+    limits = ax.axis()
+    ax.imshow(image, extent=extent, interpolation="bilinear", aspect=ax.get_aspect())
+    ax.axis(limits)
+    ctx.add_attribution(ax, attribution)
+
+
+def add_basemap(ax, crs, store=None, zoom="auto", offline=TILES_OFFLINE):
+    """
+    Drop-in for `contextily.add_basemap` reading the tiles from the tile store,
+    downloading only the missing ones. Offline, missing tiles are left blank.
+    """
+    store = store or tile_store()
+    xmin, xmax, ymin, ymax = ax.axis()
+    image, extent = basemap_image((xmin, ymin, xmax, ymax), crs, store, zoom, offline)
+    draw_basemap(ax, image, extent, store.provider.get("attribution"))
@@ -1,40 +1,48 @@
 from datetime import datetime, timezone, timedelta
 
-from spatial_tools import process_OWM_data, create_traj_map, export_gpx, save_OWM_data
+from spatial_tools import process_OWM_data, render_traj_maps, export_gpx, save_OWM_data
+from tile_tools import prefetch_track
 
 BAIRES_TZ = timezone(timedelta(hours=-3))
-track_df, trajectory = export_gpx(
-    gpx_path="/mnt/Trabalho/DonCarlos_Tracks/Track_23-ABR-23 132017.gpx",
-    layer="track_points",
-)
 
-weather_data = process_OWM_data(track_df)
-save_OWM_data(weather_data)
-create_traj_map(
-    traj=trajectory,
-    map_title="Largada",
-    start=datetime(2023, 4, 23, 10, 5),
-    stop=datetime(2023, 4, 23, 10, 30),
-    weather=weather_data,
-)
-create_traj_map(
-    traj=trajectory,
-    map_title="primeira perna",
-    start=datetime(2023, 4, 23, 10, 20),
-    stop=datetime(2023, 4, 23, 12, 0),
-    weather=weather_data,
-)
-create_traj_map(
-    traj=trajectory,
-    map_title="segunda perna (Popa-través)",
-    start=datetime(2023, 4, 23, 12),
-    stop=datetime(2023, 4, 23, 12, 55),
-    weather=weather_data,
-)
-create_traj_map(
-    traj=trajectory,
-    map_title="Toda regata",
-    start=datetime(2023, 4, 23, 10, 5),
-    stop=datetime(2023, 4, 23, 12, 55),
-    weather=weather_data,
-)
+# render_traj_maps starts worker processes, which import this module again
+if __name__ == "__main__":
+    track_df, trajectory = export_gpx(
+        gpx_path="/mnt/Trabalho/DonCarlos_Tracks/Track_23-ABR-23 132017.gpx",
+        layer="track_points",
+    )
+
+    # download the basemap of every map of the regatta once
+    prefetch_track(trajectory)
+    weather_data = process_OWM_data(track_df)
+    save_OWM_data(weather_data)
+    render_traj_maps(
+        trajectory,
+        [
+            (
+                "Largada",
+                datetime(2023, 4, 23, 10, 5),
+                datetime(2023, 4, 23, 10, 30),
+                "speed",
+            ),
+            (
+                "primeira perna",
+                datetime(2023, 4, 23, 10, 20),
+                datetime(2023, 4, 23, 12, 0),
+                "speed",
+            ),
+            (
+                "segunda perna (Popa-través)",
+                datetime(2023, 4, 23, 12),
+                datetime(2023, 4, 23, 12, 55),
+                "speed",
+            ),
+            (
+                "Toda regata",
+                datetime(2023, 4, 23, 10, 5),
+                datetime(2023, 4, 23, 12, 55),
+                "speed",
+            ),
+        ],
+        weather=weather_data,
+    )
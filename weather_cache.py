@@ -0,0 +1,140 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_FILE = Path("./data/weather_cache.sqlite")
+# grid cell size in degrees (about 11 km), OWM answers are hourly and wide area
+CELL_SIZE = 0.1
+MAX_ENTRIES = 200_000
+
+
+class WeatherCache:
+    """
+    On-disk cache of weather answers keyed by source, grid cell and UTC hour,
+    with least recently used eviction above `max_entries` and hit/miss counters.
+
+    For station based sources (meteostat) the station id is used as the cell.
+    """
+
+    def __init__(self, path=CACHE_FILE, cell_size=CELL_SIZE, max_entries=MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.cell_size = cell_size
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS weather_cache ("
+            "source TEXT NOT NULL, cell TEXT NOT NULL, hour INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, accessed_at REAL NOT NULL, "
+            "PRIMARY KEY (source, cell, hour))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_weather_cache_accessed_at "
+            "ON weather_cache (accessed_at)"
+        )
+        self._connection.commit()
+
+    def cell(self, lat, lon):
+        return f"{math.floor(lat / self.cell_size)}:{math.floor(lon / self.cell_size)}"
+
+    @staticmethod
+    def hour(timestamp):
+        """
+        UTC hour number of a unix timestamp or a datetime.
+        """
+        if hasattr(timestamp, "timestamp"):
+            timestamp = timestamp.timestamp()
+        return int(timestamp // 3600)
+
+    def get_many(self, source, cell, hours):
+        """
+        Cached payloads of `hours` found for (source, cell), keyed by hour.
+        """
+        hours = [int(h) for h in hours]
+        found = {}
+        with self._lock:
+            for start in range(0, len(hours), 500):
+                batch = hours[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT hour, payload FROM weather_cache WHERE source = ? "
+                    f"AND cell = ? AND hour IN ({', '.join('?' * len(batch))})",
+                    [source, cell, *batch],
+                ).fetchall()
+                found.update((hour, json.loads(payload)) for hour, payload in rows)
+            if found:
+                self._connection.executemany(
+                    "UPDATE weather_cache SET accessed_at = ? "
+                    "WHERE source = ? AND cell = ? AND hour = ?",
+                    [(time.time(), source, cell, hour) for hour in found],
+                )
+                self._connection.commit()
+            self.hits += len(found)
+            self.misses += len(hours) - len(found)
+        return found
+
+    def get(self, source, cell, hour):
+        return self.get_many(source, cell, [hour]).get(int(hour))
+
+    def put_many(self, source, cell, payloads):
+        """
+        Store {hour: payload} answers of (source, cell).
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO weather_cache VALUES (?, ?, ?, ?, ?)",
+                [
+                    (source, cell, int(hour), json.dumps(payload), now)
+                    for hour, payload in payloads.items()
+                ],
+            )
+            self._evict()
+            self._connection.commit()
+
+    def put(self, source, cell, hour, payload):
+        self.put_many(source, cell, {hour: payload})
+
+    def _evict(self):
+        (entries,) = self._connection.execute(
+            "SELECT count(*) FROM weather_cache"
+        ).fetchone()
+        if entries > self.max_entries:
+            # drop 10% more than needed so eviction does not run on every put
+            excess = entries - int(self.max_entries * 0.9)
+            self._connection.execute(
+                "DELETE FROM weather_cache WHERE rowid IN (SELECT rowid FROM "
+                "weather_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self):
+        (entries,) = self._connection.execute(
+            "SELECT count(*) FROM weather_cache"
+        ).fetchone()
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "entries": entries,
+        }
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    Weather cache shared by the OWM and meteostat functions.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = WeatherCache()
+    return _default_cache
@@ -1,33 +1,161 @@
 import logging
+from datetime import timedelta
+from functools import lru_cache
+from pathlib import Path
 
+import numpy as np
+import pandas as pd
 from meteostat import Stations, Hourly
 
-from models import engine, Session, WeatherStation, Weather
+from db_tools import _naive_utc, insert_chunksize, insert_on_conflict, natural_key
+from models import get_engine, WeatherStation, Weather
+from weather_cache import default_cache
 
+STATIONS_FILE = Path("./data/meteostat_stations.csv")
+EARTH_RADIUS = 6_371_008.8
+STATION_DATE_COLUMNS = [
+    "hourly_start",
+    "hourly_end",
+    "daily_start",
+    "daily_end",
+    "monthly_start",
+    "monthly_end",
+]
+# hours of a meteostat request shared by stations missing overlapping hours
+MAX_BATCH_HOURS = 31 * 24
 
-def get_nearby_weather_station(lon, lat):
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1
+    )
+
+
+class StationIndex:
+    """
+    KD-tree over the meteostat station catalogue answering k nearest station
+    queries for whole arrays of points.
     """
-    Use meteostat API to identify nearby stations
+
+    def __init__(self, stations):
+        from scipy.spatial import cKDTree
+
+        self.stations = stations
+        self._tree = cKDTree(
+            _unit_vectors(stations.latitude.values, stations.longitude.values)
+        )
+
+    @classmethod
+    def from_file(cls, path=STATIONS_FILE, refresh=False):
+        """
+        Load the catalogue saved on `path`, downloading and saving it first when
+        it does not exist (or `refresh` is True).
+        """
+        path = Path(path)
+        if refresh or not path.exists():
+            logging.warning(f"Downloading meteostat stations catalogue to {path}")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            Stations().fetch().to_csv(path)
+        stations = pd.read_csv(
+            path,
+            index_col="id",
+            dtype={"id": str, "wmo": str, "icao": str, "region": str},
+            parse_dates=STATION_DATE_COLUMNS,
+        )
+        return cls(stations)
+
+    def nearest(self, lat, lon, k=1):
+        """
+        Ids and distances in meters of the `k` nearest stations of each point,
+        as (n, k) arrays.
+        """
+        chord, index = self._tree.query(
+            _unit_vectors(np.atleast_1d(lat), np.atleast_1d(lon)), k=k
+        )
+        chord, index = chord.reshape(-1, k), index.reshape(-1, k)
+        distance = 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1))
+        return self.stations.index.to_numpy(dtype=object)[index], distance
+
+
+@lru_cache(maxsize=None)
+def default_station_index(path=STATIONS_FILE):
     """
-    station = Stations()
-    station = station.nearby(lat, lon)
-    station = station.fetch(1)
+    Station index loaded once per process and shared by the lookups.
+    """
+    return StationIndex.from_file(path)
+
+
+def get_nearby_weather_station(lon, lat, k=1, index=None):
+    """
+    Nearest meteostat stations, from the local station catalogue
+    """
+    index = index or default_station_index()
+    ids, distance = index.nearest(lat, lon, k=k)
+    station = index.stations.loc[ids[0]].copy()
+    station["distance"] = distance[0]
     return station
 
 
 def save_weather_station(station):
-    with Session() as session:
-        record_exists = (
-            session.query(WeatherStation).filter_by(id=station.index[0]).first()
-        )
-        if record_exists:
-            logging.warning(f"record already exists {record_exists.id}")
-        else:
-            station.to_sql(WeatherStation.__tablename__, engine, if_exists="append")
-            logging.warning(f"Station saved {station.index[0]}")
+    saved = station.to_sql(
+        WeatherStation.__tablename__,
+        get_engine(),
+        if_exists="append",
+        chunksize=insert_chunksize(len(station.columns) + station.index.nlevels),
+        method=insert_on_conflict(natural_key(WeatherStation)),
+    )
+    if saved:
+        logging.warning(f"Station saved {station.index[0]}")
+    else:
+        logging.warning(f"record already exists {station.index[0]}")
+
+
+def _hour_keys(times):
+    # hours since the epoch of naive UTC (as meteostat answers) or tz-aware times
+    times = pd.DatetimeIndex(times)
+    if times.tz is not None:
+        times = times.tz_convert("UTC").tz_localize(None)
+    return (times - pd.Timestamp(0)) // pd.Timedelta(hours=1)
+
+
+def _cache_hours(datetime_start, datetime_end):
+    # meteostat times are naive UTC
+    hours = pd.date_range(
+        _naive_utc(datetime_start).floor("h"), _naive_utc(datetime_end), freq="h"
+    )
+    return hours, _hour_keys(hours)
+
 
+def _cached_frame(cached, hour_keys):
+    # cached hours with data, hours meteostat has no data for are cached as None
+    keys = [h for h in hour_keys if cached.get(h) is not None]
+    return pd.DataFrame(
+        [cached[h] for h in keys],
+        index=pd.DatetimeIndex(
+            pd.Timestamp(0) + pd.to_timedelta(keys, unit="h"), name="time"
+        ),
+    )
+
+
+def _cache_answer(cache, station, data, hour_keys):
+    # every hour asked for is cached, as None when meteostat has no data for it,
+    # so gaps are not requested again
+    payloads = dict.fromkeys((int(h) for h in hour_keys), None)
+    payloads.update(zip(_hour_keys(data.index), data.to_dict("records")))
+    cache.put_many("meteostat", station, payloads)
+
+
+def get_weather_from_dates(datetime_start, datetime_end, station_index, cache=None):
+    cache = cache or default_cache()
+    hours, hour_keys = _cache_hours(datetime_start, datetime_end)
+    datetime_start = _naive_utc(datetime_start).to_pydatetime()
+    datetime_end = _naive_utc(datetime_end).to_pydatetime()
+    # the station id is the cache cell of meteostat data
+    cached = cache.get_many("meteostat", station_index, hour_keys)
+    if len(cached) == len(hour_keys):
+        return _cached_frame(cached, hour_keys)
 
-def get_weather_from_dates(datetime_start, datetime_end, station_index):
     data = Hourly(station_index, datetime_start, datetime_end)
     # check coverage
     coverage = data.coverage()
@@ -36,17 +164,126 @@ def get_weather_from_dates(datetime_start, datetime_end, station_index):
         data = data.normalize()
 
     data = data.fetch()
+    _cache_answer(cache, station_index, data, hour_keys)
     return data
 
 
+def merge_date_ranges(ranges, tolerance=timedelta(hours=1)):
+    """
+    Merge overlapping (or closer than `tolerance`) (start, end) ranges.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + tolerance:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+def _missing_runs(hours, cached):
+    # contiguous runs of hours without cached data
+    missing = np.flatnonzero(~np.isin(hours, list(cached)))
+    if not len(missing):
+        return []
+    breaks = np.flatnonzero(np.diff(missing) > 1)
+    starts = np.r_[missing[0], missing[breaks + 1]]
+    ends = np.r_[missing[breaks], missing[-1]]
+    return [(int(hours[s]), int(hours[e])) for s, e in zip(starts, ends)]
+
+
+def _batch_runs(runs, max_hours=MAX_BATCH_HOURS):
+    # (first, last, station) runs of missing hours sharing hours share one
+    # request over their union, up to `max_hours`, as every station of a request
+    # is fetched over the whole union
+    batches = []
+    for first, last, station in sorted(runs):
+        if (
+            batches
+            and first <= batches[-1][1]
+            and max(batches[-1][1], last) - batches[-1][0] < max_hours
+        ):
+            batches[-1][1] = max(batches[-1][1], last)
+            if station not in batches[-1][2]:
+                batches[-1][2].append(station)
+        else:
+            batches.append([first, last, [station]])
+    return batches
+
+
+def fetch_hourly_bulk(requests, cache=None):
+    """
+    Fetch meteostat hourly data for many (station, start, end) requests, e.g.
+    one per track. Ranges are merged per station, hours already in the weather
+    cache (with data or known to have none) are skipped, and stations missing
+    overlapping hours share a single Hourly request over their union. Returns a
+    DataFrame indexed by (station, time), in naive UTC.
+    """
+    cache = cache or default_cache()
+    by_station = {}
+    for station, start, end in requests:
+        by_station.setdefault(station, []).append(
+            (_naive_utc(start).floor("h"), _naive_utc(end))
+        )
+
+    wanted, runs = {}, []
+    for station, ranges in by_station.items():
+        hours = np.concatenate(
+            [
+                _hour_keys(pd.date_range(start, end, freq="h"))
+                for start, end in merge_date_ranges(ranges)
+            ]
+        )
+        wanted[station] = hours
+        runs += [
+            (first, last, station)
+            for first, last in _missing_runs(
+                hours, cache.get_many("meteostat", station, hours)
+            )
+        ]
+    batches = _batch_runs(runs)
+
+    logging.warning(
+        f"{len(batches)} meteostat Hourly requests for {len(by_station)} stations"
+    )
+    for first, last, stations in batches:
+        start = pd.Timestamp(0) + pd.Timedelta(hours=first)
+        end = pd.Timestamp(0) + pd.Timedelta(hours=last)
+        data = Hourly(stations, start.to_pydatetime(), end.to_pydatetime()).fetch()
+        if not data.empty and not isinstance(data.index, pd.MultiIndex):
+            data = pd.concat({stations[0]: data}, names=["station", "time"])
+        for station in stations:
+            station_data = (
+                data.xs(station, level="station")
+                if not data.empty and station in data.index.get_level_values("station")
+                else pd.DataFrame()
+            )
+            hours = wanted[station]
+            _cache_answer(
+                cache, station, station_data, hours[(hours >= first) & (hours <= last)]
+            )
+
+    frames = {}
+    for station, hours in wanted.items():
+        frame = _cached_frame(cache.get_many("meteostat", station, hours), hours)
+        if len(frame):
+            frames[station] = frame
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, names=["station", "time"])
+
+
 def save_weather_data(weather_data, station_id):
     weather_data["station"] = station_id
-    with Session() as session:
-        record_exists = (
-            session.query(Weather).filter_by(station=station_id).first()
-        )  # todo pensar em como colocar restricao adicioando data tbm
-        if record_exists:
-            logging.warning(f"record already exists {record_exists.id}")
-        else:
-            weather_data.to_sql(Weather.__tablename__, engine, if_exists="append")
-            logging.warning(f"Station saved {weather_data.index[0]}")
+    # a new date range for an already saved station is added, and hours already
+    # saved are updated in place
+    saved = weather_data.to_sql(
+        Weather.__tablename__,
+        get_engine(),
+        if_exists="append",
+        chunksize=insert_chunksize(
+            len(weather_data.columns) + weather_data.index.nlevels
+        ),
+        method=insert_on_conflict(natural_key(Weather), update=True),
+    )
+    logging.warning(f"Weather data saved for station {station_id} ({saved} rows)")